@@ -0,0 +1,340 @@
+# Agendador de Recarga em Depósito (Frotas)
+#
+# O aviso de 24h do simulador olha para UM par veículo/carregador isolado.
+# Aqui simulamos um depósito real: dezenas/centenas de veículos que chegam
+# e partem todos os dias e partilham N carregadores, com um limite de
+# potência do local (kW).
+#
+# Simulação de eventos discretos:
+#   - as chegadas são pré-geradas e ordenadas (NumPy), e os fins de sessão
+#     vivem num heap; o laço consome sempre o próximo dos dois;
+#   - veículos à espera ficam num heap por hora de partida (EDF: quem sai
+#     primeiro carrega primeiro);
+#   - cada sessão recebe min(potência efetiva, folga do local) e termina
+#     quando completa a energia ou quando o veículo parte (energia não atendida).
+# Tudo em listas/arrays simples indexados por sessão (sem objetos por evento),
+# para 1.000 veículos x 30 dias correr bem abaixo de 1 segundo.
+
+import heapq
+import math
+
+import numpy as np
+
+
+class ErroDeposito(ValueError):
+    """ Parâmetros de simulação inválidos. """
+
+
+class GrupoVeiculos:
+    """
+    `quantidade` veículos iguais com a mesma rotina diária.
+    chegada_h / partida_h: hora do dia (0-24); partida <= chegada = dia seguinte.
+    """
+
+    def __init__(self, veiculo, quantidade, chegada_h, partida_h, soc_chegada, soc_alvo):
+        if quantidade < 0:
+            raise ErroDeposito("quantidade não pode ser negativa")
+        if not 0 <= chegada_h < 24 or not 0 <= partida_h <= 24:
+            raise ErroDeposito("horas de chegada/partida devem estar entre 0 e 24")
+        if not 0 <= soc_chegada < soc_alvo <= 100:
+            raise ErroDeposito("deve cumprir 0 <= soc_chegada < soc_alvo <= 100")
+        self.veiculo = veiculo
+        self.quantidade = int(quantidade)
+        self.chegada_h = float(chegada_h)
+        self.permanencia_h = (partida_h - chegada_h) % 24 or 24.0
+        self.energia_kwh = veiculo.capacidade_bateria_kwh * (soc_alvo - soc_chegada) / 100
+
+
+class GrupoCarregadores:
+    def __init__(self, carregador, quantidade):
+        if quantidade < 0:
+            raise ErroDeposito("quantidade não pode ser negativa")
+        self.carregador = carregador
+        self.quantidade = int(quantidade)
+
+
+def potencia_efetiva(veiculo, carregador):
+    if carregador.tipo_corrente == 'AC':
+        return min(veiculo.potencia_max_carga_ac_kw, carregador.potencia_saida_kw)
+    if carregador.tipo_corrente == 'DC':
+        return min(veiculo.potencia_max_carga_dc_kw, carregador.potencia_saida_kw)
+    return 0.0
+
+
+def _resumo(valores):
+    if len(valores) == 0:
+        return {"media": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    arr = np.asarray(valores)
+    p50, p95 = np.percentile(arr, [50, 95])
+    return {"media": float(arr.mean()), "p50": float(p50), "p95": float(p95), "max": float(arr.max())}
+
+
+def simular_deposito(grupos_veiculos, grupos_carregadores, limite_site_kw=None, dias=30,
+                     desvio_chegada_h=0.0, potencia_minima_kw=1.0, seed=0):
+    """
+    Corre a simulação e devolve um dicionário com utilização, esperas e
+    energia não atendida (total, por grupo de veículos e por carregador).
+    """
+    if dias <= 0:
+        raise ErroDeposito("dias deve ser maior que zero")
+    if limite_site_kw is not None and limite_site_kw <= 0:
+        raise ErroDeposito("limite_site_kw deve ser maior que zero")
+
+    n_gv = len(grupos_veiculos)
+    n_gc = len(grupos_carregadores)
+
+    # Potência efetiva grupo de veículos x grupo de carregadores e preferência
+    # (maior potência primeiro) para cada grupo de veículos
+    potencia = [[potencia_efetiva(gv.veiculo, gc.carregador) for gc in grupos_carregadores]
+                for gv in grupos_veiculos]
+    preferencia = [
+        [c for c in sorted(range(n_gc), key=lambda c: -potencia[g][c]) if potencia[g][c] > 0]
+        for g in range(n_gv)
+    ]
+
+    # --- Chegadas pré-geradas (uma por veículo por dia), ordenadas no tempo ---
+    rng = np.random.default_rng(seed)
+    grupo_por_unidade = np.repeat(np.arange(n_gv), [gv.quantidade for gv in grupos_veiculos])
+    n_unidades = len(grupo_por_unidade)
+    grupo_sessao = np.tile(grupo_por_unidade, dias)
+    dia_sessao = np.repeat(np.arange(dias), n_unidades)
+    chegada_h = np.array([gv.chegada_h for gv in grupos_veiculos])[grupo_sessao] if n_gv else np.zeros(0)
+    permanencia = np.array([gv.permanencia_h for gv in grupos_veiculos])[grupo_sessao] if n_gv else np.zeros(0)
+    chegada = dia_sessao * 24.0 + chegada_h
+    if desvio_chegada_h > 0:
+        chegada = chegada + rng.normal(0.0, desvio_chegada_h, len(chegada))
+        chegada = np.maximum(chegada, 0.0)
+    partida = chegada + permanencia
+
+    ordem = np.argsort(chegada, kind='stable')
+    chegada = chegada[ordem].tolist()
+    partida = partida[ordem].tolist()
+    grupo = grupo_sessao[ordem].tolist()
+    energia_gv = [gv.energia_kwh for gv in grupos_veiculos]
+    n = len(chegada)
+
+    # --- Estado por sessão (listas paralelas) ---
+    inicio = [math.nan] * n
+    potencia_sessao = [0.0] * n
+    carregador_sessao = [-1] * n
+    entregue = [0.0] * n
+
+    livres = [gc.quantidade for gc in grupos_carregadores]
+    horas_ocupadas = [0.0] * n_gc
+    folga = math.inf if limite_site_kw is None else float(limite_site_kw)
+    carga_site = 0.0
+    pico_site = 0.0
+
+    # Uma fila EDF (heap por hora de partida) por "assinatura" de compatibilidade:
+    # veículos que aceitam o mesmo conjunto de carregadores partilham a fila.
+    # Assim o despacho nunca percorre veículos que não podem usar os carregadores livres.
+    assinaturas = []
+    fila_do_grupo = []
+    for g in range(n_gv):
+        conjunto = frozenset(preferencia[g])
+        if conjunto not in assinaturas:
+            assinaturas.append(conjunto)
+        fila_do_grupo.append(assinaturas.index(conjunto))
+    filas = [[] for _ in assinaturas]
+
+    fins = []        # heap (t_fim, sessao)
+    expiradas = 0
+
+    def iniciar(s, t):
+        nonlocal folga, carga_site, pico_site
+        if folga < potencia_minima_kw:
+            return False
+        g = grupo[s]
+        for c in preferencia[g]:
+            if livres[c] > 0:
+                p = min(potencia[g][c], folga)
+                livres[c] -= 1
+                folga -= p
+                carga_site += p
+                if carga_site > pico_site:
+                    pico_site = carga_site
+                inicio[s] = t
+                potencia_sessao[s] = p
+                carregador_sessao[s] = c
+                heapq.heappush(fins, (min(t + energia_gv[g] / p, partida[s]), s))
+                return True
+        return False
+
+    def despachar(t):
+        nonlocal expiradas
+        while folga >= potencia_minima_kw:
+            melhor = None
+            for k, fila in enumerate(filas):
+                while fila and fila[0][0] <= t:
+                    heapq.heappop(fila)
+                    expiradas += 1 # Partiu sem nunca ter carregado
+                if fila and (melhor is None or fila[0] < filas[melhor][0]) \
+                        and any(livres[c] for c in assinaturas[k]):
+                    melhor = k
+            if melhor is None:
+                return
+            _, s = heapq.heappop(filas[melhor])
+            iniciar(s, t)
+
+    i = 0
+    while i < n or fins:
+        if fins and (i >= n or fins[0][0] <= chegada[i]):
+            t, s = heapq.heappop(fins)
+            p = potencia_sessao[s]
+            c = carregador_sessao[s]
+            entregue[s] = min(energia_gv[grupo[s]], p * (t - inicio[s]))
+            horas_ocupadas[c] += t - inicio[s]
+            livres[c] += 1
+            folga += p
+            carga_site -= p
+            despachar(t)
+        else:
+            s = i
+            i += 1
+            t = chegada[s]
+            g = grupo[s]
+            if not preferencia[g]:
+                expiradas += 1 # Nenhum carregador do depósito serve este veículo
+                continue
+            fila = filas[fila_do_grupo[g]]
+            # Respeita a fila (EDF): com gente à espera, entra na fila e despacha
+            if fila or not iniciar(s, t):
+                heapq.heappush(fila, (partida[s], s))
+                despachar(t)
+
+    expiradas += sum(len(fila) for fila in filas) # Ainda à espera no fim do horizonte
+
+    # --- Métricas (vetorizadas por grupo) ---
+    horizonte_h = dias * 24.0
+    grupo_arr = np.asarray(grupo, dtype=np.int64)
+    inicio_arr = np.asarray(inicio, dtype=np.float64)
+    espera_arr = inicio_arr - np.asarray(chegada, dtype=np.float64)
+    energia_pedida = np.asarray(energia_gv, dtype=np.float64)[grupo_arr] if n else np.zeros(0)
+    nao_atendida = np.maximum(energia_pedida - np.asarray(entregue, dtype=np.float64), 0.0)
+    atendida = ~np.isnan(inicio_arr)
+
+    sessoes_g = np.bincount(grupo_arr, minlength=n_gv)
+    pedida_g = np.bincount(grupo_arr, weights=energia_pedida, minlength=n_gv)
+    falta_g = np.bincount(grupo_arr, weights=nao_atendida, minlength=n_gv)
+    ordem_g = np.argsort(grupo_arr[atendida], kind='stable')
+    esperas_g = np.split(
+        espera_arr[atendida][ordem_g],
+        np.cumsum(np.bincount(grupo_arr[atendida], minlength=n_gv))[:-1]
+    ) if n_gv else []
+
+    por_grupo_veiculos = [
+        {
+            "veiculo_id": gv.veiculo.id,
+            "quantidade": gv.quantidade,
+            "sessoes": int(sessoes_g[g]),
+            "energia_pedida_kwh": float(pedida_g[g]),
+            "energia_nao_atendida_kwh": float(falta_g[g]),
+            "espera_h": _resumo(esperas_g[g]),
+            "compativel": bool(preferencia[g]),
+        }
+        for g, gv in enumerate(grupos_veiculos)
+    ]
+
+    por_carregador = [
+        {
+            "carregador_id": gc.carregador.id,
+            "quantidade": gc.quantidade,
+            "horas_ocupadas": horas_ocupadas[c],
+            "utilizacao": horas_ocupadas[c] / (gc.quantidade * horizonte_h) if gc.quantidade else 0.0,
+        }
+        for c, gc in enumerate(grupos_carregadores)
+    ]
+
+    total_pedida = float(energia_pedida.sum())
+    total_falta = float(nao_atendida.sum())
+    total_unidades = sum(gc.quantidade for gc in grupos_carregadores)
+    return {
+        "dias": dias,
+        "sessoes": n,
+        "sessoes_atendidas": int(atendida.sum()),
+        "sessoes_nao_atendidas": expiradas,
+        "sessoes_incompletas": int(np.count_nonzero(nao_atendida > 1e-9)),
+        "espera_h": _resumo(espera_arr[atendida]),
+        "energia_pedida_kwh": total_pedida,
+        "energia_entregue_kwh": total_pedida - total_falta,
+        "energia_nao_atendida_kwh": total_falta,
+        "percentual_nao_atendido": (100 * total_falta / total_pedida) if total_pedida else 0.0,
+        "pico_site_kw": pico_site,
+        "limite_site_kw": limite_site_kw,
+        "utilizacao_media": sum(horas_ocupadas) / (total_unidades * horizonte_h) if total_unidades else 0.0,
+        "por_carregador": por_carregador,
+        "por_grupo_veiculos": por_grupo_veiculos,
+    }
+
+
+def _numero(dados, campo, padrao=None):
+    valor = dados.get(campo, padrao)
+    if valor is None:
+        raise ErroDeposito(f"'{campo}' é obrigatório")
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ErroDeposito(f"'{campo}' deve ser um número")
+    if not math.isfinite(valor):
+        raise ErroDeposito(f"'{campo}' deve ser finito")
+    return valor
+
+
+def ler_pedido_deposito(pedido, catalogo, max_sessoes=2000000):
+    """
+    Valida o JSON do pedido contra o snapshot do catálogo e devolve
+    (grupos_veiculos, grupos_carregadores, opcoes para simular_deposito).
+    Formato:
+      {"veiculos": [{"veiculo_id": 1, "quantidade": 40, "chegada_h": 19,
+                     "partida_h": 6, "soc_chegada": 30, "soc_alvo": 90}, ...],
+       "carregadores": [{"carregador_id": 3, "quantidade": 10}, ...],
+       "limite_site_kw": 400,            (opcional)
+       "dias": 30,                       (opcional)
+       "desvio_chegada_h": 0.5,          (opcional: variação aleatória das chegadas)
+       "seed": 0}                        (opcional)
+    """
+    if not isinstance(pedido, dict):
+        raise ErroDeposito("o corpo do pedido deve ser um objeto JSON")
+    veiculos = pedido.get('veiculos')
+    carregadores = pedido.get('carregadores')
+    if not isinstance(veiculos, list) or not veiculos:
+        raise ErroDeposito("'veiculos' deve ser uma lista não vazia")
+    if not isinstance(carregadores, list) or not carregadores:
+        raise ErroDeposito("'carregadores' deve ser uma lista não vazia")
+
+    grupos_veiculos = []
+    for item in veiculos:
+        if not isinstance(item, dict):
+            raise ErroDeposito("cada item de 'veiculos' deve ser um objeto")
+        veiculo = catalogo.veiculos_por_id.get(int(_numero(item, 'veiculo_id')))
+        if veiculo is None:
+            raise ErroDeposito(f"veículo {item.get('veiculo_id')} não encontrado")
+        grupos_veiculos.append(GrupoVeiculos(
+            veiculo,
+            int(_numero(item, 'quantidade', 1)),
+            _numero(item, 'chegada_h'),
+            _numero(item, 'partida_h'),
+            _numero(item, 'soc_chegada', veiculo.perfil.soc_inicial),
+            _numero(item, 'soc_alvo', veiculo.perfil.soc_final),
+        ))
+
+    grupos_carregadores = []
+    for item in carregadores:
+        if not isinstance(item, dict):
+            raise ErroDeposito("cada item de 'carregadores' deve ser um objeto")
+        carregador = catalogo.carregadores_por_id.get(int(_numero(item, 'carregador_id')))
+        if carregador is None:
+            raise ErroDeposito(f"carregador {item.get('carregador_id')} não encontrado")
+        grupos_carregadores.append(GrupoCarregadores(carregador, int(_numero(item, 'quantidade', 1))))
+
+    opcoes = {
+        "limite_site_kw": None if pedido.get('limite_site_kw') is None else _numero(pedido, 'limite_site_kw'),
+        "dias": int(_numero(pedido, 'dias', 30)),
+        "desvio_chegada_h": _numero(pedido, 'desvio_chegada_h', 0.0),
+        "seed": int(_numero(pedido, 'seed', 0)),
+    }
+    if opcoes["desvio_chegada_h"] < 0:
+        raise ErroDeposito("'desvio_chegada_h' não pode ser negativo")
+    if opcoes["dias"] * sum(g.quantidade for g in grupos_veiculos) > max_sessoes:
+        raise ErroDeposito(f"máximo de {max_sessoes} sessões (veículos x dias) por pedido")
+    return grupos_veiculos, grupos_carregadores, opcoes
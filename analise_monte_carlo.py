@@ -0,0 +1,321 @@
+# Análise de Cenários (Monte Carlo) das Projeções de Custo
+#
+# custos_gerais dá um único valor para custo_kwh e recargas_dia fixos. Aqui
+# cada parâmetro pode ser uma distribuição (custo_kwh, recargas_dia,
+# soc_inicial, soc_final, dias_mes) e são feitos N sorteios, todos de uma vez
+# em NumPy. Resultado: faixas de percentis do custo mensal/anual, do tempo de
+# recarga em cada carregador compatível e a probabilidade de passar das 24h.
+#
+# Sorteios x carregadores (50k x 1k = 50M tempos) não precisa de ser
+# materializado:
+#   - sem curva DC, tempo = kWh / P é crescente em kWh, logo os percentis do
+#     tempo num carregador são os percentis do kWh divididos por P, e
+#     P(tempo x recargas > 24) = P(kWh x recargas > 24 P) sai de um
+#     searchsorted no vetor (kWh x recargas) ordenado uma só vez;
+#   - com curva DC o tempo depende da janela de SoC sorteada: para cada
+#     potência efetiva distinta calcula-se o tempo acumulado G(soc) numa
+#     grelha e tempo = G(final) - G(inicial) por interpolação (vetor de N).
+#     Só este caso custa N por potência distinta; em paralelo (opcional), as
+#     potências são repartidas pelos processos de um pool partilhado
+#     (pool_processos.py).
+
+import math
+import time
+
+import numpy as np
+
+from pool_processos import obter_pool
+
+
+DISTRIBUICOES = ('fixo', 'uniforme', 'triangular', 'normal', 'discreta')
+PERCENTIS_PADRAO = (5, 25, 50, 75, 95)
+PASSO_GRELHA_SOC = 0.5
+MAX_SORTEIOS = 200_000
+
+
+class ErroMonteCarlo(ValueError):
+    """ Pedido de análise inválido (vira HTTP 400 na rota). """
+
+
+# --- Distribuições ---
+
+def _num(spec, campo):
+    valor = spec.get(campo)
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ErroMonteCarlo(f"'{campo}' deve ser um número")
+    if not math.isfinite(valor):
+        raise ErroMonteCarlo(f"'{campo}' deve ser finito")
+    return valor
+
+
+def ler_distribuicao(spec, nome):
+    """
+    Aceita um número (fixo) ou um objeto:
+      {"dist": "uniforme", "min": 0.6, "max": 1.1}
+      {"dist": "triangular", "min": 1, "moda": 2, "max": 4}
+      {"dist": "normal", "media": 0.85, "desvio": 0.1, "min": 0, "max": 2}  (min/max cortam)
+      {"dist": "discreta", "valores": [28, 30, 31], "pesos": [1, 4, 7]}     (pesos opcionais)
+    Devolve uma tupla normalizada (tipo, parâmetros...).
+    """
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        return ('fixo', _num({'v': spec}, 'v'))
+    if not isinstance(spec, dict):
+        raise ErroMonteCarlo(f"'{nome}' deve ser um número ou um objeto com 'dist'")
+    tipo = spec.get('dist')
+    try:
+        if tipo == 'fixo':
+            return ('fixo', _num(spec, 'valor'))
+        if tipo == 'uniforme':
+            minimo, maximo = _num(spec, 'min'), _num(spec, 'max')
+            if minimo > maximo:
+                raise ErroMonteCarlo("min > max")
+            return ('uniforme', minimo, maximo)
+        if tipo == 'triangular':
+            minimo, moda, maximo = _num(spec, 'min'), _num(spec, 'moda'), _num(spec, 'max')
+            if not minimo <= moda <= maximo or minimo == maximo:
+                raise ErroMonteCarlo("é preciso min <= moda <= max e min < max")
+            return ('triangular', minimo, moda, maximo)
+        if tipo == 'normal':
+            desvio = _num(spec, 'desvio')
+            if desvio < 0:
+                raise ErroMonteCarlo("'desvio' não pode ser negativo")
+            minimo = _num(spec, 'min') if 'min' in spec else -np.inf
+            maximo = _num(spec, 'max') if 'max' in spec else np.inf
+            if minimo > maximo:
+                raise ErroMonteCarlo("min > max")
+            return ('normal', _num(spec, 'media'), desvio, minimo, maximo)
+        if tipo == 'discreta':
+            valores = spec.get('valores')
+            if not isinstance(valores, list) or not valores:
+                raise ErroMonteCarlo("'valores' deve ser uma lista não vazia")
+            valores = tuple(_num({'v': v}, 'v') for v in valores)
+            pesos = spec.get('pesos')
+            if pesos is None:
+                pesos = (1.0,) * len(valores)
+            elif not isinstance(pesos, list) or len(pesos) != len(valores):
+                raise ErroMonteCarlo("'pesos' deve ter o mesmo tamanho que 'valores'")
+            pesos = tuple(_num({'p': p}, 'p') for p in pesos)
+            if any(p < 0 for p in pesos) or not 0 < sum(pesos) < math.inf:
+                raise ErroMonteCarlo("'pesos' devem ser não negativos, não todos zero e com soma finita")
+            return ('discreta', valores, pesos)
+    except ErroMonteCarlo as e:
+        raise ErroMonteCarlo(f"'{nome}': {e}")
+    raise ErroMonteCarlo(f"'{nome}': 'dist' deve ser um de {', '.join(DISTRIBUICOES)}")
+
+
+def sortear(distribuicao, n, rng):
+    """ n sorteios (float64) de uma distribuição normalizada por ler_distribuicao. """
+    tipo = distribuicao[0]
+    if tipo == 'fixo':
+        return np.full(n, distribuicao[1])
+    if tipo == 'uniforme':
+        return rng.uniform(distribuicao[1], distribuicao[2], n)
+    if tipo == 'triangular':
+        return rng.triangular(distribuicao[1], distribuicao[2], distribuicao[3], n)
+    if tipo == 'normal':
+        _, media, desvio, minimo, maximo = distribuicao
+        return np.clip(rng.normal(media, desvio, n), minimo, maximo)
+    _, valores, pesos = distribuicao
+    pesos = np.asarray(pesos) / sum(pesos)
+    return np.asarray(valores)[rng.choice(len(valores), n, p=pesos)]
+
+
+# --- Curva DC: tempo acumulado por SoC para uma potência ---
+
+def _grelha_curva(capacidade_kwh, potencia_max_dc_kw, curva):
+    """ Grelha de SoC (pontos) e, por segmento, energia (kWh) e potência aceite pela curva. """
+    bordas = np.arange(0.0, 100.0 + PASSO_GRELHA_SOC / 2, PASSO_GRELHA_SOC)
+    meios = (bordas[:-1] + bordas[1:]) / 2
+    socs, potencias = zip(*curva)
+    p_curva = np.minimum(np.interp(meios, socs, potencias), potencia_max_dc_kw)
+    energia = capacidade_kwh * np.diff(bordas) / 100
+    return bordas, energia, p_curva
+
+
+def _tempos_curva(potencias, grelha, soc_inicial, soc_final, recargas_dia, percentis):
+    """
+    Para cada potência efetiva: percentis e média do tempo (h) e
+    probabilidade de tempo x recargas > 24h. Corre também nos processos do pool.
+    """
+    bordas, energia, p_curva = grelha
+    saida = []
+    for potencia in potencias:
+        horas = np.concatenate(([0.0], np.cumsum(energia / np.minimum(p_curva, potencia))))
+        tempo = np.interp(soc_final, bordas, horas) - np.interp(soc_inicial, bordas, horas)
+        saida.append((
+            np.percentile(tempo, percentis),
+            float(tempo.mean()),
+            float(np.count_nonzero(tempo * recargas_dia > 24)) / len(tempo),
+        ))
+    return saida
+
+
+# --- Análise ---
+
+def _faixas(valores, percentis):
+    return dict(
+        {f"p{p:g}": float(v) for p, v in zip(percentis, np.percentile(valores, percentis))},
+        media=float(valores.mean()),
+    )
+
+
+def analisar(veiculo, matriz, parametros, n_sorteios=50_000, percentis=PERCENTIS_PADRAO,
+             semente=None, limite=None, paralelo=False, workers=2):
+    """
+    Monte Carlo sobre todos os carregadores compatíveis com `veiculo`.
+    `parametros`: distribuições (ler_distribuicao) de custo_kwh, recargas_dia,
+    soc_inicial, soc_final e dias_mes. Sorteios com janela de SoC inválida,
+    recargas <= 0 ou custo < 0 são descartados (e contados).
+    Carregadores pela ordem do ranking nominal; `limite` corta a lista.
+    """
+    inicio = time.monotonic()
+    rng = np.random.default_rng(semente)
+    percentis = tuple(float(p) for p in percentis)
+
+    s = {nome: sortear(dist, n_sorteios, rng) for nome, dist in parametros.items()}
+    validos = (
+        (s['soc_inicial'] >= 0) & (s['soc_inicial'] < s['soc_final']) & (s['soc_final'] <= 100)
+        & (s['recargas_dia'] > 0) & (s['custo_kwh'] >= 0) & (s['dias_mes'] > 0)
+    )
+    n_validos = int(np.count_nonzero(validos))
+    if n_validos == 0:
+        raise ErroMonteCarlo("nenhum sorteio válido (verifique as janelas de SoC e os mínimos)")
+    s = {nome: valores[validos] for nome, valores in s.items()}
+
+    kwh = veiculo.capacidade_bateria_kwh * (s['soc_final'] - s['soc_inicial']) / 100
+    custo_por_recarga = kwh * s['custo_kwh']
+    custo_diario = custo_por_recarga * s['recargas_dia']
+    custos = {
+        "kwh_para_recarga": _faixas(kwh, percentis),
+        "custo_por_recarga": _faixas(custo_por_recarga, percentis),
+        "custo_mensal": _faixas(custo_diario * s['dias_mes'], percentis),
+        "custo_anual": _faixas(custo_diario * 365, percentis),
+    }
+
+    # Carregadores compatíveis, pela ordem do ranking nominal (janela do veículo)
+    nominal = matriz.calcular_veiculo(veiculo, 1.0)
+    indices = nominal["indices"]
+    if limite is not None:
+        indices = indices[:limite]
+    efetiva = matriz.potencia_efetiva(
+        veiculo.potencia_max_carga_ac_kw, veiculo.potencia_max_carga_dc_kw)[indices]
+
+    n = len(indices)
+    tempo_pct = np.empty((n, len(percentis)))
+    tempo_media = np.empty(n)
+    prob_24h = np.empty(n)
+
+    curva = veiculo.perfil.curva
+    com_curva = matriz.is_dc[indices] if curva else np.zeros(n, dtype=bool)
+
+    # Sem curva: escala dos percentis do kWh + searchsorted
+    planos = ~com_curva
+    if planos.any():
+        p = efetiva[planos]
+        tempo_pct[planos] = np.percentile(kwh, percentis)[None, :] / p[:, None]
+        tempo_media[planos] = kwh.mean() / p
+        energia_dia = np.sort(kwh * s['recargas_dia'])
+        prob_24h[planos] = 1 - np.searchsorted(energia_dia, 24 * p, side='right') / n_validos
+
+    # Com curva: uma passagem por potência efetiva distinta
+    if com_curva.any():
+        distintas, inverso = np.unique(efetiva[com_curva], return_inverse=True)
+        grelha = _grelha_curva(veiculo.capacidade_bateria_kwh, veiculo.potencia_max_carga_dc_kw, curva)
+        argumentos = (grelha, s['soc_inicial'], s['soc_final'], s['recargas_dia'], percentis)
+        fatias = [distintas.tolist()]
+        if paralelo and workers > 1 and len(distintas) > 1:
+            fatias = [f for f in np.array_split(distintas, workers) if len(f)]
+            partes = list(obter_pool('monte_carlo', workers).map(
+                _tempos_curva, [f.tolist() for f in fatias], *[[a] * len(fatias) for a in argumentos]))
+        else:
+            partes = [_tempos_curva(fatias[0], *argumentos)]
+        resultados = [r for parte in partes for r in parte]
+        pct, media, prob = zip(*resultados)
+        tempo_pct[com_curva] = np.asarray(pct)[inverso]
+        tempo_media[com_curva] = np.asarray(media)[inverso]
+        prob_24h[com_curva] = np.asarray(prob)[inverso]
+
+    registros = matriz.registros
+    nomes = [f"p{p:g}" for p in percentis]
+    carregadores = []
+    for i, pot, pct, med, prob in zip(
+            indices.tolist(), efetiva.tolist(), tempo_pct.tolist(), tempo_media.tolist(), prob_24h.tolist()):
+        r = registros[i]
+        carregadores.append({
+            "id": r.id,
+            "marca": r.marca,
+            "modelo": r.modelo,
+            "tipo_corrente": r.tipo_corrente,
+            "potencia_efetiva_kw": pot,
+            "tempo_recarga_horas": dict(zip(nomes, pct), media=med),
+            "prob_acima_24h": prob,
+        })
+
+    return {
+        "veiculo_id": veiculo.id,
+        "sorteios": n_sorteios,
+        "sorteios_validos": n_validos,
+        "percentis": list(percentis),
+        "custos": custos,
+        "carregadores": carregadores,
+        "tempo_s": time.monotonic() - inicio,
+    }
+
+
+def ler_pedido_monte_carlo(pedido, catalogo, max_sorteios=MAX_SORTEIOS):
+    """
+    Valida o JSON do pedido e devolve os argumentos de analisar (dicionário).
+    Formato:
+      {"veiculo_id": 1,
+       "custo_kwh": {"dist": "uniforme", "min": 0.6, "max": 1.2},   (número ou distribuição)
+       "recargas_dia": {"dist": "triangular", "min": 1, "moda": 2, "max": 3},
+       "soc_inicial": 20, "soc_final": 80,     (opcionais: por omissão a janela do veículo)
+       "dias_mes": 30,                          (opcional)
+       "sorteios": 50000, "percentis": [5, 50, 95], "semente": 42,
+       "limite": 100, "paralelo": false}        (opcionais)
+    """
+    if not isinstance(pedido, dict):
+        raise ErroMonteCarlo("o corpo do pedido deve ser um objeto JSON")
+    try:
+        veiculo = catalogo.veiculos_por_id.get(int(pedido.get('veiculo_id')))
+    except (TypeError, ValueError, OverflowError):
+        raise ErroMonteCarlo("'veiculo_id' deve ser um inteiro")
+    if veiculo is None:
+        raise ErroMonteCarlo("veículo não encontrado")
+
+    for obrigatorio in ('custo_kwh', 'recargas_dia'):
+        if pedido.get(obrigatorio) is None:
+            raise ErroMonteCarlo(f"'{obrigatorio}' é obrigatório")
+    padroes = {'soc_inicial': veiculo.soc_inicial, 'soc_final': veiculo.soc_final, 'dias_mes': 30}
+    parametros = {
+        nome: ler_distribuicao(pedido.get(nome, padroes.get(nome)), nome)
+        for nome in ('custo_kwh', 'recargas_dia', 'soc_inicial', 'soc_final', 'dias_mes')
+    }
+
+    try:
+        n_sorteios = int(pedido.get('sorteios', 50_000))
+        percentis = [float(p) for p in pedido.get('percentis', PERCENTIS_PADRAO)]
+        semente = None if pedido.get('semente') is None else int(pedido['semente'])
+        limite = None if pedido.get('limite') is None else int(pedido['limite'])
+    except (TypeError, ValueError, OverflowError):
+        raise ErroMonteCarlo("'sorteios', 'semente' e 'limite' devem ser inteiros e 'percentis' uma lista de números")
+    if not 1 <= n_sorteios <= max_sorteios:
+        raise ErroMonteCarlo(f"'sorteios' deve estar entre 1 e {max_sorteios}")
+    if not percentis or any(not 0 <= p <= 100 for p in percentis):
+        raise ErroMonteCarlo("'percentis' deve ser uma lista de valores entre 0 e 100")
+    if limite is not None and limite < 0:
+        raise ErroMonteCarlo("'limite' não pode ser negativo")
+    if semente is not None and semente < 0:
+        raise ErroMonteCarlo("'semente' não pode ser negativa")
+
+    return {
+        "veiculo": veiculo,
+        "parametros": parametros,
+        "n_sorteios": n_sorteios,
+        "percentis": percentis,
+        "semente": semente,
+        "limite": limite,
+        "paralelo": bool(pedido.get('paralelo', False)),
+    }
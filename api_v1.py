@@ -0,0 +1,144 @@
+# API JSON v1 (integrações de parceiros)
+#
+# Os mesmos cálculos das páginas HTML (ranking do simulador, comparação 1x1 e
+# comissão) como GET com parâmetros na query string, para poderem ser
+# revalidados com ETag / If-None-Match.
+#
+# O resultado só depende de (versão do catálogo, parâmetros, tarifa), por isso
+# o ETag é calculado ANTES do cálculo: um cliente com a resposta atual recebe
+# 304 sem o servidor tocar no motor nem no índice. Qualquer escrita no
+# catálogo muda a versão e invalida todos os ETags de uma vez.
+#
+# Concorrência: ver asgi.py (servidor assíncrono com os pedidos em threads).
+
+import hashlib
+import json
+import math
+
+from tarifa_horaria import MAX_RECARGAS_DIA
+
+
+class ErroApi(ValueError):
+    """ Parâmetros inválidos (vira HTTP 400 na rota). """
+
+
+def _numero(args, campo, obrigatorio=True, padrao=None, minimo_exclusivo=None, maximo=None, tipo=float):
+    valor = args.get(campo)
+    if valor is None or valor == '':
+        if obrigatorio:
+            raise ErroApi(f"'{campo}' é obrigatório")
+        return padrao
+    try:
+        valor = tipo(valor)
+    except (TypeError, ValueError):
+        raise ErroApi(f"'{campo}' deve ser {'um inteiro' if tipo is int else 'um número'}")
+    if tipo is float and not math.isfinite(valor):
+        raise ErroApi(f"'{campo}' deve ser finito")
+    if minimo_exclusivo is not None and valor <= minimo_exclusivo:
+        raise ErroApi(f"'{campo}' deve ser maior que {minimo_exclusivo}")
+    if maximo is not None and valor > maximo:
+        raise ErroApi(f"'{campo}' deve ser no máximo {maximo}")
+    return valor
+
+
+def _tarifa(args):
+    return {
+        "tarifa_id": _numero(args, 'tarifa_id', obrigatorio=False, tipo=int),
+        "hora_inicio": _numero(args, 'hora_inicio', obrigatorio=False, padrao=0.0) % 24,
+    }
+
+
+def ler_pedido_simulacao(args, por_pagina_max=100):
+    """
+    GET /api/v1/simulacao?veiculo_id=1&custo_kwh=0.8&recargas_dia=2
+        [&pagina=1&por_pagina=20&tarifa_id=3&hora_inicio=18]
+    """
+    parametros = {
+        "veiculo_id": _numero(args, 'veiculo_id', tipo=int),
+        "custo_kwh": _numero(args, 'custo_kwh'),
+        "recargas_dia": _numero(args, 'recargas_dia', minimo_exclusivo=0, maximo=MAX_RECARGAS_DIA),
+        "pagina": _numero(args, 'pagina', obrigatorio=False, padrao=1, minimo_exclusivo=0, tipo=int),
+        "por_pagina": _numero(args, 'por_pagina', obrigatorio=False, padrao=20, minimo_exclusivo=0, tipo=int),
+    }
+    if parametros["por_pagina"] > por_pagina_max:
+        raise ErroApi(f"'por_pagina' no máximo {por_pagina_max}")
+    parametros.update(_tarifa(args))
+    return parametros
+
+
+def ler_pedido_comparacao(args):
+    """
+    GET /api/v1/comparacao?veiculo_id=1&carregador_id=7&custo_kwh=0.8&recargas_dia=2
+        [&tarifa_id=3&hora_inicio=18]
+    """
+    parametros = {
+        "veiculo_id": _numero(args, 'veiculo_id', tipo=int),
+        "carregador_id": _numero(args, 'carregador_id', tipo=int),
+        "custo_kwh": _numero(args, 'custo_kwh'),
+        "recargas_dia": _numero(args, 'recargas_dia', minimo_exclusivo=0, maximo=MAX_RECARGAS_DIA),
+    }
+    parametros.update(_tarifa(args))
+    return parametros
+
+
+def ler_pedido_comissao(args):
+    """ GET /api/v1/comissao?veiculo_id=1&recargas_dia=2&preco_venda_kwh=1.5&porcentagem_cliente=10 """
+    parametros = {
+        "veiculo_id": _numero(args, 'veiculo_id', tipo=int),
+        "recargas_dia": _numero(args, 'recargas_dia', minimo_exclusivo=0, maximo=MAX_RECARGAS_DIA),
+        "preco_venda_kwh": _numero(args, 'preco_venda_kwh'),
+        "porcentagem_cliente": _numero(args, 'porcentagem_cliente'),
+    }
+    if not 0 <= parametros["porcentagem_cliente"] <= 100:
+        raise ErroApi("'porcentagem_cliente' deve estar entre 0 e 100")
+    return parametros
+
+
+def etag_api(recurso, versao_catalogo, parametros, tarifa=None):
+    """
+    ETag forte: recurso + versão do catálogo + parâmetros já normalizados
+    (ordem e formato da query string não contam) + campos da tarifa usada.
+    """
+    chave = json.dumps([recurso, versao_catalogo, parametros, tarifa], sort_keys=True, separators=(',', ':'))
+    return f"v{versao_catalogo}-" + hashlib.sha1(chave.encode()).hexdigest()[:20]
+
+
+# --- Serialização ---
+
+def numero_json(valor):
+    # JSON não tem Infinity nem NaN: R$/kW de carregador sem preço (ou um valor
+    # que transbordou, ex. preco_venda_kwh=1e308) vai como null
+    return valor if math.isfinite(valor) else None
+
+
+def veiculo_json(veiculo):
+    return veiculo._asdict()
+
+
+def carregador_json(carregador):
+    return carregador._asdict()
+
+
+def tarifa_json(tarifa, hora_inicio):
+    if tarifa is None:
+        return None
+    return {"id": tarifa.id, "nome": tarifa.nome, "hora_inicio": hora_inicio}
+
+
+def custos_json(custos):
+    """ Dicionário de valores calculados (custos, comissão) pronto para JSON. """
+    return {chave: numero_json(float(valor)) for chave, valor in custos.items()}
+
+
+def linha_ranking_json(linha):
+    """ Uma entrada do ranking (mesmas chaves que os templates usam). """
+    saida = {
+        "carregador": carregador_json(linha["carregador"]),
+        "potencia_efetiva_kw": linha["potencia_efetiva_kw"],
+        "tempo_recarga_horas": linha["tempo_recarga_horas"],
+        "custo_beneficio_reais_por_kw": numero_json(linha["custo_beneficio_reais_por_kw"]),
+        "is_over_24h": bool(linha["is_over_24h"]),
+    }
+    if "custos" in linha:
+        saida["custos"] = custos_json(linha["custos"])
+    return saida
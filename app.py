@@ -1,33 +1,120 @@
 # Importações necessárias
+import time
+_inicio_importacao = time.perf_counter() # Orçamento de arranque (ver criar_app)
 from flask import (
-    Flask, render_template, request, redirect, url_for, flash, Response
+    Flask, render_template, request, redirect, url_for, flash, Response, jsonify,
+    stream_with_context, send_file
 )
 from flask_sqlalchemy import SQLAlchemy
+import click
+import gc
+from sqlalchemy import event, func, inspect, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import json
+import math
 import os
-import csv  # Para Request 3: Importação CSV
-import io   # Para ler o ficheiro CSV em memória
-
-# Importação para Request 5: PDF
-# Certifique-se de ter feito: pip install WeasyPrint
-
-# --- PDF DESATIVADO TEMPORARIAMENTE PARA A NUVEM ---
-# try:
-#     import weasyprint
-# except ImportError:
-#     weasyprint = None
-#     print("AVISO: WeasyPrint não instalado. Geração de PDF não irá funcionar.")
-#     print("Execute: pip install WeasyPrint")
-weasyprint = None # Garante que a variável existe como None
-# --- FIM DA DESATIVAÇÃO ---
+import re
+from catalogo_cache import CacheCatalogo
+from indice_compatibilidade import (
+    atualizar_alterados, atualizar_carregador, atualizar_veiculo, consultar_pagina, reconstruir
+)
+from curva_carga import (
+    SOC_FINAL_PADRAO, SOC_INICIAL_PADRAO, normalizar_curva, perfil_carga, validar_janela
+)
+from tarifa_horaria import (
+    MAX_RECARGAS_DIA, TarifaInvalida, ler_demanda, normalizar_fatores, normalizar_precos, perfil_tarifa
+)
+from motor_compatibilidade import RegistroCarregador, calcular_comissao, calcular_custos_gerais
+from simulacao_lote import ErroLote, gerar_lote_ndjson, ler_pedido_lote
+from importacao_csv import (
+    ESQUEMA_CARREGADORES, ESQUEMA_VEICULOS, RelatorioImportacao, abrir_csv_texto, hash_conteudo,
+    importar_csv
+)
+from sincronizacao_catalogo import (
+    FORMATOS, ErroSincronizacao, aplicar_diff, calcular_diff, ler_feed, validar_aplicacao
+)
+
+# Request 5: PDF
+# O WeasyPrint já não é importado aqui: a conversão corre num pool de
+# processos à parte (ver relatorio_pdf.py), que o importa só quando precisa.
+from agendador_deposito import ErroDeposito, ler_pedido_deposito, simular_deposito
+from otimizador_carregadores import ErroOtimizacao, ler_pedido_otimizacao, otimizar_mix
+from analise_monte_carlo import ErroMonteCarlo, analisar, ler_pedido_monte_carlo
+from relatorio_frota import ErroRelatorio, gerar_relatorio_csv, ler_pedido_relatorio
+from busca_catalogo import TIPOS, ErroBusca, ler_pedido_busca
+from instrumentacao import Instrumentacao
+from api_v1 import (
+    ErroApi, carregador_json, custos_json, etag_api, ler_pedido_comissao, ler_pedido_comparacao,
+    ler_pedido_simulacao, linha_ranking_json, tarifa_json, veiculo_json
+)
+from banco_sqlite import (
+    caminho_snapshot_padrao, configurar_pragmas, criar_indices, migrar, opcoes_engine, otimizar,
+    reiniciar_apos_fork
+)
+from relatorio_pdf import PENDENTE, PRONTO, FilaPDF, chave_relatorio
 
 # --- 1. Configuração Inicial ---
 basedir = os.path.abspath(os.path.dirname(__file__))
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'database.db')
+# DATABASE_URL permite apontar para outro ficheiro (ex.: banco descartável dos benchmarks)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'database.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool de ligações por worker (WAL + PRAGMAs em banco_sqlite.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(
+    app.config['SQLALCHEMY_DATABASE_URI'],
+    pool_size=int(os.environ.get('DB_POOL_TAMANHO', '5')),
+    max_overflow=int(os.environ.get('DB_POOL_EXTRA', '10')),
+)
 app.config['SECRET_KEY'] = 'uma-chave-secreta-muito-segura-mude-depois'
+# Intervalo (segundos) entre verificações da versão do catálogo noutros workers
+app.config['CATALOGO_VERIFICAR_INTERVALO'] = float(os.environ.get('CATALOGO_VERIFICAR_INTERVALO', '1.0'))
+# Snapshot colunar do catálogo partilhado pelos workers (ver snapshot_colunar.py): por
+# omissão ao lado do ficheiro SQLite; CATALOGO_SNAPSHOT='' deixa o catálogo em memória em cada worker
+app.config['CATALOGO_SNAPSHOT'] = os.environ.get(
+    'CATALOGO_SNAPSHOT', caminho_snapshot_padrao(app.config['SQLALCHEMY_DATABASE_URI'])
+) or None
+# Abaixo deste nº de linhas (veículos + carregadores) o catálogo fica em memória mesmo com o
+# snapshot colunar: o custo fixo do mapa e das vistas só compensa em catálogos grandes
+app.config['CATALOGO_SNAPSHOT_MIN_LINHAS'] = int(os.environ.get('CATALOGO_SNAPSHOT_MIN_LINHAS', '20000'))
+# Nº de linhas por lote (e por transação) nas importações CSV
+app.config['IMPORTACAO_TAMANHO_LOTE'] = int(os.environ.get('IMPORTACAO_TAMANHO_LOTE', '1000'))
+# Nº de carregadores por página no relatório do simulador (top-K)
+app.config['SIMULADOR_POR_PAGINA'] = int(os.environ.get('SIMULADOR_POR_PAGINA', '20'))
+# Pesquisa no catálogo: linhas por página nas listas do admin e nº de sugestões do typeahead
+app.config['ADMIN_POR_PAGINA'] = int(os.environ.get('ADMIN_POR_PAGINA', '50'))
+app.config['SUGESTOES_MAX'] = int(os.environ.get('SUGESTOES_MAX', '20'))
+# Exportação PDF: pasta da cache, processos de renderização, limite da cache e nº de linhas
+app.config['PDF_PASTA'] = os.environ.get('PDF_PASTA', os.path.join(basedir, 'cache_pdf'))
+app.config['PDF_WORKERS'] = int(os.environ.get('PDF_WORKERS', '2'))
+app.config['PDF_CACHE_MAX_MB'] = int(os.environ.get('PDF_CACHE_MAX_MB', '200'))
+app.config['PDF_MAX_CARREGADORES'] = int(os.environ.get('PDF_MAX_CARREGADORES', '50'))
+# Otimizador do mix de carregadores (comissão): tempo máximo por pedido e processos
+app.config['OTIMIZADOR_TEMPO_MAX_S'] = float(os.environ.get('OTIMIZADOR_TEMPO_MAX_S', '10'))
+app.config['OTIMIZADOR_WORKERS'] = int(os.environ.get('OTIMIZADOR_WORKERS', '2'))
+# Análise de cenários Monte Carlo: nº máximo de sorteios por pedido e processos (modo paralelo)
+app.config['MONTE_CARLO_MAX_SORTEIOS'] = int(os.environ.get('MONTE_CARLO_MAX_SORTEIOS', '200000'))
+app.config['MONTE_CARLO_WORKERS'] = int(os.environ.get('MONTE_CARLO_WORKERS', '2'))
+# Perfis de pedidos lentos (opt-in): limiar em ms (0 = desligado), pasta e intervalo de amostragem
+app.config['PERFIL_LIMIAR_MS'] = float(os.environ.get('PERFIL_LIMIAR_MS', '0'))
+app.config['PERFIL_PASTA'] = os.environ.get('PERFIL_PASTA', os.path.join(basedir, 'perfis'))
+app.config['PERFIL_INTERVALO_MS'] = float(os.environ.get('PERFIL_INTERVALO_MS', '5'))
+# Sincronização de feeds: fração máxima da tabela que um feed pode apagar (proteção contra feeds truncados)
+app.config['SINCRONIZACAO_MAX_APAGADOS'] = float(os.environ.get('SINCRONIZACAO_MAX_APAGADOS', '0.5'))
+# API JSON v1: tamanho máximo da página e threads do servidor ASGI (asgi.py)
+app.config['API_POR_PAGINA_MAX'] = int(os.environ.get('API_POR_PAGINA_MAX', '100'))
+app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', '15'))
+# Orçamento (segundos) do arranque até estar pronto a servir: importação + banco + catálogo
+app.config['ARRANQUE_ORCAMENTO_S'] = float(os.environ.get('ARRANQUE_ORCAMENTO_S', '5'))
 db = SQLAlchemy(app)
 
+with app.app_context():
+    configurar_pragmas(db.engine)
+    reiniciar_apos_fork(db.engine)
+
+# Métricas por rota, SQL e templates em /metrics (ver instrumentacao.py)
+instrumentacao = Instrumentacao()
+instrumentacao.init_app(app)
+
 
 # --- 2. Modelos do Banco de Dados (Request 2 ATUALIZADA) ---
 
@@ -45,10 +132,29 @@ class Veiculo(db.Model):
     potencia_max_carga_ac_kw = db.Column(db.Float, nullable=False, default=7.4)
     potencia_max_carga_dc_kw = db.Column(db.Float, nullable=False, default=0.0) # 0 se não suporta DC
     
+    # Janela de recarga (SoC %) e curva DC opcional "soc:kW soc:kW ..." (ver curva_carga.py)
+    soc_inicial = db.Column(db.Float, nullable=False, default=SOC_INICIAL_PADRAO)
+    soc_final = db.Column(db.Float, nullable=False, default=SOC_FINAL_PADRAO)
+    curva_carga = db.Column(db.Text, nullable=True)
+
+    # Hash dos campos do CSV (ver importacao_csv.hash_conteudo / sincronizacao_catalogo.py)
+    hash_conteudo = db.Column(db.String(40), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_veiculo_marca_modelo', 'marca', 'modelo'),
+    )
+    
     @property
     def nome_completo(self):
         dc_info = f"DC: {self.potencia_max_carga_dc_kw}kW" if self.potencia_max_carga_dc_kw > 0 else "DC: Não"
         return f"{self.marca} {self.modelo} ({self.capacidade_bateria_kwh} kWh | AC: {self.potencia_max_carga_ac_kw}kW | {dc_info})"
+    
+    @property
+    def perfil(self):
+        return perfil_carga(
+            self.capacidade_bateria_kwh, self.potencia_max_carga_dc_kw,
+            self.soc_inicial, self.soc_final, self.curva_carga
+        )
 
 class Carregador(db.Model):
     """
@@ -61,89 +167,370 @@ class Carregador(db.Model):
     potencia_saida_kw = db.Column(db.Float, nullable=False)
     tipo_corrente = db.Column(db.String(20), default='AC', nullable=False) # AC ou DC
     preco = db.Column(db.Float, default=0.0)
+    hash_conteudo = db.Column(db.String(40), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_carregador_marca_modelo', 'marca', 'modelo'),
+        # Filtro do simulador por corrente, já ordenado por potência
+        db.Index('ix_carregador_tipo_potencia', 'tipo_corrente', 'potencia_saida_kw'),
+    )
     
     @property
     def nome_completo(self):
         return f"{self.marca} {self.modelo} ({self.potencia_saida_kw} kW {self.tipo_corrente})"
 
-# --- CRIA AS TABELAS (SE NÃO EXISTIREM) ---
-# Isto é seguro de executar; não apaga dados.
-# Movido para aqui para funcionar na nuvem (produção).
-with app.app_context():
-    db.create_all()
+class CatalogoVersao(db.Model):
+    """
+    Linha única (id=1) com a versão do catálogo.
+    Incrementada em todas as escritas de Veículo/Carregador para que os
+    outros workers saibam que o seu cache está desatualizado.
+    """
+    __tablename__ = 'catalogo_versao'
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+class Compatibilidade(db.Model):
+    """
+    Índice de compatibilidade Veículo x Carregador (ver indice_compatibilidade.py).
+    Só guarda pares compatíveis, com potência efetiva e tempo já calculados.
+    """
+    __tablename__ = 'compatibilidade'
+    veiculo_id = db.Column(db.Integer, db.ForeignKey('veiculo.id'), primary_key=True)
+    carregador_id = db.Column(db.Integer, db.ForeignKey('carregador.id'), primary_key=True)
+    potencia_efetiva_kw = db.Column(db.Float, nullable=False)
+    tempo_recarga_horas = db.Column(db.Float, nullable=False)
+    preco = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Ranking de um veículo já ordenado: 1º tempo, 2º preço
+        db.Index('ix_compatibilidade_ranking',
+                 'veiculo_id', 'tempo_recarga_horas', 'preco', 'carregador_id'),
+        db.Index('ix_compatibilidade_carregador', 'carregador_id'),
+    )
+
+class Tarifa(db.Model):
+    """
+    Tarifa horária (TOU) com encargo de demanda (ver tarifa_horaria.py).
+    Preços por hora em texto: 24 valores ou faixas "0-16:0.65 17-20:1.95 21-23:0.65".
+    """
+    __tablename__ = 'tarifa'
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False, unique=True)
+    precos_dia_util = db.Column(db.Text, nullable=False)
+    precos_fim_semana = db.Column(db.Text, nullable=True) # NULL = igual ao dia útil
+    fatores_mensais = db.Column(db.Text, nullable=True) # NULL = sem sazonalidade
+    demanda_reais_kw_mes = db.Column(db.Float, nullable=False, default=0.0)
+
+    @property
+    def perfil(self):
+        return perfil_tarifa(
+            self.precos_dia_util, self.precos_fim_semana,
+            self.fatores_mensais, self.demanda_reais_kw_mes
+        )
+
+    @property
+    def campos_calculo(self):
+        """ Campos de que o custo depende (entram no ETag da API e na chave do PDF). """
+        return [
+            self.id, self.precos_dia_util, self.precos_fim_semana,
+            self.fatores_mensais, self.demanda_reais_kw_mes
+        ]
+
+# Escritas pelo ORM (formulários) mantêm o hash do conteúdo atualizado
+def _atualizar_hash(esquema):
+    def ouvinte(_mapper, _conexao, alvo):
+        alvo.hash_conteudo = hash_conteudo({campo: getattr(alvo, campo) for campo, _ in esquema}, esquema)
+    return ouvinte
+
+for _modelo, _esquema in ((Veiculo, ESQUEMA_VEICULOS), (Carregador, ESQUEMA_CARREGADORES)):
+    event.listen(_modelo, 'before_insert', _atualizar_hash(_esquema))
+    event.listen(_modelo, 'before_update', _atualizar_hash(_esquema))
+
+# --- MIGRAÇÕES DO ESQUEMA ---
+# Correm no arranque (também na nuvem), uma vez cada, com a versão em
+# PRAGMA user_version (ver banco_sqlite.migrar). Nunca apagam dados.
+# Uma alteração nova ao esquema = uma entrada nova no fim de MIGRACOES.
+# Colunas acrescentadas depois da criação original das tabelas.
+# create_all() não altera tabelas existentes, por isso são adicionadas aqui.
+COLUNAS_NOVAS = {
+    'veiculo': [
+        ('soc_inicial', f"FLOAT NOT NULL DEFAULT {SOC_INICIAL_PADRAO}"),
+        ('soc_final', f"FLOAT NOT NULL DEFAULT {SOC_FINAL_PADRAO}"),
+        ('curva_carga', "TEXT"),
+    ],
+}
+
+def _adicionar_colunas(conexao, colunas_por_tabela):
+    inspetor = inspect(conexao)
+    for tabela, colunas in colunas_por_tabela.items():
+        existentes = {c['name'] for c in inspetor.get_columns(tabela)}
+        for nome, definicao in colunas:
+            if nome not in existentes:
+                conexao.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {nome} {definicao}"))
+
+def _migrar_esquema_base(conexao):
+    """ Bancos novos e anteriores ao versionamento: tabelas em falta + colunas novas. """
+    db.metadata.create_all(conexao)
+    _adicionar_colunas(conexao, COLUNAS_NOVAS)
+
+def _migrar_indices_catalogo(conexao):
+    """ Índices (marca, modelo) e (tipo_corrente, potencia_saida_kw) em bancos já existentes. """
+    criar_indices(conexao, list(Veiculo.__table__.indexes) + list(Carregador.__table__.indexes))
+    conexao.execute(text("ANALYZE"))
+
+def _migrar_hash_conteudo(conexao):
+    """ Coluna hash_conteudo (sincronização de feeds); NULL = calculado na 1ª sincronização. """
+    _adicionar_colunas(conexao, {
+        'veiculo': [('hash_conteudo', "VARCHAR(40)")],
+        'carregador': [('hash_conteudo', "VARCHAR(40)")],
+    })
+
+MIGRACOES = [
+    (1, "esquema base", _migrar_esquema_base),
+    (2, "índices do catálogo", _migrar_indices_catalogo),
+    (3, "hash do conteúdo do catálogo", _migrar_hash_conteudo),
+]
+
+# Aplicadas por preparar_banco() (ver "Arranque"), não na importação do módulo
 # --- FIM DO BLOCO DE CRIAÇÃO ---
 
+# --- Índice de Compatibilidade (manutenção incremental) ---
+
+def _linhas_veiculos_indice():
+    """ Tuplas com os campos de RegistroVeiculo, por id. """
+    return db.session.execute(select(
+        Veiculo.id, Veiculo.marca, Veiculo.modelo, Veiculo.capacidade_bateria_kwh,
+        Veiculo.potencia_max_carga_ac_kw, Veiculo.potencia_max_carga_dc_kw,
+        Veiculo.soc_inicial, Veiculo.soc_final, Veiculo.curva_carga
+    ).order_by(Veiculo.id)).all()
+
+def _linhas_carregadores_indice():
+    return db.session.execute(select(
+        Carregador.id, Carregador.marca, Carregador.modelo,
+        Carregador.potencia_saida_kw, Carregador.tipo_corrente, Carregador.preco
+    ).order_by(Carregador.id)).all()
+
+def indexar_veiculo(veiculo):
+    """ Recalcula o índice de UM veículo. Chamar antes de commit_catalogo(). """
+    db.session.flush() # Garante o id de veículos novos
+    atualizar_veiculo(db.session, Compatibilidade.__table__, veiculo, _linhas_carregadores_indice())
+
+def indexar_carregador(carregador):
+    """ Recalcula o índice de UM carregador. Chamar antes de commit_catalogo(). """
+    db.session.flush()
+    atualizar_carregador(db.session, Compatibilidade.__table__, carregador, _linhas_veiculos_indice())
+
+def reconstruir_indice_compatibilidade():
+    """ Reconstrução completa (importações em massa / arranque com índice vazio). """
+    return reconstruir(
+        db.session, Compatibilidade.__table__,
+        _linhas_veiculos_indice(), _linhas_carregadores_indice()
+    )
+
+def atualizar_indice_alterados(tabela, ids, total):
+    """
+    Índice dos ids de `tabela` (veículos ou carregadores) tocados numa escrita
+    em massa; `total` é o nº de linhas da tabela depois da escrita. Quase
+    tudo novo (ex.: 1ª carga): a reconstrução vetorizada sai mais barata.
+    """
+    if 2 * len(ids) > total:
+        reconstruir_indice_compatibilidade()
+    else:
+        atualizar_alterados(
+            db.session, Compatibilidade.__table__,
+            ids if tabela is Veiculo.__table__ else (),
+            ids if tabela is Carregador.__table__ else (),
+            _linhas_veiculos_indice(), _linhas_carregadores_indice()
+        )
+
+@app.cli.command('reconstruir-indice')
+def reconstruir_indice_comando():
+    """ flask --app app reconstruir-indice """
+    preparar_banco()
+    total = reconstruir_indice_compatibilidade()
+    db.session.commit()
+    print(f"Índice de compatibilidade reconstruído: {total} pares.")
+
+# --- Cache do Catálogo (ver catalogo_cache.py) ---
+
+def _ler_versao_catalogo():
+    return db.session.execute(
+        select(CatalogoVersao.versao).where(CatalogoVersao.id == 1)
+    ).scalar_one()
+
+def _carregar_catalogo():
+    """ Lê versão + linhas na mesma transação (leitura consistente no SQLite). """
+    versao = _ler_versao_catalogo()
+    return versao, _linhas_veiculos_indice(), _linhas_carregadores_indice()
+
+cache_catalogo = CacheCatalogo(
+    _ler_versao_catalogo,
+    _carregar_catalogo,
+    intervalo_verificacao=app.config['CATALOGO_VERIFICAR_INTERVALO'],
+    caminho_snapshot=app.config['CATALOGO_SNAPSHOT'],
+    origem=app.config['SQLALCHEMY_DATABASE_URI'],
+    snapshot_min_linhas=app.config['CATALOGO_SNAPSHOT_MIN_LINHAS'],
+    indexar_busca=True # Índices de pesquisa prontos a cada versão nova (não na 1ª pesquisa)
+)
+
+# Contadores do cache deste worker também em /metrics
+instrumentacao.coletores.append(lambda: {
+    f"catalogo_cache_{chave}": valor
+    for chave, valor in cache_catalogo.estatisticas().items() if valor is not None
+})
+
+def obter_catalogo():
+    """ Snapshot só de leitura do catálogo (não toca no banco num cache hit). """
+    return cache_catalogo.obter()
+
+def commit_catalogo():
+    """
+    Substitui db.session.commit() em TODAS as escritas de Veículo/Carregador.
+    Incrementa a versão na mesma transação e invalida o cache local.
+    """
+    db.session.execute(
+        update(CatalogoVersao)
+        .where(CatalogoVersao.id == 1)
+        .values(versao=CatalogoVersao.versao + 1)
+    )
+    db.session.commit()
+    cache_catalogo.invalidar()
+
+# --- Arranque (ver criar_app) ---
+# Importar o módulo já não toca no banco. O trabalho de arranque corre em
+# criar_app(): com `gunicorn --preload` (gunicorn.conf.py) corre UMA vez no
+# processo mestre, antes do fork; os workers herdam o esquema verificado e o
+# catálogo já carregado, partilhado copy-on-write.
+# Sem a fábrica (`flask run`, `gunicorn app:app`, test client) o primeiro
+# pedido de cada processo prepara o banco (_garantir_banco).
+
+arranque = {"banco_preparado": False}
+
+def preparar_banco():
+    """ Migrações, linha da versão do catálogo e índice vazio. Idempotente, uma vez por processo. """
+    if arranque["banco_preparado"]:
+        return
+    with app.app_context():
+        for descricao in migrar(db.engine, MIGRACOES):
+            app.logger.info("Migração aplicada: %s", descricao)
+        # Garante a linha da versão (seguro com vários workers a arrancar ao mesmo tempo)
+        db.session.execute(
+            sqlite_insert(CatalogoVersao).values(id=1, versao=0).on_conflict_do_nothing()
+        )
+        db.session.commit()
+        # BD antigo (sem índice) ou catálogo carregado por fora: constrói uma vez
+        if db.session.execute(select(Compatibilidade.veiculo_id).limit(1)).first() is None:
+            reconstruir_indice_compatibilidade()
+            db.session.commit()
+    arranque["banco_preparado"] = True
+
+def aquecer_catalogo():
+    """ Snapshot do catálogo + índices de pesquisa + perfis de carga em memória. """
+    with app.app_context():
+        catalogo = obter_catalogo() # Já com os índices de pesquisa (indexar_busca)
+        for veiculo in catalogo.veiculos[:perfil_carga.cache_info().maxsize]:
+            veiculo.perfil
+    # Tudo o que existe agora fica fora do GC: as coleções dos workers não
+    # escrevem nos cabeçalhos destes objetos e as páginas continuam partilhadas
+    gc.freeze()
+
+def criar_app(aquecer=True):
+    """
+    Fábrica usada pelos servidores (asgi.py, `gunicorn 'app:criar_app()'`).
+    Devolve a app com o banco preparado e, com `aquecer`, o catálogo em memória.
+    Os tempos ficam em `arranque` (e em /metrics); acima de
+    ARRANQUE_ORCAMENTO_S fica um aviso no log.
+    """
+    t0 = time.perf_counter()
+    preparar_banco()
+    t1 = time.perf_counter()
+    if aquecer:
+        aquecer_catalogo()
+    t2 = time.perf_counter()
+    arranque.update(
+        importacao_s=t0 - _inicio_importacao,
+        banco_s=t1 - t0,
+        catalogo_s=t2 - t1,
+        total_s=t2 - _inicio_importacao,
+    )
+    if arranque["total_s"] > app.config['ARRANQUE_ORCAMENTO_S']:
+        app.logger.warning(
+            "Arranque em %.2fs, acima do orçamento de %.2fs (importação %.2fs, banco %.2fs, catálogo %.2fs)",
+            arranque["total_s"], app.config['ARRANQUE_ORCAMENTO_S'],
+            arranque["importacao_s"], arranque["banco_s"], arranque["catalogo_s"]
+        )
+    return app
+
+@app.before_request
+def _garantir_banco():
+    if not arranque["banco_preparado"]:
+        preparar_banco()
+
+instrumentacao.coletores.append(lambda: {
+    f"arranque_{chave}": valor for chave, valor in arranque.items() if chave.endswith('_s')
+})
+
 # --- 3. Lógica de Cálculo Central (Helper Function) ---
 
-def calcular_relatorio_comparativo(veiculo_id, custo_kwh, recargas_dia): # MUDANÇA: recargas_dia
+@instrumentacao.span('calcular_relatorio_paginado')
+def calcular_relatorio_paginado(veiculo_id, custo_kwh, recargas_dia, pagina=1, por_pagina=20,
+                                tarifa=None, hora_inicio=0.0):
     """
-    Função central que executa toda a lógica de cálculo.
-    Isso evita repetição de código entre a simulação web e o PDF.
+    Função central do simulador (página, PDF e API): custos gerais do veículo
+    e a página pedida do ranking, lida já ordenada do índice de
+    compatibilidade (top-K). Com `tarifa` (Tarifa horária) cada carregador
+    da página recebe os seus próprios 'custos'. Devolve também a paginação.
+    LookupError se o veículo não existir (apagado entretanto, id inválido).
     """
+    veiculo = obter_catalogo().veiculos_por_id.get(int(veiculo_id))
+    if veiculo is None:
+        raise LookupError("Veículo não encontrado")
     
-    veiculo = Veiculo.query.get(veiculo_id)
-    carregadores_db = Carregador.query.all()
-    
-    # Cálculos de Custo (independentes do carregador)
-    kwh_para_recarga = veiculo.capacidade_bateria_kwh * 0.60 # 20% a 80%
-    custo_por_recarga = kwh_para_recarga * custo_kwh
+    kwh_para_recarga = veiculo.perfil.kwh_para_recarga
+    custos_gerais = calcular_custos_gerais(kwh_para_recarga, custo_kwh, recargas_dia)
     
-    # MUDANÇA: Lógica de custo baseada em recargas diárias
-    custo_diario = custo_por_recarga * recargas_dia
-    custo_mensal = custo_diario * 30 # Média de 30 dias
-    custo_anual = custo_diario * 365
-    
-    custos_gerais = {
-        "custo_por_recarga": custo_por_recarga,
-        "custo_mensal": custo_mensal,
-        "custo_diario": custo_diario,
-        "custo_anual": custo_anual
-    }
-    
-    lista_de_resultados = []
+    total, linhas = consultar_pagina(
+        db.session, Compatibilidade.__table__, Carregador.__table__,
+        veiculo.id, pagina, por_pagina
+    )
     
-    for carregador in carregadores_db:
-        potencia_efetiva_kw = 0.0
-        
-        # Lógica AC/DC (sem alteração)
-        if carregador.tipo_corrente == 'AC':
-            potencia_efetiva_kw = min(veiculo.potencia_max_carga_ac_kw, carregador.potencia_saida_kw)
-        elif carregador.tipo_corrente == 'DC':
-            potencia_efetiva_kw = min(veiculo.potencia_max_carga_dc_kw, carregador.potencia_saida_kw)
-        
-        if potencia_efetiva_kw <= 0:
-            continue
-
-        # Cálculo de Tempo
-        tempo_recarga_horas = kwh_para_recarga / potencia_efetiva_kw
-        
-        # MUDANÇA: (Ponto 5) Lógica de Aviso 24h
-        horas_totais_dia = tempo_recarga_horas * recargas_dia
-        is_over_24h = (horas_totais_dia > 24)
-        
-        # Custo-Benefício (mantido R$/kW, mas a ordenação vai mudar)
-        if carregador.preco > 0:
-            custo_beneficio_reais_por_kw = carregador.preco / potencia_efetiva_kw
-        else:
-            custo_beneficio_reais_por_kw = float('inf') 
-        
-        lista_de_resultados.append({
+    resultados_comparativos = []
+    for linha in linhas:
+        carregador = RegistroCarregador(*linha[:6])
+        potencia_efetiva_kw = linha.potencia_efetiva_kw
+        tempo_recarga_horas = linha.tempo_recarga_horas
+        preco = carregador.preco or 0.0
+        resultados_comparativos.append({
             "carregador": carregador,
             "potencia_efetiva_kw": potencia_efetiva_kw,
             "tempo_recarga_horas": tempo_recarga_horas,
-            "custo_beneficio_reais_por_kw": custo_beneficio_reais_por_kw,
-            "is_over_24h": is_over_24h # NOVO
+            "custo_beneficio_reais_por_kw": preco / potencia_efetiva_kw if preco > 0 else float('inf'),
+            "is_over_24h": (tempo_recarga_horas * recargas_dia) > 24
         })
-            
-    # MUDANÇA: (Ponto 3) Nova Lógica de Ordenação
-    # 1º Critério: Menor tempo de recarga (mais rápido é melhor)
-    # 2º Critério: Menor preço (se o tempo for igual)
-    resultados_comparativos = sorted(
-        lista_de_resultados, 
-        key=lambda x: (x['tempo_recarga_horas'], x['carregador'].preco)
-    )
     
-    return veiculo, custos_gerais, resultados_comparativos
+    if tarifa is not None and resultados_comparativos:
+        # Custos horários só das linhas da página (uma passagem vetorizada)
+        pico = [
+            min(veiculo.potencia_max_carga_dc_kw if r["carregador"].tipo_corrente == 'DC'
+                else veiculo.potencia_max_carga_ac_kw, r["carregador"].potencia_saida_kw)
+            for r in resultados_comparativos
+        ]
+        custos = tarifa.perfil.custos(
+            [r["potencia_efetiva_kw"] for r in resultados_comparativos],
+            [r["tempo_recarga_horas"] for r in resultados_comparativos],
+            pico, hora_inicio, recargas_dia
+        )
+        for j, r in enumerate(resultados_comparativos):
+            r["custos"] = {chave: float(valores[j]) for chave, valores in custos.items()}
+    
+    paginacao = {
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total": total,
+        "total_paginas": max(1, -(-total // por_pagina)),
+        "inicio": (pagina - 1) * por_pagina
+    }
+    return veiculo, custos_gerais, resultados_comparativos, paginacao
 
 # --- 4. Rotas do Simulador (Request 5 ATUALIZADA) ---
 
@@ -152,33 +539,213 @@ def index():
     """ Página inicial agora é o simulador. """
     return redirect(url_for('simulador'))
 
+def _tarifa_do_formulario():
+    """
+    (Tarifa ou None, hora de início da recarga) dos campos opcionais do
+    formulário; ValueError se o id ou a hora não forem números válidos.
+    """
+    tarifa_id = request.form.get('tarifa_id')
+    tarifa = db.session.get(Tarifa, int(tarifa_id)) if tarifa_id else None
+    hora_inicio = float(request.form.get('hora_inicio') or 0)
+    if not math.isfinite(hora_inicio):
+        raise ValueError("a hora de início deve ser um número finito")
+    return tarifa, hora_inicio % 24
+
+def _recargas_dia_do_formulario():
+    """ recargas_dia do formulário, entre 0 (exclusive) e MAX_RECARGAS_DIA; ValueError se não. """
+    recargas_dia = float(request.form['recargas_dia'])
+    if not 0 < recargas_dia <= MAX_RECARGAS_DIA:
+        raise ValueError(f"o nº de recargas por dia deve ser maior que 0 e no máximo {MAX_RECARGAS_DIA}")
+    return recargas_dia
+
 @app.route('/simular', methods=['GET', 'POST'])
 def simulador():
-    veiculos_db = Veiculo.query.order_by(Veiculo.marca, Veiculo.modelo).all()
-    
     resultados_comparativos = None
     veiculo_selecionado = None
     custos_gerais = None
+    paginacao = None
+    tarifa = None
     custos_info = request.form 
 
     if request.method == 'POST':
-        veiculo_id = request.form['veiculo_id']
-        custo_kwh = float(request.form['custo_kwh'])
-        
         # MUDANÇA: (Ponto 4)
-        recargas_dia = float(request.form['recargas_dia']) 
-        
-        veiculo_selecionado, custos_gerais, resultados_comparativos = \
-            calcular_relatorio_comparativo(veiculo_id, custo_kwh, recargas_dia) # MUDANÇA
+        try:
+            veiculo_id = int(request.form['veiculo_id'])
+            custo_kwh = float(request.form['custo_kwh'])
+            pagina = max(1, int(request.form.get('pagina', 1)))
+            recargas_dia = _recargas_dia_do_formulario()
+            tarifa, hora_inicio = _tarifa_do_formulario()
+        except ValueError as e:
+            flash(f"Parâmetros inválidos: {e}", "error")
+        else:
+            # Só a página visível do ranking (top-K), lida do índice de compatibilidade
+            try:
+                veiculo_selecionado, custos_gerais, resultados_comparativos, paginacao = \
+                    calcular_relatorio_paginado(
+                        veiculo_id, custo_kwh, recargas_dia,
+                        pagina=pagina, por_pagina=app.config['SIMULADOR_POR_PAGINA'],
+                        tarifa=tarifa, hora_inicio=hora_inicio
+                    )
+            except LookupError as e:
+                flash(e.args[0], "error")
     
     # O resto da função renderiza normalmente
     return render_template(
         'simulador.html', 
-        veiculos=veiculos_db, 
+        tarifas=Tarifa.query.order_by(Tarifa.nome).all(),
+        tarifa=tarifa,
         veiculo_selecionado=veiculo_selecionado,
         custos_info=custos_info,
         custos_gerais=custos_gerais,
-        resultados_comparativos=resultados_comparativos
+        resultados_comparativos=resultados_comparativos,
+        paginacao=paginacao
+    )
+
+@app.route('/api/simular/lote', methods=['POST'])
+def simular_lote():
+    """
+    Simulação em lote para frotas (JSON -> NDJSON em streaming).
+    Uma linha por combinação veículo x custo_kwh x recargas_dia, com os
+    custos_gerais e o ranking de carregadores. Ver simulacao_lote.py.
+    """
+    try:
+        veiculo_ids, cenarios, limite = ler_pedido_lote(request.get_json(silent=True))
+    except ErroLote as e:
+        return jsonify({"erro": str(e)}), 400
+
+    catalogo = obter_catalogo() # Um só snapshot para o lote inteiro
+    return Response(
+        stream_with_context(gerar_lote_ndjson(catalogo, veiculo_ids, cenarios, limite)),
+        mimetype='application/x-ndjson'
+    )
+
+@app.route('/api/deposito/simular', methods=['POST'])
+def simular_deposito_frota():
+    """
+    Simulação de um depósito de frota: veículos com rotina diária a partilhar
+    carregadores sob um limite de potência do local. Devolve utilização,
+    tempos de espera e energia não atendida. Ver agendador_deposito.py.
+    """
+    try:
+        grupos_veiculos, grupos_carregadores, opcoes = ler_pedido_deposito(
+            request.get_json(silent=True), obter_catalogo()
+        )
+        with instrumentacao.medir('simular_deposito'):
+            resultado = simular_deposito(grupos_veiculos, grupos_carregadores, **opcoes)
+        return jsonify(resultado)
+    except ErroDeposito as e:
+        return jsonify({"erro": str(e)}), 400
+
+@app.route('/api/simular/monte_carlo', methods=['POST'])
+def simular_monte_carlo():
+    """
+    Análise de cenários: custo_kwh, recargas_dia, janela de SoC e dias_mes
+    como distribuições. Devolve faixas de percentis dos custos e, por
+    carregador compatível, do tempo de recarga e a probabilidade de passar
+    das 24h. Ver analise_monte_carlo.py.
+    """
+    catalogo = obter_catalogo() # O veículo e a matriz vêm do mesmo snapshot
+    try:
+        argumentos = ler_pedido_monte_carlo(
+            request.get_json(silent=True), catalogo,
+            max_sorteios=app.config['MONTE_CARLO_MAX_SORTEIOS']
+        )
+        with instrumentacao.medir('analise_monte_carlo'):
+            resultado = analisar(
+                matriz=catalogo.matriz, workers=app.config['MONTE_CARLO_WORKERS'], **argumentos
+            )
+        return jsonify(resultado)
+    except ErroMonteCarlo as e:
+        return jsonify({"erro": str(e)}), 400
+
+# --- Exportação PDF (Request 5) ---
+
+fila_pdf = FilaPDF(
+    app.config['PDF_PASTA'],
+    max_workers=app.config['PDF_WORKERS'],
+    max_bytes=app.config['PDF_CACHE_MAX_MB'] * 1024 * 1024
+)
+
+def _resposta_pdf(job_id, estado, erro=None):
+    resposta = {
+        "job_id": job_id,
+        "estado": estado,
+        "url_estado": url_for('estado_pdf', job_id=job_id),
+        "url_download": url_for('download_pdf', job_id=job_id),
+    }
+    if erro:
+        resposta["erro"] = erro
+    return resposta
+
+def _validar_job_id(job_id):
+    # job_id é um hash hexadecimal: nunca deixa chegar ".." ou "/" ao caminho
+    return re.fullmatch(r'[0-9a-f]{32}', job_id) is not None
+
+@app.route('/simular/pdf', methods=['POST'])
+def exportar_pdf():
+    """
+    Pede o PDF do relatório do simulador. Responde logo com um job_id:
+    200 se o PDF já estava em cache, 202 se foi posto na fila.
+    """
+    try:
+        veiculo_id = int(request.form['veiculo_id'])
+        custo_kwh = float(request.form['custo_kwh'])
+        recargas_dia = _recargas_dia_do_formulario()
+        tarifa, hora_inicio = _tarifa_do_formulario()
+    except (KeyError, ValueError) as e:
+        return jsonify({"erro": f"Parâmetros inválidos: {e}"}), 400
+    if request.form.get('tarifa_id') and tarifa is None:
+        return jsonify({"erro": "Tarifa não encontrada"}), 404
+
+    catalogo = obter_catalogo()
+    if veiculo_id not in catalogo.veiculos_por_id:
+        return jsonify({"erro": "Veículo não encontrado"}), 404
+
+    # A tarifa (e a hora de início) entram na chave: o mesmo orçamento com tarifa plana é outro PDF
+    job_id = chave_relatorio(
+        catalogo.versao, veiculo_id, custo_kwh, recargas_dia,
+        tarifa=tarifa.campos_calculo if tarifa is not None else None, hora_inicio=hora_inicio
+    )
+
+    def gerar_html():
+        veiculo, custos_gerais, resultados_comparativos, _ = calcular_relatorio_paginado(
+            veiculo_id, custo_kwh, recargas_dia,
+            pagina=1, por_pagina=app.config['PDF_MAX_CARREGADORES'],
+            tarifa=tarifa, hora_inicio=hora_inicio
+        )
+        return render_template(
+            'relatorio_pdf.html',
+            veiculo_selecionado=veiculo,
+            tarifa=tarifa,
+            custos_info={"custo_kwh": custo_kwh, "recargas_dia": recargas_dia, "hora_inicio": hora_inicio},
+            custos_gerais=custos_gerais,
+            resultados_comparativos=resultados_comparativos
+        )
+
+    estado = fila_pdf.submeter(job_id, gerar_html)
+    return jsonify(_resposta_pdf(job_id, estado)), (200 if estado == PRONTO else 202)
+
+@app.route('/simular/pdf/<job_id>')
+def estado_pdf(job_id):
+    """ Estado de um job de PDF: pronto / pendente / erro / desconhecido. """
+    if not _validar_job_id(job_id):
+        return jsonify({"erro": "job_id inválido"}), 400
+    estado, erro = fila_pdf.estado(job_id)
+    return jsonify(_resposta_pdf(job_id, estado, erro))
+
+@app.route('/simular/pdf/<job_id>/download')
+def download_pdf(job_id):
+    if not _validar_job_id(job_id):
+        return jsonify({"erro": "job_id inválido"}), 400
+    caminho = fila_pdf.caminho_pdf(job_id)
+    if caminho is None:
+        estado, erro = fila_pdf.estado(job_id)
+        return jsonify(_resposta_pdf(job_id, estado, erro)), (202 if estado == PENDENTE else 404)
+    return send_file(
+        caminho,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name='relatorio_carregadores.pdf'
     )
 
 # --- 5. Rotas de Admin (Request 1, 3, 4 ATUALIZADAS) ---
@@ -188,17 +755,136 @@ def admin_dashboard():
     """ Request 1: Nova página principal do Admin """
     return render_template('admin_dashboard.html')
 
+def _pesquisar_catalogo(tipo, args):
+    """ (página de registos, cursor seguinte, total encontrado, facetas, pedido) da pesquisa. """
+    pedido = ler_pedido_busca(
+        args, tipo, por_pagina_padrao=app.config['ADMIN_POR_PAGINA'],
+        por_pagina_max=app.config['API_POR_PAGINA_MAX']
+    )
+    indice = obter_catalogo().busca(tipo)
+    mascara = indice.filtrar(pedido["texto"], pedido["intervalos"], pedido["categorias"])
+    registros, proximo = indice.pagina(mascara, pedido["cursor"], pedido["por_pagina"])
+    return registros, proximo, int(mascara.sum()), indice.facetas(mascara), pedido
+
+def _lista_admin(tipo, template, nome):
+    """ Lista do admin paginada por cursor, com pesquisa e filtros na query string. """
+    try:
+        registros, proximo, total, facetas, _ = _pesquisar_catalogo(tipo, request.args)
+    except ErroBusca as e:
+        flash(f'Pesquisa inválida: {e}', 'error')
+        registros, proximo, total, facetas = [], None, 0, {}
+    filtros = request.args.to_dict()
+    filtros.pop('cursor', None)
+    return render_template(
+        template, **{nome: registros}, total=total, facetas=facetas,
+        filtros=filtros, proximo_cursor=proximo
+    )
+
 @app.route('/admin/veiculos')
 def admin_veiculos():
-    """ Request 1: Página dedicada para Veículos (AGORA COM LISTA) """
-    veiculos = Veiculo.query.order_by(Veiculo.marca, Veiculo.modelo).all()
-    return render_template('admin_veiculos.html', veiculos=veiculos)
+    """ Request 1: Página dedicada para Veículos (lista paginada com pesquisa) """
+    return _lista_admin('veiculos', 'admin_veiculos.html', 'veiculos')
 
 @app.route('/admin/carregadores')
 def admin_carregadores():
-    """ Request 1: Página dedicada para Carregadores (AGORA COM LISTA) """
-    carregadores = Carregador.query.order_by(Carregador.marca, Carregador.modelo).all()
-    return render_template('admin_carregadores.html', carregadores=carregadores)
+    """ Request 1: Página dedicada para Carregadores (lista paginada com pesquisa) """
+    return _lista_admin('carregadores', 'admin_carregadores.html', 'carregadores')
+
+@app.route('/api/catalogo/<tipo>/busca')
+def buscar_catalogo(tipo):
+    """
+    Pesquisa facetada: texto (prefixo / aproximado) em marca e modelo,
+    intervalos <campo>_min / <campo>_max, marca / tipo_corrente e cursor.
+    Ver busca_catalogo.py.
+    """
+    if tipo not in TIPOS:
+        return jsonify({"erro": "tipo deve ser 'veiculos' ou 'carregadores'"}), 404
+    try:
+        registros, proximo, total, facetas, _ = _pesquisar_catalogo(tipo, request.args)
+    except ErroBusca as e:
+        return jsonify({"erro": str(e)}), 400
+    serializar = veiculo_json if tipo == 'veiculos' else carregador_json
+    return jsonify({
+        "total": total,
+        "itens": [serializar(r) for r in registros],
+        "facetas": facetas,
+        "proximo_cursor": proximo,
+    })
+
+@app.route('/api/catalogo/<tipo>/sugestoes')
+def sugestoes_catalogo(tipo):
+    """ Typeahead: ?q=tes mod&limite=10 -> [{id, nome}] pela ordem do catálogo. """
+    if tipo not in TIPOS:
+        return jsonify({"erro": "tipo deve ser 'veiculos' ou 'carregadores'"}), 404
+    try:
+        limite = min(int(request.args.get('limite') or 10), app.config['SUGESTOES_MAX'])
+    except ValueError:
+        return jsonify({"erro": "'limite' deve ser um inteiro"}), 400
+    registros = obter_catalogo().busca(tipo).sugerir(request.args.get('q', ''), max(limite, 1))
+    return jsonify([{"id": r.id, "nome": r.nome_completo} for r in registros])
+
+@app.route('/admin/catalogo/estatisticas')
+def estatisticas_catalogo():
+    """ Contadores do cache do catálogo (hits / misses / reloads) deste worker. """
+    return jsonify(cache_catalogo.estatisticas())
+
+@app.route('/metrics')
+def metricas():
+    """ Métricas deste worker no formato de texto do Prometheus (ver instrumentacao.py). """
+    return Response(instrumentacao.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/tarifas')
+def admin_tarifas():
+    """ Tarifas horárias (TOU) usadas no simulador e no comparativo 1x1. """
+    tarifas = Tarifa.query.order_by(Tarifa.nome).all()
+    return render_template('admin_tarifas.html', tarifas=tarifas)
+
+def _campos_tarifa_do_formulario():
+    """ Campos da tarifa já validados e no formato canónico. """
+    fim_semana = (request.form.get('precos_fim_semana') or '').strip()
+    return {
+        "nome": request.form['nome'].strip(),
+        "precos_dia_util": normalizar_precos(request.form['precos_dia_util']),
+        "precos_fim_semana": normalizar_precos(fim_semana) if fim_semana else None,
+        "fatores_mensais": normalizar_fatores(request.form.get('fatores_mensais')),
+        "demanda_reais_kw_mes": ler_demanda(request.form.get('demanda_reais_kw_mes')),
+    }
+
+@app.route('/add_tarifa', methods=['POST'])
+def add_tarifa():
+    """ Adiciona uma tarifa horária e redireciona para a pág. de tarifas """
+    try:
+        nova_tarifa = Tarifa(**_campos_tarifa_do_formulario())
+        db.session.add(nova_tarifa)
+        db.session.commit()
+        flash(f"Tarifa {nova_tarifa.nome} cadastrada com sucesso!", "success")
+    except TarifaInvalida as e:
+        flash(f"Erro ao cadastrar tarifa: {e}", "error")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Erro ao cadastrar tarifa: {e}", "error")
+    
+    return redirect(url_for('admin_tarifas'))
+
+@app.route('/admin/tarifa/<int:tarifa_id>/apagar', methods=['POST'])
+def apagar_tarifa(tarifa_id):
+    """ Remove uma tarifa (não afeta o catálogo). """
+    tarifa = db.get_or_404(Tarifa, tarifa_id)
+    db.session.delete(tarifa)
+    db.session.commit()
+    flash(f"Tarifa {tarifa.nome} removida.", "success")
+    return redirect(url_for('admin_tarifas'))
+
+def _campos_curva_do_formulario():
+    """ Janela de SoC e curva DC dos formulários de veículo (campos opcionais). """
+    soc_inicial = float(request.form.get('soc_inicial') or SOC_INICIAL_PADRAO)
+    soc_final = float(request.form.get('soc_final') or SOC_FINAL_PADRAO)
+    validar_janela(soc_inicial, soc_final)
+    return {
+        "soc_inicial": soc_inicial,
+        "soc_final": soc_final,
+        "curva_carga": normalizar_curva(request.form.get('curva_carga')),
+    }
 
 @app.route('/add_veiculo', methods=['POST'])
 def add_veiculo():
@@ -210,10 +896,13 @@ def add_veiculo():
             capacidade_bateria_kwh=float(request.form['capacidade_bateria_kwh']),
             # Request 2: Campos AC/DC
             potencia_max_carga_ac_kw=float(request.form['potencia_max_carga_ac_kw']),
-            potencia_max_carga_dc_kw=float(request.form['potencia_max_carga_dc_kw'])
+            potencia_max_carga_dc_kw=float(request.form['potencia_max_carga_dc_kw']),
+            # Curva de carga (opcionais)
+            **_campos_curva_do_formulario()
         )
         db.session.add(novo_veiculo)
-        db.session.commit()
+        indexar_veiculo(novo_veiculo)
+        commit_catalogo()
         flash(f"Veículo {novo_veiculo.marca} {novo_veiculo.modelo} cadastrado com sucesso!", "success")
     except Exception as e:
         db.session.rollback()
@@ -233,7 +922,8 @@ def add_carregador():
             preco=float(request.form['preco'])
         )
         db.session.add(novo_carregador)
-        db.session.commit()
+        indexar_carregador(novo_carregador)
+        commit_catalogo()
         flash(f"Carregador {novo_carregador.marca} {novo_carregador.modelo} cadastrado com sucesso!", "success")
     except Exception as e:
         db.session.rollback()
@@ -244,87 +934,169 @@ def add_carregador():
 
 # --- 6. Rotas de Importação CSV (Request 3) ---
 
-@app.route('/admin/importar_veiculos', methods=['POST'])
-def importar_veiculos():
-    """ Request 3: Lógica de importação de CSV de Veículos """
+def _processar_importacao(tabela, esquema, destino, nome_plural):
+    """
+    Fluxo comum dos dois importadores: valida o upload, corre a importação
+    em lotes (importacao_csv.py) e mostra o relatório por linha.
+    """
     if 'csv_file' not in request.files:
         flash("Nenhum ficheiro enviado.", "error")
-        return redirect(url_for('admin_veiculos'))
+        return redirect(url_for(destino))
     
     file = request.files['csv_file']
     
     if file.filename == '':
         flash("Nenhum ficheiro selecionado.", "error")
-        return redirect(url_for('admin_veiculos'))
+        return redirect(url_for(destino))
 
-    if file and file.filename.endswith('.csv'):
-        try:
-            # CORREÇÃO: 'latin-1' para Excel (PT) e delimiter=';'
-            stream = io.TextIOWrapper(file.stream._file, 'latin-1')
-            csv_reader = csv.DictReader(stream, delimiter=';')
-            
-            count = 0
-            for row in csv_reader:
-                veiculo = Veiculo(
-                    marca=row['marca'],
-                    modelo=row['modelo'],
-                    capacidade_bateria_kwh=float(row['capacidade_bateria_kwh']),
-                    potencia_max_carga_ac_kw=float(row['potencia_max_carga_ac_kw']),
-                    potencia_max_carga_dc_kw=float(row['potencia_max_carga_dc_kw'])
-                )
-                db.session.add(veiculo)
-                count += 1
-            
-            db.session.commit()
-            flash(f"{count} veículos importados com sucesso!", "success")
-        except Exception as e: # <-- O bloco 'except' está aqui, com a indentação correta
-            db.session.rollback()
-            flash(f"Erro ao processar o CSV: {e}. Verifique se as colunas estão corretas.", "error")
-    else:
+    if not (file and file.filename.endswith('.csv')):
         flash("Ficheiro inválido. Por favor, envie um .csv.", "error")
+        return redirect(url_for(destino))
 
-    return redirect(url_for('admin_veiculos'))
+    try:
+        # CORREÇÃO: 'latin-1' para Excel (PT) e delimiter=';'
+        with instrumentacao.medir(f'importar_csv_{tabela.name}'):
+            relatorio = importar_csv(
+                db.engine,
+                tabela,
+                abrir_csv_texto(file, 'latin-1'),
+                esquema,
+                tamanho_lote=app.config['IMPORTACAO_TAMANHO_LOTE'],
+                upsert=('upsert' in request.form),
+            )
+    except Exception as e:
+        flash(f"Erro ao processar o CSV: {e}. Verifique se as colunas estão corretas.", "error")
+        # Os lotes gravados antes da falha ficam: o índice e a versão têm de os acompanhar
+        relatorio = getattr(e, 'relatorio', None)
+        if relatorio is None:
+            return redirect(url_for(destino))
+
+    if relatorio.processados:
+        # Só as linhas importadas (ou tudo, se forem a maioria da tabela)
+        with instrumentacao.medir('atualizar_indice_compatibilidade'):
+            total = db.session.execute(select(func.count()).select_from(tabela)).scalar_one()
+            atualizar_indice_alterados(tabela, relatorio.ids, total)
+        commit_catalogo() # Nova versão do catálogo (as escritas foram feitas em lote, via Core)
+        otimizar(db.engine) # Estatísticas do planeador depois da carga em massa
+        flash(
+            f"{relatorio.inseridos} {nome_plural} importados e "
+            f"{relatorio.atualizados} atualizados com sucesso!", "success"
+        )
+
+    if relatorio.total_erros:
+        detalhes = "; ".join(f"linha {linha}: {msg}" for linha, msg in relatorio.erros[:10])
+        if relatorio.total_erros > 10:
+            detalhes += f"; ... (+{relatorio.total_erros - 10} erros)"
+        flash(f"{relatorio.total_erros} linha(s) ignorada(s): {detalhes}", "error")
+
+    return redirect(url_for(destino))
+
+@app.route('/admin/importar_veiculos', methods=['POST'])
+def importar_veiculos():
+    """ Request 3: Importação de CSV de Veículos (streaming, em lotes) """
+    return _processar_importacao(
+        Veiculo.__table__, ESQUEMA_VEICULOS, 'admin_veiculos', 'veículos'
+    )
 
 @app.route('/admin/importar_carregadores', methods=['POST'])
 def importar_carregadores():
-    """ Request 3: Lógica de importação de CSV de Carregadores """
-    if 'csv_file' not in request.files:
-        flash("Nenhum ficheiro enviado.", "error")
-        return redirect(url_for('admin_carregadores'))
-    
-    file = request.files['csv_file']
-    
-    if file.filename == '':
-        flash("Nenhum ficheiro selecionado.", "error")
-        return redirect(url_for('admin_carregadores'))
+    """ Request 3: Importação de CSV de Carregadores (tipo_corrente deve ser AC ou DC) """
+    return _processar_importacao(
+        Carregador.__table__, ESQUEMA_CARREGADORES, 'admin_carregadores', 'carregadores'
+    )
+
+# --- Sincronização de Feeds do Catálogo (ver sincronizacao_catalogo.py) ---
+
+TABELAS_SINCRONIZACAO = {
+    'veiculos': (Veiculo.__table__, ESQUEMA_VEICULOS),
+    'carregadores': (Carregador.__table__, ESQUEMA_CARREGADORES),
+}
+
+def sincronizar_catalogo(tipo, stream_texto, formato, aplicar=False, assinatura=None):
+    """
+    Diff do feed completo contra a tabela. Sem `aplicar` não escreve nada
+    (pré-visualização). Com `aplicar` grava só as alterações, recalcula o
+    índice só dos ids tocados e publica uma nova versão, numa transação.
+    Devolve o resumo do diff (com 'aplicado').
+    """
+    tabela, esquema = TABELAS_SINCRONIZACAO[tipo]
+    relatorio = RelatorioImportacao()
+    with instrumentacao.medir(f'sincronizar_{tabela.name}'):
+        diff = calcular_diff(
+            db.session, tabela, esquema, ler_feed(stream_texto, formato, esquema, relatorio), relatorio
+        )
+        resumo = dict(diff.resumo(), aplicado=False)
+        if not aplicar:
+            db.session.rollback()
+            return resumo
 
-    if file and file.filename.endswith('.csv'):
         try:
-            # CORREÇÃO: 'latin-1' para Excel (PT) e delimiter=';'
-            stream = io.TextIOWrapper(file.stream._file, 'latin-1')
-            csv_reader = csv.DictReader(stream, delimiter=';')
-            
-            count = 0
-            for row in csv_reader:
-                carregador = Carregador(
-                    marca=row['marca'],
-                    modelo=row['modelo'],
-                    potencia_saida_kw=float(row['potencia_saida_kw']),
-                    tipo_corrente=row['tipo_corrente'], # Deve ser 'AC' ou 'DC'
-                    preco=float(row['preco'])
-                )
-                db.session.add(carregador)
-                count += 1
-            
-            db.session.commit()
-            flash(f"{count} carregadores importados com sucesso!", "success")
-        except Exception as e: # <-- O bloco 'except' está aqui, com a indentação correta
+            total = db.session.execute(select(func.count()).select_from(tabela)).scalar_one()
+            validar_aplicacao(diff, total, assinatura, app.config['SINCRONIZACAO_MAX_APAGADOS'])
+            alterados, apagados = aplicar_diff(db.session, tabela, diff)
+            if alterados or apagados:
+                atualizar_indice_alterados(tabela, alterados + apagados, total + len(diff.inserir))
+                commit_catalogo()
+            else:
+                db.session.commit() # Só hashes preenchidos: o conteúdo não mudou
+        except ErroSincronizacao as e:
             db.session.rollback()
-            flash(f"Erro ao processar o CSV: {e}. Verifique as colunas (tipo_corrente deve ser AC ou DC).", "error")
-    else:
-        flash("Ficheiro inválido. Por favor, envie um .csv.", "error")
+            e.resumo = resumo
+            raise
+        except Exception:
+            db.session.rollback()
+            raise
+    resumo['aplicado'] = True
+    return resumo
+
+@app.route('/api/catalogo/sincronizar/<tipo>', methods=['POST'])
+def sincronizar_feed(tipo):
+    """
+    Sincroniza veículos ou carregadores com um feed completo (CSV ou JSONL).
+    Multipart: 'feed' (ficheiro), 'formato' (csv|jsonl, por omissão pela
+    extensão), 'encoding', 'aplicar' (1 = grava; senão só o resumo) e
+    'assinatura' (opcional: a do resumo pré-visualizado).
+    """
+    if tipo not in TABELAS_SINCRONIZACAO:
+        return jsonify({"erro": f"tipo deve ser um de {', '.join(sorted(TABELAS_SINCRONIZACAO))}"}), 404
+    ficheiro = request.files.get('feed')
+    if ficheiro is None or ficheiro.filename == '':
+        return jsonify({"erro": "envie o ficheiro no campo 'feed'"}), 400
+
+    formato = request.form.get('formato') or (
+        'jsonl' if ficheiro.filename.endswith(('.jsonl', '.ndjson')) else 'csv')
+    encoding = request.form.get('encoding') or ('utf-8' if formato == 'jsonl' else 'latin-1')
+    try:
+        resumo = sincronizar_catalogo(
+            tipo, abrir_csv_texto(ficheiro, encoding), formato,
+            aplicar=request.form.get('aplicar') in ('1', 'true', 'sim'),
+            assinatura=request.form.get('assinatura') or None
+        )
+    except ErroSincronizacao as e:
+        return jsonify({"erro": str(e), "resumo": getattr(e, 'resumo', None)}), 400
+    except UnicodeDecodeError as e:
+        return jsonify({"erro": f"encoding inválido ({encoding}): {e}"}), 400
+    return jsonify(resumo)
+
+@app.cli.command('sincronizar-catalogo')
+@click.argument('tipo', type=click.Choice(sorted(TABELAS_SINCRONIZACAO)))
+@click.argument('ficheiro', type=click.Path(exists=True, dir_okay=False))
+@click.option('--aplicar', is_flag=True, help="Grava as alterações (senão só mostra o resumo).")
+@click.option('--formato', type=click.Choice(FORMATOS), help="Por omissão pela extensão.")
+@click.option('--encoding', help="Por omissão utf-8 (jsonl) ou latin-1 (csv).")
+@click.option('--assinatura', help="Só aplica se o diff for o pré-visualizado.")
+def sincronizar_catalogo_comando(tipo, ficheiro, aplicar, formato, encoding, assinatura):
+    """ flask --app app sincronizar-catalogo carregadores feed.jsonl [--aplicar] """
+    preparar_banco()
+    formato = formato or ('jsonl' if ficheiro.endswith(('.jsonl', '.ndjson')) else 'csv')
+    encoding = encoding or ('utf-8' if formato == 'jsonl' else 'latin-1')
+    with open(ficheiro, encoding=encoding, newline='') as stream:
+        try:
+            resumo = sincronizar_catalogo(tipo, stream, formato, aplicar, assinatura)
+        except ErroSincronizacao as e:
+            raise click.ClickException(str(e))
+    print(json.dumps(resumo, indent=2, ensure_ascii=False))
 
-    return redirect(url_for('admin_carregadores'))
 # --- 7. Rotas de Edição (NOVA FUNCIONALIDADE) ---
 
 @app.route('/admin/veiculo/<int:veiculo_id>/editar', methods=['GET', 'POST'])
@@ -346,9 +1118,12 @@ def editar_veiculo(veiculo_id):
             veiculo.capacidade_bateria_kwh = float(request.form['capacidade_bateria_kwh'])
             veiculo.potencia_max_carga_ac_kw = float(request.form['potencia_max_carga_ac_kw'])
             veiculo.potencia_max_carga_dc_kw = float(request.form['potencia_max_carga_dc_kw'])
+            for campo, valor in _campos_curva_do_formulario().items():
+                setattr(veiculo, campo, valor)
             
-            # 4. Salva (commit) as alterações na sessão do BD
-            db.session.commit()
+            # 4. Salva (commit) as alterações na sessão do BD (e nova versão do catálogo)
+            indexar_veiculo(veiculo)
+            commit_catalogo()
             flash(f"Veículo '{veiculo.nome_completo}' atualizado com sucesso!", "success")
         except Exception as e:
             db.session.rollback() # Desfaz em caso de erro
@@ -378,7 +1153,8 @@ def editar_carregador(carregador_id):
             carregador.tipo_corrente = request.form['tipo_corrente'] # Vem do <select>
             carregador.preco = float(request.form['preco']) # O campo que você queria editar!
             
-            db.session.commit()
+            indexar_carregador(carregador)
+            commit_catalogo()
             flash(f"Carregador '{carregador.nome_completo}' atualizado com sucesso!", "success")
         except Exception as e:
             db.session.rollback()
@@ -388,54 +1164,82 @@ def editar_carregador(carregador_id):
     
     # GET: Mostra o formulário de edição com os dados atuais
     return render_template('editar_carregador.html', carregador=carregador)
+def calcular_comparacao_direta(veiculo, carregador, custo_kwh, recargas_dia, tarifa=None, hora_inicio=0.0):
+    """
+    Comparação 1x1 (página e API v1). None se a combinação for incompatível.
+    """
+    # Lógica de cálculo (similar ao 'calcular_relatorio_paginado' mas para 1 item)
+    potencia_efetiva_kw = 0.0
+    if carregador.tipo_corrente == 'AC':
+        potencia_efetiva_kw = min(veiculo.potencia_max_carga_ac_kw, carregador.potencia_saida_kw)
+    elif carregador.tipo_corrente == 'DC':
+        potencia_efetiva_kw = min(veiculo.potencia_max_carga_dc_kw, carregador.potencia_saida_kw)
+
+    if potencia_efetiva_kw <= 0:
+        return None
+
+    perfil = veiculo.perfil
+    kwh_para_recarga = perfil.kwh_para_recarga
+    potencia_pico_kw = potencia_efetiva_kw
+    tempo_recarga_horas = perfil.tempo_horas(
+        potencia_efetiva_kw, carregador.tipo_corrente == 'DC'
+    )
+    # Com curva DC, mostramos a potência média da sessão
+    if carregador.tipo_corrente == 'DC' and perfil.tem_curva:
+        potencia_efetiva_kw = kwh_para_recarga / tempo_recarga_horas
+    is_over_24h = (tempo_recarga_horas * recargas_dia) > 24
+    
+    # Calcula custos (tarifa horária: dependem do horário e da duração da sessão)
+    if tarifa is not None:
+        custos = tarifa.perfil.custos(
+            [potencia_efetiva_kw], [tempo_recarga_horas], [potencia_pico_kw],
+            hora_inicio, recargas_dia
+        )
+        custos_gerais = {chave: float(valores[0]) for chave, valores in custos.items()}
+    else:
+        custo_por_recarga = kwh_para_recarga * custo_kwh
+        custo_diario = custo_por_recarga * recargas_dia
+        custos_gerais = {
+            "custo_por_recarga": custo_por_recarga,
+            "custo_diario": custo_diario,
+            "custo_mensal": custo_diario * 30,
+        }
+    
+    return {
+        "veiculo": veiculo,
+        "carregador": carregador,
+        "potencia_efetiva_kw": potencia_efetiva_kw,
+        "tempo_recarga_horas": tempo_recarga_horas,
+        "recargas_dia": recargas_dia,
+        "is_over_24h": is_over_24h,
+        "tarifa": tarifa,
+        "custos_gerais": custos_gerais
+    }
+
 @app.route('/admin/comparar', methods=['GET', 'POST'])
 def comparar_direto():
     """
     (Ponto 6) Página de Comparação Direta 1x1.
     """
-    veiculos_db = Veiculo.query.order_by(Veiculo.marca, Veiculo.modelo).all()
-    carregadores_db = Carregador.query.order_by(Carregador.marca, Carregador.modelo).all()
+    catalogo = obter_catalogo()
+    veiculos_db = catalogo.veiculos
+    carregadores_db = catalogo.carregadores
     resultado = None
     erro = None
     
     if request.method == 'POST':
         try:
-            veiculo = Veiculo.query.get(request.form['veiculo_id'])
-            carregador = Carregador.query.get(request.form['carregador_id'])
+            veiculo = catalogo.veiculos_por_id.get(int(request.form['veiculo_id']))
+            carregador = catalogo.carregadores_por_id.get(int(request.form['carregador_id']))
             custo_kwh = float(request.form['custo_kwh'])
-            recargas_dia = float(request.form['recargas_dia'])
-
-            # Lógica de cálculo (similar ao 'calcular_relatorio_comparativo' mas para 1 item)
-            potencia_efetiva_kw = 0.0
-            if carregador.tipo_corrente == 'AC':
-                potencia_efetiva_kw = min(veiculo.potencia_max_carga_ac_kw, carregador.potencia_saida_kw)
-            elif carregador.tipo_corrente == 'DC':
-                potencia_efetiva_kw = min(veiculo.potencia_max_carga_dc_kw, carregador.potencia_saida_kw)
+            recargas_dia = _recargas_dia_do_formulario()
+            tarifa, hora_inicio = _tarifa_do_formulario()
 
-            if potencia_efetiva_kw <= 0:
+            resultado = calcular_comparacao_direta(
+                veiculo, carregador, custo_kwh, recargas_dia, tarifa, hora_inicio
+            )
+            if resultado is None:
                 erro = "Combinação incompatível (Ex: Carregador DC num carro que só aceita AC)."
-            else:
-                kwh_para_recarga = veiculo.capacidade_bateria_kwh * 0.60
-                tempo_recarga_horas = kwh_para_recarga / potencia_efetiva_kw
-                is_over_24h = (tempo_recarga_horas * recargas_dia) > 24
-                
-                # Calcula custos
-                custo_por_recarga = kwh_para_recarga * custo_kwh
-                custo_diario = custo_por_recarga * recargas_dia
-                
-                resultado = {
-                    "veiculo": veiculo,
-                    "carregador": carregador,
-                    "potencia_efetiva_kw": potencia_efetiva_kw,
-                    "tempo_recarga_horas": tempo_recarga_horas,
-                    "recargas_dia": recargas_dia,
-                    "is_over_24h": is_over_24h,
-                    "custos_gerais": {
-                        "custo_por_recarga": custo_por_recarga,
-                        "custo_diario": custo_diario,
-                        "custo_mensal": custo_diario * 30,
-                    }
-                }
         except Exception as e:
             erro = f"Erro ao processar: {e}"
 
@@ -443,6 +1247,7 @@ def comparar_direto():
         'comparativo_direto.html',
         veiculos=veiculos_db,
         carregadores=carregadores_db,
+        tarifas=Tarifa.query.order_by(Tarifa.nome).all(),
         resultado=resultado,
         erro=erro
     )
@@ -452,39 +1257,28 @@ def comissao():
     """
     (Ponto 7) Página de Simulação de Comissão (EaaS).
     """
-    veiculos_db = Veiculo.query.order_by(Veiculo.marca, Veiculo.modelo).all()
-    carregadores_db = Carregador.query.order_by(Carregador.marca, Carregador.modelo).all()
+    catalogo = obter_catalogo()
+    veiculos_db = catalogo.veiculos
+    carregadores_db = catalogo.carregadores
     resultado = None
     erro = None
     
     if request.method == 'POST':
         try:
-            veiculo = Veiculo.query.get(request.form['veiculo_id'])
+            veiculo = catalogo.veiculos_por_id.get(int(request.form['veiculo_id']))
             # (Não precisamos do carregador para esta lógica, apenas a energia do veículo)
             
-            kwh_para_recarga = veiculo.capacidade_bateria_kwh * 0.60
+            kwh_para_recarga = veiculo.perfil.kwh_para_recarga
             
             # Inputs do formulário
             recargas_dia = float(request.form['recargas_dia'])
             preco_venda_kwh = float(request.form['preco_venda_kwh'])
             porcentagem_cliente = float(request.form['porcentagem_cliente'])
 
-            # Lógica de Faturamento
-            receita_por_recarga = kwh_para_recarga * preco_venda_kwh
-            faturamento_bruto_diario = receita_por_recarga * recargas_dia
-            faturamento_bruto_mensal = faturamento_bruto_diario * 30
-
-            # Lógica de Comissão
-            comissao_cliente_mensal = faturamento_bruto_mensal * (porcentagem_cliente / 100)
-            faturamento_operadora_mensal = faturamento_bruto_mensal - comissao_cliente_mensal
-            
-            resultado = {
-                "kwh_para_recarga": kwh_para_recarga,
-                "receita_por_recarga": receita_por_recarga,
-                "faturamento_bruto_mensal": faturamento_bruto_mensal,
-                "comissao_cliente_mensal": comissao_cliente_mensal,
-                "faturamento_operadora_mensal": faturamento_operadora_mensal
-            }
+            # Lógica de Faturamento e Comissão (partilhada com o otimizador)
+            resultado = calcular_comissao(
+                kwh_para_recarga, recargas_dia, preco_venda_kwh, porcentagem_cliente
+            )
             
         except Exception as e:
             erro = f"Erro ao processar: {e}"
@@ -496,7 +1290,165 @@ def comissao():
         resultado=resultado,
         erro=erro
     )
+
+@app.route('/api/comissao/otimizar', methods=['POST'])
+def otimizar_comissao():
+    """
+    Otimizador do mix de carregadores para o modelo de comissão: dada uma frota
+    e um orçamento, escolhe os carregadores do catálogo que maximizam a receita
+    mensal da operadora (ou minimizam o payback). Ver otimizador_carregadores.py.
+    """
+    try:
+        argumentos = ler_pedido_otimizacao(
+            request.get_json(silent=True), obter_catalogo(),
+            tempo_limite_max_s=app.config['OTIMIZADOR_TEMPO_MAX_S']
+        )
+        with instrumentacao.medir('otimizar_mix'):
+            resultado = otimizar_mix(workers=app.config['OTIMIZADOR_WORKERS'], **argumentos)
+        return jsonify(resultado)
+    except ErroOtimizacao as e:
+        return jsonify({"erro": str(e)}), 400
+
+@app.route('/api/relatorios/frota')
+def relatorio_frota():
+    """
+    Relatório de frota (custo total de posse) para todo o catálogo, em CSV
+    e em streaming: por veículo, o melhor carregador por tempo e por R$/kW,
+    custos de energia e a comissão. Ver relatorio_frota.py.
+    """
+    try:
+        p = ler_pedido_relatorio(request.args)
+    except ErroRelatorio as e:
+        return jsonify({"erro": str(e)}), 400
+
+    catalogo = obter_catalogo() # Um só snapshot para o relatório inteiro
+    formato = p.pop("formato")
+    return Response(
+        stream_with_context(gerar_relatorio_csv(catalogo, formato=formato, **p)),
+        mimetype='text/csv',
+        headers={'Content-Disposition':
+                 f'attachment; filename=relatorio_frota_v{catalogo.versao}.csv'}
+    )
+
+# --- API JSON v1 (ver api_v1.py) ---
+
+def _resposta_api(recurso, parametros, calcular):
+    """
+    Resposta JSON condicional: ETag de (recurso, versão do catálogo,
+    parâmetros, tarifa). If-None-Match igual -> 304 sem calcular nada.
+    calcular(catalogo, tarifa) devolve o corpo; LookupError -> 404.
+    """
+    catalogo = obter_catalogo()
+    tarifa = None
+    tarifa_id = parametros.get("tarifa_id")
+    if tarifa_id is not None:
+        tarifa = db.session.get(Tarifa, tarifa_id)
+        if tarifa is None:
+            return jsonify({"erro": "Tarifa não encontrada"}), 404
+
+    campos_tarifa = None if tarifa is None else tarifa.campos_calculo
+    etag = etag_api(recurso, catalogo.versao, parametros, campos_tarifa)
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        try:
+            resposta = jsonify(calcular(catalogo, tarifa))
+        except LookupError as e:
+            return jsonify({"erro": e.args[0]}), 404
+    resposta.set_etag(etag)
+    # O cliente guarda a resposta mas revalida sempre (o catálogo pode mudar a qualquer momento)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+def _veiculo_api(catalogo, veiculo_id):
+    veiculo = catalogo.veiculos_por_id.get(veiculo_id)
+    if veiculo is None:
+        raise LookupError("Veículo não encontrado")
+    return veiculo
+
+@app.route('/api/v1/simulacao')
+def api_simulacao():
+    """ Ranking do simulador (paginado, top-K do índice de compatibilidade). """
+    try:
+        p = ler_pedido_simulacao(request.args, app.config['API_POR_PAGINA_MAX'])
+    except ErroApi as e:
+        return jsonify({"erro": str(e)}), 400
+
+    def calcular(catalogo, tarifa):
+        _veiculo_api(catalogo, p["veiculo_id"])
+        veiculo, custos_gerais, linhas, paginacao = calcular_relatorio_paginado(
+            p["veiculo_id"], p["custo_kwh"], p["recargas_dia"],
+            pagina=p["pagina"], por_pagina=p["por_pagina"],
+            tarifa=tarifa, hora_inicio=p["hora_inicio"]
+        )
+        return {
+            "versao_catalogo": catalogo.versao,
+            "veiculo": veiculo_json(veiculo),
+            "tarifa": tarifa_json(tarifa, p["hora_inicio"]),
+            "custos_gerais": custos_json(custos_gerais),
+            "paginacao": paginacao,
+            "carregadores": [linha_ranking_json(linha) for linha in linhas],
+        }
+
+    return _resposta_api('simulacao', p, calcular)
+
+@app.route('/api/v1/comparacao')
+def api_comparacao():
+    """ Comparação 1x1 veículo x carregador (como /admin/comparar). """
+    try:
+        p = ler_pedido_comparacao(request.args)
+    except ErroApi as e:
+        return jsonify({"erro": str(e)}), 400
+
+    def calcular(catalogo, tarifa):
+        veiculo = _veiculo_api(catalogo, p["veiculo_id"])
+        carregador = catalogo.carregadores_por_id.get(p["carregador_id"])
+        if carregador is None:
+            raise LookupError("Carregador não encontrado")
+        resultado = calcular_comparacao_direta(
+            veiculo, carregador, p["custo_kwh"], p["recargas_dia"], tarifa, p["hora_inicio"]
+        )
+        corpo = {
+            "versao_catalogo": catalogo.versao,
+            "veiculo": veiculo_json(veiculo),
+            "carregador": carregador_json(carregador),
+            "tarifa": tarifa_json(tarifa, p["hora_inicio"]),
+            "compativel": resultado is not None,
+        }
+        if resultado is not None:
+            corpo.update({
+                "potencia_efetiva_kw": resultado["potencia_efetiva_kw"],
+                "tempo_recarga_horas": resultado["tempo_recarga_horas"],
+                "recargas_dia": resultado["recargas_dia"],
+                "is_over_24h": resultado["is_over_24h"],
+                "custos_gerais": custos_json(resultado["custos_gerais"]),
+            })
+        return corpo
+
+    return _resposta_api('comparacao', p, calcular)
+
+@app.route('/api/v1/comissao')
+def api_comissao():
+    """ Faturamento do modelo de comissão (como /admin/comissao). """
+    try:
+        p = ler_pedido_comissao(request.args)
+    except ErroApi as e:
+        return jsonify({"erro": str(e)}), 400
+
+    def calcular(catalogo, _tarifa):
+        veiculo = _veiculo_api(catalogo, p["veiculo_id"])
+        return {
+            "versao_catalogo": catalogo.versao,
+            "veiculo": veiculo_json(veiculo),
+            "comissao": custos_json(calcular_comissao(
+                veiculo.perfil.kwh_para_recarga, p["recargas_dia"],
+                p["preco_venda_kwh"], p["porcentagem_cliente"]
+            )),
+        }
+
+    return _resposta_api('comissao', p, calcular)
+
 # --- 7. Execução da Aplicação ---
 if __name__ == '__main__':
                 
-    app.run(debug=True, port=5000)
+    criar_app().run(debug=True, port=5000)
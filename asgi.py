@@ -0,0 +1,23 @@
+# Ponto de Entrada ASGI (pedidos concorrentes)
+#
+# Com os workers sync do gunicorn cada pedido em curso ocupa um processo
+# inteiro. Aqui a app Flask (WSGI) é servida por um servidor assíncrono:
+# o event loop segura as ligações (centenas por processo, incluindo as que
+# só esperam um 304) e cada pedido corre num pool de threads, onde o acesso
+# ao banco e o cálculo são feitos como antes (sessão por app context).
+#
+#   gunicorn asgi:app -c gunicorn.conf.py      (Procfile: preload + workers uvicorn)
+#   uvicorn asgi:app --host 0.0.0.0 --port 8000
+#
+# A app vem de criar_app(): com o preload do gunicorn o banco é preparado e
+# o catálogo carregado uma só vez, no mestre, antes do fork dos workers.
+#
+# ASGI_THREADS (pool por processo) não deve passar das ligações do pool do
+# banco (DB_POOL_TAMANHO + DB_POOL_EXTRA), senão as threads esperam por uma.
+
+from a2wsgi import WSGIMiddleware
+
+from app import criar_app
+
+aplicacao_wsgi = criar_app()
+app = WSGIMiddleware(aplicacao_wsgi, workers=aplicacao_wsgi.config['ASGI_THREADS'])
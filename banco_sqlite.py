@@ -0,0 +1,132 @@
+# Camada de Banco SQLite para Produção
+#
+# Por omissão o SQLite usa o journal de rollback: um escritor (ex.: uma
+# importação CSV grande) bloqueia os leitores dos outros workers do gunicorn.
+# Aqui cada ligação nova recebe:
+#   - journal_mode=WAL: leitores leem o último commit enquanto um escritor
+#     grava no -wal; só os escritores se excluem entre si;
+#   - synchronous=NORMAL: seguro em WAL (só perde o último commit numa queda
+#     de energia, nunca corrompe) e sem fsync por transação;
+#   - cache_size / mmap_size: páginas quentes em memória e leituras mapeadas;
+#   - busy_timeout: um escritor espera pelo outro em vez de falhar logo com
+#     "database is locked".
+#
+# O esquema passa a ter versão (PRAGMA user_version). Cada migração corre
+# uma vez, dentro de BEGIN IMMEDIATE: com vários workers a arrancar ao
+# mesmo tempo, só um migra e os outros esperam e encontram a versão já
+# atualizada.
+
+import os
+
+from sqlalchemy import event, make_url, text
+
+
+PRAGMAS_PADRAO = {
+    "busy_timeout": 30000,       # ms (primeiro: a mudança para WAL pode ter de esperar)
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,        # Negativo = KiB (64 MB por ligação)
+    "mmap_size": 268435456,      # 256 MB
+    "temp_store": "MEMORY",
+}
+
+
+def e_sqlite(uri):
+    return uri.startswith('sqlite')
+
+
+def e_memoria(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def caminho_snapshot_padrao(uri):
+    """ Ficheiro do snapshot colunar do catálogo ao lado do banco SQLite ('' para bancos sem ficheiro). """
+    if not e_sqlite(uri) or e_memoria(uri):
+        return ''
+    return os.path.abspath(make_url(uri).database) + '.catalogo'
+
+
+def opcoes_engine(uri, pool_size=5, max_overflow=10, pool_timeout=30):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS para um worker.
+    Cada worker do gunicorn tem o seu próprio pool (as ligações não passam
+    pelo fork, ver reiniciar_apos_fork). Banco em memória: o Flask-SQLAlchemy
+    já usa StaticPool e as opções de pool não se aplicam.
+    """
+    if not e_sqlite(uri) or e_memoria(uri):
+        return {}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        # As threads do pool (PDF, instrumentação, streaming) partilham ligações
+        "connect_args": {"check_same_thread": False, "timeout": PRAGMAS_PADRAO["busy_timeout"] / 1000},
+    }
+
+
+def configurar_pragmas(engine, pragmas=None):
+    """ Aplica os PRAGMAs a cada ligação nova do engine. """
+    pragmas = dict(PRAGMAS_PADRAO, **(pragmas or {}))
+
+    @event.listens_for(engine, "connect")
+    def _ao_ligar(ligacao_dbapi, _registo):
+        cursor = ligacao_dbapi.cursor()
+        try:
+            for nome, valor in pragmas.items():
+                cursor.execute(f"PRAGMA {nome}={valor}")
+        finally:
+            cursor.close()
+
+    return pragmas
+
+
+def reiniciar_apos_fork(engine):
+    """
+    Com `gunicorn --preload` o processo mestre importa a app (e migra) antes
+    do fork: o filho descarta as ligações herdadas sem as fechar (pertencem
+    ao pai) e abre as suas.
+    """
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+
+def versao_esquema(conexao):
+    return conexao.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrar(engine, migracoes):
+    """
+    Aplica as migrações em falta. `migracoes` é uma lista ordenada de
+    (versao, descricao, funcao(conexao)); a versão aplicada fica em
+    PRAGMA user_version, na mesma transação da migração.
+    Devolve a lista das descrições aplicadas.
+    """
+    aplicadas = []
+    with engine.connect() as conexao:
+        # BEGIN IMMEDIATE: reserva já a escrita (serializa workers concorrentes)
+        conexao.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            atual = versao_esquema(conexao)
+            for versao, descricao, funcao in migracoes:
+                if versao <= atual:
+                    continue
+                funcao(conexao)
+                conexao.exec_driver_sql(f"PRAGMA user_version={int(versao)}")
+                aplicadas.append(descricao)
+            conexao.exec_driver_sql("COMMIT")
+        except BaseException:
+            conexao.exec_driver_sql("ROLLBACK")
+            raise
+    return aplicadas
+
+
+def criar_indices(conexao, indices):
+    """ CREATE INDEX IF NOT EXISTS para os db.Index indicados (bancos anteriores aos índices). """
+    for indice in indices:
+        indice.create(conexao, checkfirst=True)
+
+
+def otimizar(engine):
+    """ PRAGMA optimize: atualiza as estatísticas do planeador (barato, chamar depois de importações). """
+    with engine.connect() as conexao:
+        conexao.execute(text("PRAGMA optimize"))
@@ -0,0 +1,59 @@
+# Benchmark: simulação de depósito (eventos discretos) vs. tamanho da frota.
+#
+# Frota sintética com turnos diferentes a partilhar carregadores AC e DC,
+# com e sem limite de potência do local. Não precisa de banco de dados.
+#
+# Uso:  python benchmarks/bench_agendador_deposito.py [veiculos] [dias]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agendador_deposito import GrupoCarregadores, GrupoVeiculos, simular_deposito  # noqa: E402
+from catalogo_cache import RegistroVeiculo  # noqa: E402
+from motor_compatibilidade import RegistroCarregador  # noqa: E402
+
+
+def gerar_deposito(n_veiculos):
+    modelos = [
+        RegistroVeiculo(1, "Van", "A", 75.0, 11.0, 100.0, None, None, None),
+        RegistroVeiculo(2, "Van", "B", 110.0, 22.0, 150.0, None, None, None),
+        RegistroVeiculo(3, "Carro", "C", 50.0, 7.4, 0.0, None, None, None),
+    ]
+    turnos = [(18, 6), (20, 7), (14, 22), (22, 5)]
+    por_grupo = max(1, n_veiculos // (len(modelos) * len(turnos)))
+    grupos_veiculos = [
+        GrupoVeiculos(v, por_grupo, chegada, partida, 20, 90)
+        for v in modelos for chegada, partida in turnos
+    ]
+    grupos_carregadores = [
+        GrupoCarregadores(RegistroCarregador(1, "X", "AC22", 22.0, 'AC', 9000.0), n_veiculos // 3),
+        GrupoCarregadores(RegistroCarregador(2, "X", "DC60", 60.0, 'DC', 90000.0), n_veiculos // 20),
+    ]
+    return grupos_veiculos, grupos_carregadores
+
+
+def main(n_veiculos, dias):
+    grupos_veiculos, grupos_carregadores = gerar_deposito(n_veiculos)
+    frota = sum(g.quantidade for g in grupos_veiculos)
+    print(f"frota: {frota} veículos x {dias} dias = {frota * dias} sessões")
+    print(f"{'cenário':>24} | {'tempo (ms)':>10} | {'não atendido %':>14} | {'espera p95 (h)':>14} | {'pico kW':>8}")
+    print("-" * 84)
+    cenarios = [
+        ("sem limite", dict()),
+        ("limite 2000 kW", dict(limite_site_kw=2000)),
+        ("limite 800 kW + desvio", dict(limite_site_kw=800, desvio_chegada_h=1.0)),
+    ]
+    for nome, opcoes in cenarios:
+        t0 = time.perf_counter()
+        r = simular_deposito(grupos_veiculos, grupos_carregadores, dias=dias, **opcoes)
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"{nome:>24} | {ms:>10.1f} | {r['percentual_nao_atendido']:>14.2f} "
+              f"| {r['espera_h']['p95']:>14.2f} | {r['pico_site_kw']:>8.0f}")
+
+
+if __name__ == '__main__':
+    argumentos = [int(a) for a in sys.argv[1:]]
+    main(*(argumentos + [1000, 30][len(argumentos):]))
@@ -0,0 +1,97 @@
+# Benchmark: latência por pedido do ranking de carregadores vs. tamanho do catálogo.
+#
+# Compara o loop Python antigo (um objeto por carregador) com a passagem
+# vetorizada da MatrizCarregadores. Não precisa de banco de dados.
+#
+# Uso:  python benchmarks/bench_motor_compatibilidade.py [tamanhos...]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from curva_carga import PerfilCarga  # noqa: E402
+from motor_compatibilidade import MatrizCarregadores, RegistroCarregador  # noqa: E402
+from tarifa_horaria import PerfilTarifa  # noqa: E402
+
+
+def gerar_catalogo(n, seed=42):
+    rnd = random.Random(seed)
+    return [
+        RegistroCarregador(
+            id=i + 1,
+            marca=f"Marca{rnd.randint(1, 50)}",
+            modelo=f"Modelo{i}",
+            potencia_saida_kw=rnd.choice([3.7, 7.4, 11.0, 22.0, 50.0, 60.0, 120.0, 150.0, 350.0]),
+            tipo_corrente=rnd.choice(['AC', 'AC', 'DC']),
+            preco=round(rnd.uniform(0, 250000), 2),
+        )
+        for i in range(n)
+    ]
+
+
+def ranking_loop(carregadores, kwh_para_recarga, pot_ac, pot_dc, recargas_dia):
+    """ Reprodução fiel do loop antigo de calcular_relatorio_comparativo. """
+    lista = []
+    for c in carregadores:
+        potencia_efetiva_kw = 0.0
+        if c.tipo_corrente == 'AC':
+            potencia_efetiva_kw = min(pot_ac, c.potencia_saida_kw)
+        elif c.tipo_corrente == 'DC':
+            potencia_efetiva_kw = min(pot_dc, c.potencia_saida_kw)
+        if potencia_efetiva_kw <= 0:
+            continue
+        tempo = kwh_para_recarga / potencia_efetiva_kw
+        lista.append({
+            "carregador": c,
+            "potencia_efetiva_kw": potencia_efetiva_kw,
+            "tempo_recarga_horas": tempo,
+            "custo_beneficio_reais_por_kw": c.preco / potencia_efetiva_kw if c.preco > 0 else float('inf'),
+            "is_over_24h": tempo * recargas_dia > 24,
+        })
+    return sorted(lista, key=lambda x: (x['tempo_recarga_horas'], x['carregador'].preco))
+
+
+def medir(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - t0)
+    tempos.sort()
+    return tempos[len(tempos) // 2] * 1000  # mediana em ms
+
+
+def main(tamanhos):
+    kwh, pot_ac, pot_dc, recargas = 77.0 * 0.60, 11.0, 135.0, 2.0
+    # Curva DC típica: pico até ~50% e queda até 80%
+    perfil = PerfilCarga(77.0, pot_dc, 20, 80, "0:135 50:120 65:80 80:50 100:20")
+    # Tarifa horária com ponta às 17-20h, fim de semana mais barato e demanda
+    tarifa = PerfilTarifa("0-16:0.65 17-20:1.95 21-23:0.65", "0-23:0.55", None, 30.0)
+    print(f"{'carregadores':>12} | {'loop (ms)':>10} | {'matriz (ms)':>11} | {'calcular (ms)':>13} "
+          f"| {'c/ curva (ms)':>13} | {'c/ TOU (ms)':>11} | {'ganho':>6}")
+    print("-" * 96)
+    for n in tamanhos:
+        catalogo = gerar_catalogo(n)
+        matriz = MatrizCarregadores(catalogo)
+        reps = max(5, min(200, 200000 // n))
+
+        # Sanidade: os dois caminhos devolvem exatamente a mesma ordem
+        esperado = [r["carregador"].id for r in ranking_loop(catalogo, kwh, pot_ac, pot_dc, recargas)]
+        obtido = [r["carregador"].id for r in matriz.ranking(kwh, pot_ac, pot_dc, recargas)]
+        assert esperado == obtido, "ranking vetorizado diverge do loop antigo"
+
+        t_loop = medir(lambda: ranking_loop(catalogo, kwh, pot_ac, pot_dc, recargas), reps)
+        t_matriz = medir(lambda: matriz.ranking(kwh, pot_ac, pot_dc, recargas), reps)
+        t_calc = medir(lambda: matriz.calcular(kwh, pot_ac, pot_dc, recargas), reps)
+        t_curva = medir(lambda: matriz.calcular(kwh, pot_ac, pot_dc, recargas, perfil), reps)
+        t_tou = medir(lambda: matriz.ranking(kwh, pot_ac, pot_dc, recargas, perfil, tarifa, 18.0), reps)
+        print(f"{n:>12} | {t_loop:>10.3f} | {t_matriz:>11.3f} | {t_calc:>13.3f} "
+              f"| {t_curva:>13.3f} | {t_tou:>11.3f} | {t_loop / t_matriz:>5.1f}x")
+
+
+if __name__ == '__main__':
+    tamanhos = [int(a) for a in sys.argv[1:]] or [100, 1000, 5000, 20000, 100000]
+    main(tamanhos)
@@ -0,0 +1,59 @@
+# Benchmark: otimizador do mix de carregadores vs. tamanho do catálogo/frota.
+#
+# Catálogo e frota sintéticos; mostra a poda por dominância, os nós explorados
+# e o tempo em série e em paralelo. Não precisa de banco de dados.
+#
+# Uso:  python benchmarks/bench_otimizador_carregadores.py [carregadores] [grupos_veiculos]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogo_cache import RegistroVeiculo  # noqa: E402
+from motor_compatibilidade import RegistroCarregador  # noqa: E402
+from otimizador_carregadores import otimizar_mix  # noqa: E402
+
+
+def gerar(n_carregadores, n_grupos, seed=1):
+    rnd = random.Random(seed)
+    frota = [
+        (RegistroVeiculo(i, "Marca", f"V{i}", rnd.choice([40.0, 60.0, 77.0, 100.0]),
+                         rnd.choice([7.4, 11.0, 22.0]), rnd.choice([0.0, 50.0, 135.0]),
+                         None, None, "0:150 50:120 80:50" if rnd.random() < 0.3 else None),
+         rnd.randint(1, 15), rnd.choice([1.0, 2.0]))
+        for i in range(n_grupos)
+    ]
+    carregadores = [
+        RegistroCarregador(j, "Marca", f"C{j}", rnd.choice([7.4, 11.0, 22.0, 50.0, 120.0, 150.0]),
+                           rnd.choice(['AC', 'DC']), float(rnd.randint(3, 120)) * 1000)
+        for j in range(n_carregadores)
+    ]
+    return frota, carregadores
+
+
+def main(n_carregadores, n_grupos):
+    frota, carregadores = gerar(n_carregadores, n_grupos)
+    print(f"{'cenário':>26} | {'tempo (s)':>9} | {'nós':>7} | {'modelos':>9} | {'custo':>10} | {'receita/mês':>12} | {'payback':>7}")
+    print("-" * 100)
+    for orcamento in (100_000, 500_000, 2_000_000):
+        for objetivo in ('receita', 'payback'):
+            for paralelo in (False, True):
+                t0 = time.perf_counter()
+                r = otimizar_mix(frota, carregadores, orcamento, 2.5, 15, objetivo=objetivo,
+                                 tempo_limite_s=10, paralelo=paralelo, workers=4)
+                segundos = time.perf_counter() - t0
+                busca = r["busca"]
+                nome = f"{orcamento // 1000}k {objetivo}{' ||' if paralelo else ''}"
+                payback = r["payback_meses"] or 0.0
+                print(f"{nome:>26} | {segundos:>9.2f} | {busca['nos_explorados']:>7} "
+                      f"| {busca['modelos_apos_poda']:>4}/{busca['modelos_candidatos']:<4} | {r['custo_total']:>10.0f} "
+                      f"| {r['comissao']['faturamento_operadora_mensal']:>12.0f} | {payback:>7.2f}"
+                      f"{'' if busca['completo'] else ' (parcial)'}")
+
+
+if __name__ == '__main__':
+    argumentos = [int(a) for a in sys.argv[1:]]
+    main(*(argumentos + [300, 40][len(argumentos):]))
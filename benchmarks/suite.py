@@ -0,0 +1,584 @@
+# Suite de Benchmarks Reprodutível + Teste de Carga do Simulador
+#
+# Gera catálogos sintéticos (Veiculo/Carregador) num SQLite descartável,
+# mede o núcleo de cálculo, a importação CSV e a renderização dos templates,
+# e faz um teste de carga à app WSGI real com utilizadores concorrentes:
+#   - pelo test client do Flask (por omissão), ou
+#   - por um gunicorn em localhost (--gunicorn N_WORKERS).
+# O resultado é um JSON (p50/p95/p99 em ms, média e débito) e pode ser
+# comparado com um baseline guardado: regressões acima da tolerância são
+# assinaladas e o processo termina com código 1 (útil em CI).
+#
+# Uso:
+#   python benchmarks/suite.py                                   # 1k e 10k carregadores
+#   python benchmarks/suite.py --carregadores 1000 10000 100000 --saida resultado.json
+#   python benchmarks/suite.py --guardar-baseline benchmarks/baseline.json
+#   python benchmarks/suite.py --baseline benchmarks/baseline.json --tolerancia 0.25
+#   python benchmarks/suite.py --gunicorn 4 --utilizadores 16 --duracao 10
+#   python benchmarks/suite.py --arranque --orcamento-arranque 5      # tempo até ao 1º pedido
+#   python benchmarks/suite.py --memoria 4 --veiculos 100000          # memória por worker
+#
+# O baseline só é comparável na mesma máquina e com os mesmos parâmetros.
+
+import argparse
+import csv
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np  # noqa: E402
+
+
+# --- Estatística ---
+
+def resumir(latencias_s, duracao_total_s=None):
+    """ p50/p95/p99/média em ms e débito (op/s). Sem duração total, débito = 1 / média. """
+    arr = np.asarray(latencias_s, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    media = float(arr.mean())
+    return {
+        "n": int(arr.size),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "media_ms": round(media, 4),
+        "debito_ops": round(arr.size / duracao_total_s if duracao_total_s else 1000 / media, 2),
+    }
+
+
+def repetir(funcao, tempo_s, minimo=5, maximo=10000):
+    """ Chama `funcao` até gastar `tempo_s` (entre `minimo` e `maximo` vezes). """
+    latencias = []
+    fim = time.perf_counter() + tempo_s
+    while len(latencias) < minimo or (time.perf_counter() < fim and len(latencias) < maximo):
+        t0 = time.perf_counter()
+        funcao()
+        latencias.append(time.perf_counter() - t0)
+    return latencias
+
+
+# --- Catálogo sintético ---
+
+POTENCIAS = [3.7, 7.4, 11.0, 22.0, 50.0, 60.0, 120.0, 150.0, 350.0]
+
+
+def gerar_veiculos(n, rnd):
+    return [
+        {
+            "marca": f"Marca{rnd.randint(1, 30)}",
+            "modelo": f"Veiculo{i}",
+            "capacidade_bateria_kwh": rnd.choice([40.0, 52.0, 60.0, 77.0, 82.0, 100.0]),
+            "potencia_max_carga_ac_kw": rnd.choice([7.4, 11.0, 22.0]),
+            "potencia_max_carga_dc_kw": rnd.choice([0.0, 50.0, 100.0, 135.0, 250.0]),
+            "soc_inicial": 20.0,
+            "soc_final": 80.0,
+            "curva_carga": "0:150 50:120 65:80 80:50 100:20" if rnd.random() < 0.3 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def gerar_carregadores(n, rnd):
+    return [
+        {
+            "marca": f"Marca{rnd.randint(1, 50)}",
+            "modelo": f"Carregador{i}",
+            "potencia_saida_kw": rnd.choice(POTENCIAS),
+            "tipo_corrente": rnd.choice(['AC', 'AC', 'DC']),
+            "preco": round(rnd.uniform(0, 250000), 2),
+        }
+        for i in range(n)
+    ]
+
+
+def csv_carregadores(linhas):
+    """ CSV no formato que o admin importa (';' e latin-1). """
+    texto = io.StringIO()
+    escritor = csv.writer(texto, delimiter=';')
+    escritor.writerow(['marca', 'modelo', 'potencia_saida_kw', 'tipo_corrente', 'preco'])
+    for c in linhas:
+        escritor.writerow([c['marca'], c['modelo'], c['potencia_saida_kw'], c['tipo_corrente'], c['preco']])
+    return texto.getvalue().encode('latin-1')
+
+
+class Ambiente:
+    """ App importada contra um SQLite descartável (DATABASE_URL definido antes do import). """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.caminho_db = os.path.join(pasta, 'benchmark.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + self.caminho_db
+        os.environ.setdefault('PDF_PASTA', os.path.join(pasta, 'cache_pdf'))
+        import app as modulo_app
+        self.m = modulo_app
+        self.app = modulo_app.app
+        modulo_app.preparar_banco()
+
+    def povoar(self, n_veiculos, n_carregadores, seed):
+        """ Substitui o catálogo, reconstrói o índice e publica uma nova versão. """
+        m = self.m
+        rnd = random.Random(seed)
+        with self.app.app_context():
+            m.db.session.execute(m.Compatibilidade.__table__.delete())
+            m.db.session.execute(m.Veiculo.__table__.delete())
+            m.db.session.execute(m.Carregador.__table__.delete())
+            m.db.session.execute(m.Veiculo.__table__.insert(), gerar_veiculos(n_veiculos, rnd))
+            m.db.session.execute(m.Carregador.__table__.insert(), gerar_carregadores(n_carregadores, rnd))
+            m.reconstruir_indice_compatibilidade()
+            m.commit_catalogo()
+            return [v.id for v in m.obter_catalogo().veiculos]
+
+
+# --- Microbenchmarks ---
+
+def bench_nucleo(amb, veiculo_ids, tempo_s, rnd):
+    m = amb.m
+    resultados = {}
+    with amb.app.app_context():
+        m.obter_catalogo()  # Aquece o snapshot (a carga não entra na medição)
+        resultados["nucleo.calcular_relatorio_paginado"] = resumir(repetir(
+            lambda: m.calcular_relatorio_paginado(rnd.choice(veiculo_ids), 0.8, 2.0,
+                                                  pagina=rnd.randint(1, 3), por_pagina=20), tempo_s))
+
+        # Tarifa horária pelo mesmo caminho do simulador (não gravada no banco)
+        tarifa = m.Tarifa(nome="bench", precos_dia_util="0-16:0.65 17-20:1.95 21-23:0.65",
+                          precos_fim_semana="0-23:0.55", demanda_reais_kw_mes=30.0)
+        resultados["nucleo.calcular_relatorio_paginado_tarifa_horaria"] = resumir(repetir(
+            lambda: m.calcular_relatorio_paginado(rnd.choice(veiculo_ids), 0.8, 2.0,
+                                                  pagina=rnd.randint(1, 3), por_pagina=20,
+                                                  tarifa=tarifa, hora_inicio=18.0), tempo_s))
+    return resultados
+
+
+def bench_importacao(amb, n_carregadores, repeticoes, seed):
+    """ importar_csv para um SQLite à parte (não mexe no catálogo do benchmark). """
+    from sqlalchemy import create_engine
+    from importacao_csv import ESQUEMA_CARREGADORES, abrir_csv_texto, importar_csv
+
+    m = amb.m
+    dados = csv_carregadores(gerar_carregadores(n_carregadores, random.Random(seed)))
+    latencias = []
+    for i in range(repeticoes):
+        caminho = os.path.join(amb.pasta, f'importacao_{i}.db')
+        engine = create_engine('sqlite:///' + caminho)
+        m.db.metadata.create_all(engine, tables=[m.Carregador.__table__])
+        t0 = time.perf_counter()
+        relatorio = importar_csv(engine, m.Carregador.__table__, abrir_csv_texto(io.BytesIO(dados), 'latin-1'),
+                                 ESQUEMA_CARREGADORES, tamanho_lote=1000)
+        latencias.append(time.perf_counter() - t0)
+        engine.dispose()
+        os.remove(caminho)
+        assert relatorio.inseridos == n_carregadores, relatorio.erros[:3]
+    resumo = resumir(latencias)
+    resumo["linhas_por_s"] = round(n_carregadores / float(np.median(latencias)), 1)
+    return {"importacao.csv_carregadores": resumo}
+
+
+def bench_render(amb, veiculo_ids, tempo_s, rnd):
+    from flask import render_template
+
+    m = amb.m
+    resultados = {}
+    with amb.app.test_request_context('/simular', method='POST', data={
+            'custo_kwh': '0.8', 'recargas_dia': '2'}):
+        veiculo, custos, linhas, paginacao = m.calcular_relatorio_paginado(
+            rnd.choice(veiculo_ids), 0.8, 2.0, pagina=1, por_pagina=20)
+        veiculos = m.obter_catalogo().veiculos
+
+        def render():
+            render_template('simulador.html', veiculos=veiculos, tarifas=[], tarifa=None,
+                            veiculo_selecionado=veiculo, custos_info={'custo_kwh': '0.8', 'recargas_dia': '2'},
+                            custos_gerais=custos, resultados_comparativos=linhas, paginacao=paginacao)
+        resultados["render.simulador_html"] = resumir(repetir(render, tempo_s))
+
+        veiculo, custos, linhas_pdf, _ = m.calcular_relatorio_paginado(
+            rnd.choice(veiculo_ids), 0.8, 2.0, pagina=1, por_pagina=amb.app.config['PDF_MAX_CARREGADORES'])
+        resultados["render.relatorio_pdf_html"] = resumir(repetir(
+            lambda: render_template('relatorio_pdf.html', veiculo_selecionado=veiculo,
+                                    custos_info={"custo_kwh": 0.8, "recargas_dia": 2.0},
+                                    custos_gerais=custos, resultados_comparativos=linhas_pdf),
+            tempo_s))
+    return resultados
+
+
+# --- Teste de carga ---
+
+def _pedido_simular(rnd, veiculo_ids):
+    return {
+        'veiculo_id': str(rnd.choice(veiculo_ids)),
+        'custo_kwh': '0.8',
+        'recargas_dia': str(rnd.choice([1, 2, 3])),
+        'pagina': str(rnd.randint(1, 3)),
+    }
+
+
+def _carga(executar_utilizador, utilizadores, duracao_s):
+    """ Corre N threads durante `duracao_s` e junta latências e falhas. """
+    latencias, falhas, lock = [], [0], threading.Lock()
+    fim = time.perf_counter() + duracao_s
+
+    def utilizador(i):
+        minhas, minhas_falhas = [], 0
+        for ok, latencia in executar_utilizador(i, fim):
+            if ok:
+                minhas.append(latencia)
+            else:
+                minhas_falhas += 1
+        with lock:
+            latencias.extend(minhas)
+            falhas[0] += minhas_falhas
+
+    threads = [threading.Thread(target=utilizador, args=(i,)) for i in range(utilizadores)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+    resumo = resumir(latencias or [0.0], total)
+    resumo.update({"utilizadores": utilizadores, "falhas": falhas[0]})
+    return resumo
+
+
+def carga_test_client(amb, veiculo_ids, utilizadores, duracao_s, seed):
+    def executar(i, fim):
+        rnd = random.Random(seed + i)
+        cliente = amb.app.test_client()
+        while time.perf_counter() < fim:
+            t0 = time.perf_counter()
+            resposta = cliente.post('/simular', data=_pedido_simular(rnd, veiculo_ids))
+            yield resposta.status_code == 200, time.perf_counter() - t0
+
+    return {"carga.test_client.simular": _carga(executar, utilizadores, duracao_s)}
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _config_vazia():
+    """ O gunicorn lê ./gunicorn.conf.py por omissão (preload + workers uvicorn): aqui não. """
+    caminho = os.path.join(tempfile.gettempdir(), 'benchmark_gunicorn_vazio.conf.py')
+    open(caminho, 'w').close()
+    return caminho
+
+
+def carga_gunicorn(amb, veiculo_ids, workers, utilizadores, duracao_s, seed):
+    if shutil.which('gunicorn') is None:
+        raise SystemExit("gunicorn não encontrado (pip install gunicorn)")
+    porta = _porta_livre()
+    processo = subprocess.Popen(
+        ['gunicorn', '-c', _config_vazia(), '-w', str(workers), '-b', f'127.0.0.1:{porta}',
+         '--log-level', 'warning', 'app:app'],
+        cwd=RAIZ, env=dict(os.environ),
+    )
+    try:
+        limite = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', porta), timeout=0.5).close()
+                break
+            except OSError:
+                if time.time() > limite or processo.poll() is not None:
+                    raise SystemExit("gunicorn não arrancou")
+                time.sleep(0.2)
+
+        def executar(i, fim):
+            rnd = random.Random(seed + i)
+            # Uma ligação por pedido: os workers sync do gunicorn não fazem keep-alive
+            cabecalhos = {'Content-Type': 'application/x-www-form-urlencoded', 'Connection': 'close'}
+            while time.perf_counter() < fim:
+                corpo = urllib.parse.urlencode(_pedido_simular(rnd, veiculo_ids))
+                t0 = time.perf_counter()
+                conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+                try:
+                    conexao.request('POST', '/simular', corpo, cabecalhos)
+                    resposta = conexao.getresponse()
+                    resposta.read()
+                    ok = resposta.status == 200
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                finally:
+                    conexao.close()
+                yield ok, time.perf_counter() - t0
+
+        resumo = _carga(executar, utilizadores, duracao_s)
+        resumo["workers"] = workers
+        return {"carga.gunicorn.simular": resumo}
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
+
+
+# --- Arranque ---
+
+def medir_arranque(workers, com_preload=True, limite_s=120):
+    """
+    Segundos desde o lançamento do gunicorn até à primeira resposta 200 de
+    um pedido que precisa do catálogo (typeahead). Com preload usa a
+    configuração de produção (gunicorn.conf.py: fábrica no mestre, catálogo
+    carregado antes do fork); sem preload, `app:app` com workers sync, que
+    preparam o banco e carregam o catálogo no primeiro pedido.
+    """
+    porta = _porta_livre()
+    env = dict(os.environ, PORT=str(porta), WEB_CONCURRENCY=str(workers))
+    if com_preload:
+        comando = ['gunicorn', 'asgi:app', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{porta}',
+                   '--log-level', 'warning']
+    else:
+        comando = ['gunicorn', '-c', _config_vazia(), '-w', str(workers), '-b', f'127.0.0.1:{porta}',
+                   '--log-level', 'warning', 'app:app']
+    t0 = time.perf_counter()
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=env)
+    try:
+        while True:
+            if time.perf_counter() - t0 > limite_s or processo.poll() is not None:
+                raise SystemExit("gunicorn não arrancou")
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=limite_s)
+            try:
+                conexao.request('GET', '/api/catalogo/veiculos/sugestoes?q=a', headers={'Connection': 'close'})
+                resposta = conexao.getresponse()
+                resposta.read()
+                if resposta.status == 200:
+                    return time.perf_counter() - t0
+            except (OSError, http.client.HTTPException):
+                time.sleep(0.05)
+            finally:
+                conexao.close()
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
+
+
+# --- Memória por worker ---
+
+# Corre num processo à parte (como um worker): mede a memória antes e depois
+# de carregar o catálogo e de o usar (uma página da lista + um ranking), e
+# só lê os números depois de todos os processos estarem carregados, para que
+# o PSS reparta as páginas partilhadas (o ficheiro colunar) entre eles.
+_PROGRAMA_MEMORIA = r"""
+import json, sys
+sys.path.insert(0, sys.argv[1])
+
+def memoria():
+    valores = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                valores[partes[0].rstrip(':')] = int(partes[1])
+    return {"pss_kb": valores.get('Pss', 0), "rss_kb": valores.get('Rss', 0),
+            "privado_kb": valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0)}
+
+import app
+antes = memoria()
+with app.app.app_context():
+    catalogo = app.obter_catalogo()
+    pagina = list(catalogo.veiculos[:50])
+    v = pagina[0]
+    catalogo.matriz.ranking(v.perfil.kwh_para_recarga, v.potencia_max_carga_ac_kw,
+                            v.potencia_max_carga_dc_kw, 2, v.perfil)
+print('pronto', flush=True)
+sys.stdin.readline()
+depois = memoria()
+print(json.dumps({chave: depois[chave] - antes[chave] for chave in antes}), flush=True)
+"""
+
+
+def medir_memoria(processos, colunar):
+    """
+    Média, por processo, do aumento de memória (KiB) ao carregar o catálogo
+    com `processos` processos em simultâneo: PSS (partilhado repartido),
+    RSS e páginas privadas. colunar=False força o catálogo em memória
+    (CATALOGO_SNAPSHOT=''). Só em Linux (/proc/self/smaps_rollup).
+    """
+    env = dict(os.environ)
+    if colunar:
+        # Ficheiro colunar mesmo abaixo de CATALOGO_SNAPSHOT_MIN_LINHAS, para comparar os dois modos
+        env.pop('CATALOGO_SNAPSHOT', None)
+        env['CATALOGO_SNAPSHOT_MIN_LINHAS'] = '0'
+    else:
+        env['CATALOGO_SNAPSHOT'] = ''
+    filhos = [
+        subprocess.Popen([sys.executable, '-c', _PROGRAMA_MEMORIA, RAIZ], cwd=RAIZ, env=env,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(processos)
+    ]
+    try:
+        for filho in filhos:
+            if filho.stdout.readline().strip() != 'pronto':
+                raise SystemExit("processo de medição de memória falhou")
+        medidas = []
+        for filho in filhos:
+            filho.stdin.write('\n')
+            filho.stdin.flush()
+        for filho in filhos:
+            medidas.append(json.loads(filho.stdout.readline()))
+    finally:
+        for filho in filhos:
+            filho.kill()
+            filho.wait()
+    return {chave: sum(m[chave] for m in medidas) / len(medidas) for chave in medidas[0]}
+
+
+# --- Baseline ---
+
+def comparar(resultados, baseline, tolerancia):
+    """
+    Lista de regressões: latência (p50/p95) acima de (1 + tolerância) x baseline
+    ou débito abaixo de (1 - tolerância) x baseline.
+    """
+    regressoes = []
+    for nome, atual in resultados["benchmarks"].items():
+        anterior = baseline.get("benchmarks", {}).get(nome)
+        if anterior is None:
+            continue
+        for metrica in ("p50_ms", "p95_ms"):
+            if anterior[metrica] > 0 and atual[metrica] > anterior[metrica] * (1 + tolerancia):
+                regressoes.append((nome, metrica, anterior[metrica], atual[metrica]))
+        if nome.startswith("carga.") and atual["debito_ops"] < anterior["debito_ops"] * (1 - tolerancia):
+            regressoes.append((nome, "debito_ops", anterior["debito_ops"], atual["debito_ops"]))
+    return regressoes
+
+
+def _commit_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de benchmarks do simulador.")
+    parser.add_argument('--carregadores', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--veiculos', type=int, default=50)
+    parser.add_argument('--tempo', type=float, default=1.0, help="segundos por microbenchmark")
+    parser.add_argument('--importacao-repeticoes', type=int, default=3)
+    parser.add_argument('--utilizadores', type=int, default=8)
+    parser.add_argument('--duracao', type=float, default=5.0, help="segundos de teste de carga")
+    parser.add_argument('--gunicorn', type=int, metavar='WORKERS', default=0,
+                        help="também testa um gunicorn local com N workers")
+    parser.add_argument('--sem-carga', action='store_true')
+    parser.add_argument('--arranque', action='store_true',
+                        help="mede o tempo até ao primeiro pedido (com e sem preload) em cada catálogo")
+    parser.add_argument('--orcamento-arranque', type=float,
+                        default=float(os.environ.get('ARRANQUE_ORCAMENTO_S', '5')),
+                        help="segundos; acima disto (com preload) o processo termina com código 1")
+    parser.add_argument('--memoria', type=int, metavar='PROCESSOS', default=0,
+                        help="mede a memória por worker (catálogo em memória vs ficheiro colunar) com N processos")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--saida', default='resultado_benchmark.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerancia', type=float, default=0.20)
+    parser.add_argument('--guardar-baseline')
+    args = parser.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix='benchmark_ev_')
+    try:
+        amb = Ambiente(pasta)
+        benchmarks = {}
+        arranque = {}
+        memoria = {}
+        for n in args.carregadores:
+            print(f"== {n} carregadores x {args.veiculos} veículos ==", flush=True)
+            t0 = time.perf_counter()
+            veiculo_ids = amb.povoar(args.veiculos, n, args.seed)
+            print(f"   catálogo + índice gerados em {time.perf_counter() - t0:.1f}s", flush=True)
+            rnd = random.Random(args.seed)
+
+            partes = [
+                bench_nucleo(amb, veiculo_ids, args.tempo, rnd),
+                bench_importacao(amb, n, args.importacao_repeticoes, args.seed),
+                bench_render(amb, veiculo_ids, args.tempo, rnd),
+            ]
+            if not args.sem_carga:
+                partes.append(carga_test_client(amb, veiculo_ids, args.utilizadores, args.duracao, args.seed))
+                if args.gunicorn:
+                    partes.append(carga_gunicorn(amb, veiculo_ids, args.gunicorn, args.utilizadores,
+                                                 args.duracao, args.seed))
+            for parte in partes:
+                for nome, resumo in parte.items():
+                    benchmarks[f"{n}/{nome}"] = resumo
+                    print(f"   {nome:<42} p50 {resumo['p50_ms']:>9.3f} ms | p95 {resumo['p95_ms']:>9.3f} ms "
+                          f"| p99 {resumo['p99_ms']:>9.3f} ms | {resumo['debito_ops']:>9.1f} op/s", flush=True)
+            if args.arranque:
+                workers = args.gunicorn or 2
+                for nome, com_preload in (("preload", True), ("sem_preload", False)):
+                    segundos = medir_arranque(workers, com_preload)
+                    arranque[f"{n}/{nome}"] = {"segundos": segundos, "workers": workers}
+                    print(f"   arranque.{nome:<33} {segundos:>9.3f} s até ao primeiro pedido", flush=True)
+            if args.memoria:
+                if not os.path.exists('/proc/self/smaps_rollup'):
+                    raise SystemExit("--memoria precisa de /proc/self/smaps_rollup (Linux)")
+                for nome, colunar in (("em_memoria", False), ("colunar", True)):
+                    medida = medir_memoria(args.memoria, colunar)
+                    memoria[f"{n}/{nome}"] = dict(medida, processos=args.memoria)
+                    print(f"   memoria.{nome:<34} PSS {medida['pss_kb'] / 1024:>8.1f} MiB "
+                          f"| privada {medida['privado_kb'] / 1024:>8.1f} MiB por processo", flush=True)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    resultados = {
+        "meta": {
+            "data": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "commit": _commit_git(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "parametros": {k: v for k, v in vars(args).items()
+                           if k not in ('saida', 'baseline', 'guardar_baseline')},
+        },
+        "benchmarks": benchmarks,
+        "arranque": arranque,
+        "memoria": memoria,
+    }
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados em {args.saida}")
+
+    acima = {nome: r["segundos"] for nome, r in arranque.items()
+             if nome.endswith('/preload') and r["segundos"] > args.orcamento_arranque}
+    if acima:
+        print(f"\nARRANQUE ACIMA DO ORÇAMENTO ({args.orcamento_arranque:g}s):")
+        for nome, segundos in acima.items():
+            print(f"   {nome}: {segundos:.2f}s")
+        return 1
+
+    if args.guardar_baseline:
+        shutil.copyfile(args.saida, args.guardar_baseline)
+        print(f"Baseline guardado em {args.guardar_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("parametros") != resultados["meta"]["parametros"]:
+            print("Aviso: parâmetros diferentes dos do baseline; a comparação pode não ser justa.")
+        regressoes = comparar(resultados, baseline, args.tolerancia)
+        if regressoes:
+            print(f"\nREGRESSÕES (tolerância {args.tolerancia:.0%}):")
+            for nome, metrica, antes, depois in regressoes:
+                print(f"   {nome} {metrica}: {antes} -> {depois} ({depois / antes - 1:+.0%})")
+            return 1
+        print(f"\nSem regressões face ao baseline (tolerância {args.tolerancia:.0%}).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+# Pesquisa Facetada no Catálogo (typeahead, filtros e paginação por cursor)
+#
+# O simulador desenhava todos os veículos num <select> e as listas do admin
+# a tabela inteira. Aqui cada snapshot do catálogo ganha (sob pedido) um
+# índice em memória por tabela:
+#   - texto: os termos normalizados (sem acentos, minúsculas) de marca +
+#     modelo, ordenados. As posições de todos os termos ficam num único vetor,
+#     termo a termo, por isso os termos com um dado prefixo são um intervalo
+#     contíguo (bisect) e as linhas que os contêm são uma fatia desse vetor:
+#     uma operação NumPy por palavra pesquisada, seja qual for o nº de termos;
+#   - aproximado: se uma palavra não casa com nenhum prefixo, procura os
+#     termos com trigramas em comum (erros de digitação, "tesal" -> "tesla");
+#   - facetas: colunas numéricas em vetores NumPy (intervalos min/max) e
+#     contagens por marca / tipo de corrente das linhas encontradas.
+#
+# As linhas seguem a ordem do snapshot (marca, modelo, id). O cursor de
+# paginação é a chave da última linha mostrada (keyset): continua certo
+# mesmo que o catálogo mude entre duas páginas.
+
+import base64
+import bisect
+import json
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+
+
+TIPOS = ('veiculos', 'carregadores')
+
+# Facetas numéricas de cada tabela (campo do registo -> filtros <campo>_min / <campo>_max)
+FACETAS_NUMERICAS = {
+    'veiculos': ('capacidade_bateria_kwh', 'potencia_max_carga_ac_kw', 'potencia_max_carga_dc_kw'),
+    'carregadores': ('potencia_saida_kw', 'preco'),
+}
+FACETAS_CATEGORICAS = {
+    'veiculos': ('marca',),
+    'carregadores': ('marca', 'tipo_corrente'),
+}
+
+SIMILARIDADE_MIN = 0.4  # Dice dos trigramas para aceitar um termo aproximado
+MAX_VALORES_FACETA = 20
+
+
+class ErroBusca(ValueError):
+    """ Parâmetros de pesquisa inválidos (vira HTTP 400 na rota). """
+
+
+def normalizar(texto):
+    """ "Citroën ë-C4" -> "citroen e-c4" """
+    texto = str(texto)
+    if texto.isascii():
+        return texto.lower()
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+_PALAVRA = re.compile(r'[^\W_]+')
+
+
+def termos(texto):
+    return _PALAVRA.findall(normalizar(texto))
+
+
+def _chave(registro):
+    return (registro.marca, registro.modelo, registro.id)
+
+
+def _trigramas(termo):
+    termo = f" {termo} "
+    return {termo[i:i + 3] for i in range(len(termo) - 2)}
+
+
+def _coluna_numerica(registros, campo):
+    if hasattr(registros, 'coluna'):  # vista do snapshot colunar: sem criar registos
+        return np.asarray(registros.coluna(campo), dtype=np.float64)
+    # Sem valor (ex.: carregador sem preço) -> NaN: fica fora de qualquer intervalo
+    return np.array([getattr(r, campo) for r in registros], dtype=np.float64)
+
+
+def _coluna_texto(registros, campo):
+    """ (códigos por linha, {código: texto}) de uma coluna de texto. """
+    if hasattr(registros, 'coluna'):
+        codigos = registros.coluna(campo)
+        return codigos, {c: registros.texto(c) for c in np.unique(codigos).tolist()}
+    internos = {}
+    codigos = np.fromiter(
+        (internos.setdefault(getattr(r, campo), len(internos)) for r in registros),
+        dtype=np.int32, count=len(registros))
+    return codigos, {c: texto for texto, c in internos.items()}
+
+
+class IndiceBusca:
+    """ Índice de uma tabela do catálogo; `registros` já na ordem do snapshot. """
+
+    def __init__(self, tipo, registros):
+        self.tipo = tipo
+        # Tupla ou vista do snapshot colunar (sequência indexável, ver snapshot_colunar.py)
+        self.registros = registros if isinstance(registros, Sequence) else tuple(registros)
+
+        # Termos calculados uma vez por texto distinto (marcas repetem-se muito)
+        por_linha = []
+        for campo in ('marca', 'modelo'):
+            codigos, textos = _coluna_texto(self.registros, campo)
+            termos_por_codigo = {c: termos(texto or '') for c, texto in textos.items()}
+            por_linha.append([termos_por_codigo[c] for c in codigos.tolist()])
+        posicoes = defaultdict(list)
+        for posicao, (termos_marca, termos_modelo) in enumerate(zip(*por_linha)):
+            for termo in set(termos_marca).union(termos_modelo):
+                posicoes[termo].append(posicao)
+        self.termos = sorted(posicoes)
+        tamanhos = np.fromiter((len(posicoes[t]) for t in self.termos), dtype=np.int64, count=len(self.termos))
+        self._inicio = np.concatenate(([0], np.cumsum(tamanhos)))
+        self._posicoes = np.fromiter(
+            (p for t in self.termos for p in posicoes[t]), dtype=np.int32, count=int(self._inicio[-1]))
+
+        por_trigrama = defaultdict(list)
+        self._n_trigramas = np.empty(len(self.termos), dtype=np.int32)
+        for i, termo in enumerate(self.termos):
+            trigramas = _trigramas(termo)
+            self._n_trigramas[i] = len(trigramas)
+            for trigrama in trigramas:
+                por_trigrama[trigrama].append(i)
+        self._por_trigrama = {t: np.array(i, dtype=np.int32) for t, i in por_trigrama.items()}
+
+        self.numericos = {campo: _coluna_numerica(self.registros, campo) for campo in FACETAS_NUMERICAS[tipo]}
+        self.categoricos = {}
+        for campo in FACETAS_CATEGORICAS[tipo]:
+            codigos, textos = _coluna_texto(self.registros, campo)
+            # Valores ordenados (searchsorted em filtrar) e códigos renumerados para essa ordem
+            originais = sorted(textos, key=lambda c: str(textos[c]))
+            valores = np.array([str(textos[c]) for c in originais], dtype=str)
+            mapa = np.zeros(max(originais, default=-1) + 2, dtype=np.int32)
+            mapa[originais] = np.arange(len(originais), dtype=np.int32)
+            self.categoricos[campo] = (valores, mapa[codigos])
+
+    def __len__(self):
+        return len(self.registros)
+
+    # --- Texto ---
+
+    def _linhas_do_prefixo(self, prefixo, mascara):
+        inicio = bisect.bisect_left(self.termos, prefixo)
+        fim = bisect.bisect_left(self.termos, prefixo + '\U0010ffff')
+        if inicio == fim:
+            return False
+        mascara[self._posicoes[self._inicio[inicio]:self._inicio[fim]]] = True
+        return True
+
+    def _linhas_aproximadas(self, palavra, mascara):
+        trigramas = _trigramas(palavra)
+        listas = [self._por_trigrama[t] for t in trigramas if t in self._por_trigrama]
+        if not listas:
+            return
+        comuns = np.bincount(np.concatenate(listas), minlength=len(self.termos))
+        dice = 2 * comuns / (self._n_trigramas + len(trigramas))
+        for i in np.flatnonzero(dice >= SIMILARIDADE_MIN):
+            mascara[self._posicoes[self._inicio[i]:self._inicio[i + 1]]] = True
+
+    def mascara_texto(self, texto, aproximado=True):
+        """
+        Linhas com todas as palavras de `texto` como prefixo de algum termo
+        de marca/modelo; palavras sem nenhum prefixo usam os termos parecidos.
+        """
+        resultado = np.ones(len(self), dtype=bool)
+        for palavra in termos(texto):
+            mascara = np.zeros(len(self), dtype=bool)
+            if not self._linhas_do_prefixo(palavra, mascara) and aproximado and len(palavra) >= 3:
+                self._linhas_aproximadas(palavra, mascara)
+            resultado &= mascara
+        return resultado
+
+    # --- Pesquisa ---
+
+    def filtrar(self, texto='', intervalos=None, categorias=None, aproximado=True):
+        """
+        Máscara das linhas que casam com o texto, com os intervalos numéricos
+        {campo: (min | None, max | None)} e com as categorias {campo: valor}.
+        """
+        mascara = self.mascara_texto(texto, aproximado) if texto else np.ones(len(self), dtype=bool)
+        for campo, (minimo, maximo) in (intervalos or {}).items():
+            valores = self.numericos[campo]
+            if minimo is not None:
+                mascara &= valores >= minimo
+            if maximo is not None:
+                mascara &= valores <= maximo
+        for campo, valor in (categorias or {}).items():
+            valores, codigos = self.categoricos[campo]
+            i = np.searchsorted(valores, valor)
+            if i == len(valores) or valores[i] != valor:
+                mascara[:] = False
+            else:
+                mascara &= codigos == i
+        return mascara
+
+    def facetas(self, mascara):
+        """ Intervalo de cada faceta numérica e contagens por categoria nas linhas da máscara. """
+        saida = {}
+        for campo, valores in self.numericos.items():
+            selecionados = valores[mascara]
+            selecionados = selecionados[~np.isnan(selecionados)]
+            saida[campo] = {
+                "min": float(selecionados.min()) if len(selecionados) else None,
+                "max": float(selecionados.max()) if len(selecionados) else None,
+            }
+        for campo, (valores, codigos) in self.categoricos.items():
+            contagens = np.bincount(codigos[mascara], minlength=len(valores))
+            ordem = np.argsort(-contagens, kind='stable')[:MAX_VALORES_FACETA]
+            saida[campo] = [
+                {"valor": str(valores[i]), "total": int(contagens[i])} for i in ordem if contagens[i]
+            ]
+        return saida
+
+    def pagina(self, mascara, cursor=None, por_pagina=50):
+        """ (registos da página, cursor da próxima página ou None) a seguir à chave `cursor`. """
+        posicoes = np.flatnonzero(mascara)
+        if cursor is not None:
+            inicio = bisect.bisect_right(self.registros, tuple(cursor), key=_chave)
+            posicoes = posicoes[np.searchsorted(posicoes, inicio):]
+        visiveis = posicoes[:por_pagina]
+        registros = [self.registros[p] for p in visiveis.tolist()]
+        proximo = codificar_cursor(_chave(registros[-1])) if len(posicoes) > por_pagina else None
+        return registros, proximo
+
+    def sugerir(self, texto, limite=10):
+        """ Typeahead: as primeiras `limite` linhas que casam com o texto. """
+        if not texto.strip():
+            return list(self.registros[:limite])
+        posicoes = np.flatnonzero(self.mascara_texto(texto))[:limite]
+        return [self.registros[p] for p in posicoes.tolist()]
+
+
+# --- Cursor e pedidos ---
+
+def codificar_cursor(chave):
+    marca, modelo, id_ = chave
+    texto = json.dumps([marca, modelo, int(id_)], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        marca, modelo, id_ = json.loads(texto)
+        return (str(marca), str(modelo), int(id_))
+    except (ValueError, TypeError):
+        raise ErroBusca("'cursor' inválido")
+
+
+def _numero(args, campo):
+    valor = args.get(campo)
+    if valor is None or valor == '':
+        return None
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ErroBusca(f"'{campo}' deve ser um número")
+    if not math.isfinite(valor):
+        raise ErroBusca(f"'{campo}' deve ser finito")
+    return valor
+
+
+def ler_pedido_busca(args, tipo, por_pagina_padrao=50, por_pagina_max=200):
+    """
+    ?q=tesla model&capacidade_bateria_kwh_min=60&potencia_max_carga_dc_kw_max=150
+     &marca=Tesla&cursor=...&por_pagina=50
+    Devolve os argumentos de IndiceBusca.filtrar / pagina.
+    """
+    intervalos = {}
+    for campo in FACETAS_NUMERICAS[tipo]:
+        minimo, maximo = _numero(args, f'{campo}_min'), _numero(args, f'{campo}_max')
+        if minimo is not None and maximo is not None and minimo > maximo:
+            raise ErroBusca(f"'{campo}_min' maior que '{campo}_max'")
+        if minimo is not None or maximo is not None:
+            intervalos[campo] = (minimo, maximo)
+    categorias = {campo: args[campo] for campo in FACETAS_CATEGORICAS[tipo] if args.get(campo)}
+
+    try:
+        por_pagina = int(args.get('por_pagina') or por_pagina_padrao)
+    except ValueError:
+        raise ErroBusca("'por_pagina' deve ser um inteiro")
+    if not 1 <= por_pagina <= por_pagina_max:
+        raise ErroBusca(f"'por_pagina' deve estar entre 1 e {por_pagina_max}")
+
+    cursor = args.get('cursor')
+    return {
+        "texto": (args.get('q') or '').strip(),
+        "intervalos": intervalos,
+        "categorias": categorias,
+        "cursor": decodificar_cursor(cursor) if cursor else None,
+        "por_pagina": por_pagina,
+    }
@@ -0,0 +1,216 @@
+# Cache Versionado do Catálogo (Veículos + Carregadores)
+#
+# O catálogo só muda nas rotas de escrita do admin (add, editar, importar).
+# Cada processo guarda um "snapshot" só de leitura e um número de versão.
+# As escritas incrementam a versão (linha única na tabela catalogo_versao);
+# os outros workers do gunicorn comparam a versão local com a do banco
+# (no máximo uma vez a cada `intervalo_verificacao` segundos) e recarregam.
+#
+# Com `caminho_snapshot` o snapshot de cada versão vem de um ficheiro colunar
+# mapeado em memória e partilhado por todos os processos (ver
+# snapshot_colunar.py): o primeiro worker a ver uma versão nova escreve-o
+# (atomicamente) e os outros só o abrem.
+
+import functools
+import threading
+import time
+from collections import namedtuple
+
+from busca_catalogo import IndiceBusca
+from curva_carga import perfil_carga
+from motor_compatibilidade import MatrizCarregadores, RegistroCarregador
+from snapshot_colunar import abrir_snapshot, escrever_snapshot
+
+
+class RegistroVeiculo(namedtuple(
+        'RegistroVeiculo',
+        'id marca modelo capacidade_bateria_kwh potencia_max_carga_ac_kw potencia_max_carga_dc_kw '
+        'soc_inicial soc_final curva_carga')):
+    """
+    Registo leve e só de leitura de um Veículo.
+    Expõe os mesmos atributos que os templates usam no modelo ORM.
+    """
+    __slots__ = ()
+
+    @property
+    def nome_completo(self):
+        dc_info = f"DC: {self.potencia_max_carga_dc_kw}kW" if self.potencia_max_carga_dc_kw > 0 else "DC: Não"
+        return f"{self.marca} {self.modelo} ({self.capacidade_bateria_kwh} kWh | AC: {self.potencia_max_carga_ac_kw}kW | {dc_info})"
+
+    @property
+    def perfil(self):
+        return perfil_carga(
+            self.capacidade_bateria_kwh, self.potencia_max_carga_dc_kw,
+            self.soc_inicial, self.soc_final, self.curva_carga
+        )
+
+
+class SnapshotCatalogo:
+    """
+    Fotografia imutável do catálogo numa dada versão.
+    - veiculos / carregadores: ordenados por (marca, modelo, id), prontos para as listas.
+    - veiculos_por_id / carregadores_por_id: acesso direto sem ir ao banco.
+    - matriz: MatrizCarregadores (ordem por id) para o motor de cálculo.
+    - busca_veiculos / busca_carregadores: IndiceBusca, criado no primeiro uso
+      (ou logo ao carregar, com CacheCatalogo(indexar_busca=True)).
+    Vindo de um ficheiro colunar (de_arquivo) as listas e os mapas por id são
+    vistas sobre as colunas mapeadas, com a mesma interface.
+    """
+
+    def __init__(self, versao, veiculos, carregadores):
+        self.versao = versao
+        self.veiculos = tuple(sorted(veiculos, key=lambda v: (v.marca, v.modelo, v.id)))
+        self.carregadores = tuple(sorted(carregadores, key=lambda c: (c.marca, c.modelo, c.id)))
+        self.veiculos_por_id = {v.id: v for v in self.veiculos}
+        self.carregadores_por_id = {c.id: c for c in self.carregadores}
+        self.matriz = MatrizCarregadores(sorted(self.carregadores, key=lambda c: c.id))
+        self.arquivo = None
+
+    @classmethod
+    def de_arquivo(cls, arquivo):
+        """ Snapshot sobre um snapshot_colunar.ArquivoColunar (sem copiar as colunas). """
+        snapshot = cls.__new__(cls)
+        snapshot.versao = arquivo.versao
+        snapshot.arquivo = arquivo
+        veiculos = arquivo.registros('veiculos', RegistroVeiculo)
+        carregadores = arquivo.registros('carregadores', RegistroCarregador)
+        snapshot.veiculos = veiculos.ordenada()
+        snapshot.carregadores = carregadores.ordenada()
+        snapshot.veiculos_por_id = veiculos.por_id()
+        snapshot.carregadores_por_id = carregadores.por_id()
+        tipo = carregadores.coluna('tipo_corrente')
+        snapshot.matriz = MatrizCarregadores.de_colunas(
+            carregadores,
+            carregadores.coluna('id'),
+            carregadores.coluna('potencia_saida_kw'),
+            carregadores.coluna('preco'),
+            arquivo.mascara_texto(tipo, 'AC'),
+            arquivo.mascara_texto(tipo, 'DC'),
+        )
+        return snapshot
+
+    @functools.cached_property
+    def busca_veiculos(self):
+        return IndiceBusca('veiculos', self.veiculos)
+
+    @functools.cached_property
+    def busca_carregadores(self):
+        return IndiceBusca('carregadores', self.carregadores)
+
+    def busca(self, tipo):
+        """ Índice de pesquisa de 'veiculos' ou 'carregadores'. """
+        return self.busca_veiculos if tipo == 'veiculos' else self.busca_carregadores
+
+    def indexar_busca(self):
+        """ Cria já os dois índices de pesquisa. """
+        self.busca_veiculos
+        self.busca_carregadores
+
+
+def _em_memoria(versao, linhas_veiculos, linhas_carregadores):
+    return SnapshotCatalogo(
+        versao,
+        (RegistroVeiculo(*linha) for linha in linhas_veiculos),
+        (RegistroCarregador(*linha) for linha in linhas_carregadores),
+    )
+
+
+class CacheCatalogo:
+    """
+    Cache por processo do catálogo.
+
+    ler_versao(): devolve a versão atual guardada no banco (consulta barata).
+    carregar():   devolve (versao, linhas_veiculos, linhas_carregadores).
+    caminho_snapshot / origem: ficheiro colunar partilhado (None = em memória).
+    snapshot_min_linhas: abaixo disto (veículos + carregadores) o catálogo
+    fica em memória mesmo com caminho_snapshot (o ficheiro não compensa).
+    indexar_busca: cria os índices de pesquisa de cada snapshot novo antes de
+    o publicar (paga-os o pedido que recarrega, não a primeira pesquisa).
+    """
+
+    def __init__(self, ler_versao, carregar, intervalo_verificacao=1.0,
+                 caminho_snapshot=None, origem=None, snapshot_min_linhas=0,
+                 indexar_busca=False):
+        self._ler_versao = ler_versao
+        self._carregar = carregar
+        self.intervalo_verificacao = intervalo_verificacao
+        self.caminho_snapshot = caminho_snapshot
+        self.origem = origem
+        self.snapshot_min_linhas = snapshot_min_linhas
+        self.indexar_busca = indexar_busca
+        self.snapshots_escritos = 0
+        self._snapshot = None
+        self._proxima_verificacao = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def obter(self):
+        """ Devolve o snapshot atual, recarregando-o se a versão mudou. """
+        snapshot = self._snapshot
+        agora = time.monotonic()
+        if snapshot is not None and agora < self._proxima_verificacao:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and self._ler_versao() == snapshot.versao:
+                self._proxima_verificacao = agora + self.intervalo_verificacao
+                self.hits += 1
+                return snapshot
+
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+
+            if self.caminho_snapshot:
+                snapshot = self._abrir_colunar()
+            else:
+                snapshot = _em_memoria(*self._carregar())
+            if self.indexar_busca:
+                snapshot.indexar_busca()
+            self._snapshot = snapshot
+            self._proxima_verificacao = agora + self.intervalo_verificacao
+            return self._snapshot
+
+    def _abrir_colunar(self):
+        """
+        Abre o ficheiro da versão atual; se não existir (ou for de outra
+        versão), lê o banco e escreve-o. Dois workers podem escrever ao mesmo
+        tempo: os.replace garante que o ficheiro está sempre inteiro, e se
+        ficar uma versão antiga a próxima verificação deteta e volta a escrever.
+        """
+        arquivo = abrir_snapshot(self.caminho_snapshot, self._ler_versao(), self.origem)
+        if arquivo is None:
+            versao, linhas_veiculos, linhas_carregadores = self._carregar()
+            if len(linhas_veiculos) + len(linhas_carregadores) < self.snapshot_min_linhas:
+                return _em_memoria(versao, linhas_veiculos, linhas_carregadores)
+            try:
+                escrever_snapshot(self.caminho_snapshot, versao, self.origem, {
+                    'veiculos': linhas_veiculos, 'carregadores': linhas_carregadores})
+            except OSError:
+                # Pasta sem escrita (ou disco cheio): este worker fica com o catálogo em memória
+                return _em_memoria(versao, linhas_veiculos, linhas_carregadores)
+            self.snapshots_escritos += 1
+            arquivo = abrir_snapshot(self.caminho_snapshot, origem=self.origem)
+        return SnapshotCatalogo.de_arquivo(arquivo)
+
+    def invalidar(self):
+        """ Força a verificação da versão no próximo acesso (usar após escrever). """
+        self._proxima_verificacao = 0.0
+
+    def estatisticas(self):
+        snapshot = self._snapshot
+        return {
+            "versao": snapshot.versao if snapshot is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "snapshots_escritos": self.snapshots_escritos,
+            "snapshot_bytes": snapshot.arquivo.nbytes if snapshot is not None and snapshot.arquivo else None,
+            "veiculos": len(snapshot.veiculos) if snapshot is not None else 0,
+            "carregadores": len(snapshot.carregadores) if snapshot is not None else 0,
+        }
@@ -0,0 +1,134 @@
+# Curva de Carga (SoC -> Potência) e Janela de Recarga Configurável
+#
+# O cálculo antigo assumia potência constante de 20% a 80%
+# (capacidade * 0.60 / potência). Em DC isso está longe da realidade:
+# o carro aceita muita potência no início e vai reduzindo com o SoC.
+#
+# Cada veículo pode ter uma curva DC opcional, em texto: "soc:kW soc:kW ...",
+# por ex. "10:150 50:120 80:60 100:25" (interpolação linear entre os pontos).
+# O tempo é o integral de dE / min(curva(soc), saída do carregador).
+#
+# Para custar o mesmo que a fórmula plana em todo o catálogo, o integral é
+# pré-calculado UMA vez por veículo numa tabela de energia acumulada:
+# com os segmentos ordenados pela potência p_k da curva, para um carregador
+# de saída P:
+#     tempo(P) = soma(dE_k / p_k, p_k <= P) + soma(dE_k, p_k > P) / P
+# As duas somas são cumulativas, logo cada carregador custa 1 searchsorted.
+
+import functools
+import math
+
+import numpy as np
+
+
+SOC_INICIAL_PADRAO = 20.0
+SOC_FINAL_PADRAO = 80.0
+PASSO_SOC = 0.5  # resolução da integração (pontos percentuais de SoC)
+
+
+class CurvaInvalida(ValueError):
+    """ Texto de curva de carga mal formado. """
+
+
+def ler_curva(texto):
+    """
+    "10:150 50:120 80:60" -> ((10.0, 150.0), (50.0, 120.0), (80.0, 60.0)).
+    Aceita vírgula decimal. Texto vazio/None -> None (sem curva).
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return None
+    pontos = []
+    for parte in texto.split():
+        try:
+            soc, potencia = parte.split(':')
+            soc = float(soc.replace(',', '.'))
+            potencia = float(potencia.replace(',', '.'))
+        except ValueError:
+            raise CurvaInvalida(f"ponto inválido '{parte}' (use soc:kW)")
+        if not 0 <= soc <= 100:
+            raise CurvaInvalida(f"SoC fora de 0-100 em '{parte}'")
+        if not 0 < potencia < math.inf:
+            raise CurvaInvalida(f"potência deve ser finita e maior que zero em '{parte}'")
+        pontos.append((soc, potencia))
+    pontos.sort()
+    if len({soc for soc, _ in pontos}) != len(pontos):
+        raise CurvaInvalida("SoC repetido na curva")
+    return tuple(pontos)
+
+
+def normalizar_curva(texto):
+    """ Valida e devolve o texto canónico da curva (ou None). """
+    pontos = ler_curva(texto)
+    if pontos is None:
+        return None
+    return " ".join(f"{soc:g}:{potencia:g}" for soc, potencia in pontos)
+
+
+def validar_janela(soc_inicial, soc_final):
+    if not 0 <= soc_inicial < soc_final <= 100:
+        raise ValueError("a janela de SoC deve cumprir 0 <= inicial < final <= 100")
+
+
+class PerfilCarga:
+    """
+    Janela de SoC de um veículo + tabela de energia acumulada da curva DC.
+    Sem curva, o tempo DC é exatamente a fórmula antiga (kWh / potência).
+    """
+
+    def __init__(self, capacidade_bateria_kwh, potencia_max_carga_dc_kw,
+                 soc_inicial=SOC_INICIAL_PADRAO, soc_final=SOC_FINAL_PADRAO, curva=None):
+        validar_janela(soc_inicial, soc_final)
+        self.soc_inicial = soc_inicial
+        self.soc_final = soc_final
+        self.fracao = (soc_final - soc_inicial) / 100
+        self.kwh_para_recarga = capacidade_bateria_kwh * self.fracao
+        self.curva = ler_curva(curva) if isinstance(curva, str) else curva
+        self.tem_curva = bool(self.curva)
+
+        if self.tem_curva:
+            n = max(1, math.ceil((soc_final - soc_inicial) / PASSO_SOC))
+            bordas = np.linspace(soc_inicial, soc_final, n + 1)
+            meios = (bordas[:-1] + bordas[1:]) / 2
+            socs, potencias = zip(*self.curva)
+            # A curva também nunca passa do limite DC declarado do veículo
+            p = np.minimum(np.interp(meios, socs, potencias), potencia_max_carga_dc_kw)
+            energia = capacidade_bateria_kwh * np.diff(bordas) / 100
+
+            ordem = np.argsort(p)
+            self._p = p[ordem]
+            energia = energia[ordem]
+            with np.errstate(divide='ignore'):
+                self._horas_acum = np.concatenate(([0.0], np.cumsum(energia / self._p)))
+            self._energia_acum = np.concatenate(([0.0], np.cumsum(energia)))
+            self._energia_total = self._energia_acum[-1]
+
+    def tempo_dc(self, potencia_kw):
+        """
+        Tempo (h) da janela num carregador DC cuja potência efetiva (já limitada
+        por min(DC do veículo, saída)) é `potencia_kw`. Vetorizado.
+        """
+        potencia_kw = np.asarray(potencia_kw, dtype=np.float64)
+        if not self.tem_curva:
+            return self.kwh_para_recarga / potencia_kw
+        j = np.searchsorted(self._p, potencia_kw, side='right')
+        return self._horas_acum[j] + (self._energia_total - self._energia_acum[j]) / potencia_kw
+
+    def tempo_horas(self, potencia_kw, is_dc):
+        """ Versão escalar para um único carregador (comparativo 1x1). """
+        if is_dc:
+            return float(self.tempo_dc(potencia_kw))
+        return self.kwh_para_recarga / potencia_kw
+
+
+@functools.lru_cache(maxsize=4096)
+def perfil_carga(capacidade_bateria_kwh, potencia_max_carga_dc_kw,
+                 soc_inicial=None, soc_final=None, curva_carga=None):
+    """ PerfilCarga em cache (os argumentos são os campos do veículo). """
+    return PerfilCarga(
+        capacidade_bateria_kwh,
+        potencia_max_carga_dc_kw,
+        SOC_INICIAL_PADRAO if soc_inicial is None else soc_inicial,
+        SOC_FINAL_PADRAO if soc_final is None else soc_final,
+        curva_carga,
+    )
@@ -0,0 +1,15 @@
+# Configuração do gunicorn (Procfile: gunicorn asgi:app -c gunicorn.conf.py)
+#
+# preload_app: o mestre importa asgi.py (e portanto criar_app) uma vez antes
+# do fork. Migrações e verificação do esquema correm só ali, e o catálogo e
+# os índices de pesquisa já carregados são partilhados copy-on-write pelos
+# workers (ver "Arranque" em app.py). As ligações ao banco abertas no mestre
+# são descartadas em cada filho (banco_sqlite.reiniciar_apos_fork).
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
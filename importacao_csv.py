@@ -0,0 +1,265 @@
+# Importação CSV em Streaming (Veículos e Carregadores)
+#
+# O ficheiro é lido linha a linha e processado em lotes:
+#   1. cada linha é validada/convertida (erros ficam no relatório, não abortam o ficheiro);
+#   2. cada lote é escrito com insert()/update() do SQLAlchemy Core (executemany),
+#      na sua própria transação;
+#   3. nenhum objeto ORM é criado, por isso a memória fica constante
+#      independentemente do tamanho do ficheiro.
+# Opcionalmente faz "upsert" pela chave natural (marca, modelo).
+# Tabelas com a coluna hash_conteudo recebem também o hash de cada linha
+# (usado pela sincronização incremental, ver sincronizacao_catalogo.py).
+
+import csv
+import hashlib
+import io
+import json
+import math
+
+from curva_carga import (
+    SOC_FINAL_PADRAO, SOC_INICIAL_PADRAO, CurvaInvalida, normalizar_curva, validar_janela
+)
+from sqlalchemy import bindparam, insert, select, tuple_, update
+
+
+# --- Conversores / Validadores de campo ---
+
+def texto_obrigatorio(valor):
+    valor = (valor or '').strip()
+    if not valor:
+        raise ValueError("campo vazio")
+    return valor
+
+def numero_nao_negativo(valor):
+    # Aceita decimal com vírgula (Excel PT): "7,4" -> 7.4
+    texto = (valor or '').strip().replace(',', '.')
+    if not texto:
+        raise ValueError("campo vazio")
+    try:
+        numero = float(texto)
+    except ValueError:
+        raise ValueError(f"número inválido ('{valor}')")
+    if not math.isfinite(numero):
+        raise ValueError(f"número não finito ('{valor}')")
+    if numero < 0:
+        raise ValueError(f"valor negativo ({numero})")
+    return numero
+
+def numero_positivo(valor):
+    numero = numero_nao_negativo(valor)
+    if numero == 0:
+        raise ValueError("deve ser maior que zero")
+    return numero
+
+def curva(valor):
+    try:
+        return normalizar_curva(valor)
+    except CurvaInvalida as e:
+        raise ValueError(str(e))
+
+def opcional(conversor, padrao):
+    """ Coluna que pode faltar no cabeçalho ou vir vazia (usa `padrao`). """
+    def converter(valor):
+        if valor is None or not valor.strip():
+            return padrao
+        return conversor(valor)
+    converter.opcional = True
+    return converter
+
+def tipo_corrente(valor):
+    tipo = (valor or '').strip().upper()
+    if tipo not in ('AC', 'DC'):
+        raise ValueError(f"deve ser AC ou DC (recebido '{valor}')")
+    return tipo
+
+
+# Colunas esperadas em cada CSV e o respetivo conversor
+ESQUEMA_VEICULOS = (
+    ('marca', texto_obrigatorio),
+    ('modelo', texto_obrigatorio),
+    ('capacidade_bateria_kwh', numero_positivo),
+    ('potencia_max_carga_ac_kw', numero_nao_negativo),
+    ('potencia_max_carga_dc_kw', numero_nao_negativo),
+    ('soc_inicial', opcional(numero_nao_negativo, SOC_INICIAL_PADRAO)),
+    ('soc_final', opcional(numero_nao_negativo, SOC_FINAL_PADRAO)),
+    ('curva_carga', opcional(curva, None)),
+)
+
+ESQUEMA_CARREGADORES = (
+    ('marca', texto_obrigatorio),
+    ('modelo', texto_obrigatorio),
+    ('potencia_saida_kw', numero_positivo),
+    ('tipo_corrente', tipo_corrente),
+    ('preco', numero_nao_negativo),
+)
+
+
+def hash_conteudo(registro, esquema):
+    """
+    SHA-1 dos campos do esquema, pela ordem do esquema. Números vão como
+    float, para que 7 (formulário) e 7.0 (CSV / banco) deem o mesmo hash.
+    """
+    valores = []
+    for campo, _ in esquema:
+        valor = registro.get(campo)
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            valor = float(valor)
+        valores.append(valor)
+    return hashlib.sha1(
+        json.dumps(valores, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+
+class RelatorioImportacao:
+    """
+    Resultado de uma importação.
+    Só os primeiros `max_erros` erros são guardados com detalhe (memória constante);
+    `total_erros` conta todos.
+    """
+
+    def __init__(self, max_erros=1000):
+        self.inseridos = 0
+        self.atualizados = 0
+        self.total_erros = 0
+        self.erros = []  # lista de (numero_da_linha, mensagem)
+        self.ids = []  # ids inseridos ou atualizados (para o índice de compatibilidade)
+        self.max_erros = max_erros
+
+    def registrar_erro(self, linha, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < self.max_erros:
+            self.erros.append((linha, mensagem))
+
+    @property
+    def processados(self):
+        return self.inseridos + self.atualizados
+
+    def resumo(self):
+        return {
+            "inseridos": self.inseridos,
+            "atualizados": self.atualizados,
+            "total_erros": self.total_erros,
+            "erros": [{"linha": linha, "erro": msg} for linha, msg in self.erros],
+        }
+
+
+def abrir_csv_texto(ficheiro, encoding='latin-1'):
+    """
+    Envolve o stream binário do upload num leitor de texto.
+    O Werkzeug usa BytesIO (uploads pequenos) ou SpooledTemporaryFile (grandes).
+    """
+    stream = getattr(ficheiro, 'stream', ficheiro)
+    stream = getattr(stream, '_file', stream)
+    return io.TextIOWrapper(stream, encoding, newline='')
+
+
+def validar_linhas(reader, esquema, relatorio):
+    """ Gerador: devolve só as linhas válidas já convertidas; regista as inválidas. """
+    for row in reader:
+        registro = {}
+        try:
+            for campo, conversor in esquema:
+                try:
+                    registro[campo] = conversor(row.get(campo))
+                except ValueError as e:
+                    raise ValueError(f"coluna '{campo}': {e}")
+        except ValueError as e:
+            relatorio.registrar_erro(reader.line_num, str(e))
+            continue
+        if 'soc_inicial' in registro:
+            try:
+                validar_janela(registro['soc_inicial'], registro['soc_final'])
+            except ValueError as e:
+                relatorio.registrar_erro(reader.line_num, str(e))
+                continue
+        yield registro
+
+
+def _lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _gravar_lote(conn, tabela, lote, upsert, relatorio):
+    if not upsert:
+        relatorio.ids.extend(conn.execute(insert(tabela).returning(tabela.c.id), lote).scalars())
+        relatorio.inseridos += len(lote)
+        return
+
+    # Última ocorrência de cada (marca, modelo) no lote ganha
+    por_chave = {}
+    for registro in lote:
+        por_chave[(registro['marca'], registro['modelo'])] = registro
+
+    existentes = dict(
+        ((marca, modelo), id_)
+        for id_, marca, modelo in conn.execute(
+            select(tabela.c.id, tabela.c.marca, tabela.c.modelo)
+            .where(tuple_(tabela.c.marca, tabela.c.modelo).in_(list(por_chave)))
+        )
+    )
+
+    novos = []
+    alterados = []
+    for chave, registro in por_chave.items():
+        if chave in existentes:
+            alterados.append(dict(registro, _id=existentes[chave]))
+        else:
+            novos.append(registro)
+
+    if novos:
+        relatorio.ids.extend(conn.execute(insert(tabela).returning(tabela.c.id), novos).scalars())
+    if alterados:
+        campos = {campo: bindparam(campo) for campo in alterados[0] if campo != '_id'}
+        conn.execute(
+            update(tabela).where(tabela.c.id == bindparam('_id')).values(**campos),
+            alterados,
+        )
+    relatorio.ids.extend(registro['_id'] for registro in alterados)
+    relatorio.inseridos += len(novos)
+    relatorio.atualizados += len(alterados)
+
+
+def importar_csv(engine, tabela, stream_texto, esquema, tamanho_lote=1000,
+                 upsert=False, delimiter=';', relatorio=None):
+    """
+    Importa um CSV para `tabela` (Table do SQLAlchemy) em lotes.
+    Cada lote é gravado na sua própria transação: um lote com falha na
+    base de dados é registado no relatório e os restantes continuam.
+    Se a leitura do ficheiro falhar a meio, a exceção leva o relatório
+    parcial em `relatorio` (os lotes anteriores já ficaram gravados).
+    """
+    relatorio = relatorio or RelatorioImportacao()
+    reader = csv.DictReader(stream_texto, delimiter=delimiter)
+
+    colunas = reader.fieldnames or []
+    faltando = [
+        campo for campo, conversor in esquema
+        if campo not in colunas and not getattr(conversor, 'opcional', False)
+    ]
+    if faltando:
+        relatorio.registrar_erro(1, f"colunas em falta no cabeçalho: {', '.join(faltando)}")
+        return relatorio
+
+    linhas = validar_linhas(reader, esquema, relatorio)
+    if 'hash_conteudo' in tabela.c:
+        linhas = (dict(registro, hash_conteudo=hash_conteudo(registro, esquema)) for registro in linhas)
+
+    try:
+        for lote in _lotes(linhas, tamanho_lote):
+            try:
+                with engine.begin() as conn:
+                    _gravar_lote(conn, tabela, lote, upsert, relatorio)
+            except Exception as e:
+                relatorio.registrar_erro(reader.line_num, f"lote de {len(lote)} linhas rejeitado: {e}")
+    except Exception as e:
+        e.relatorio = relatorio
+        raise
+
+    return relatorio
@@ -0,0 +1,170 @@
+# Índice de Compatibilidade Veículo x Carregador (persistido no SQLite)
+#
+# A potência efetiva e o tempo de recarga só dependem dos limites AC/DC do
+# veículo e da saída/tipo do carregador (custo_kwh e recargas_dia não mudam
+# a ordem). Guardamos por isso, para cada veículo, os carregadores compatíveis
+# já com potência e tempo calculados. O índice composto
+# (veiculo_id, tempo_recarga_horas, preco, carregador_id) devolve o ranking
+# já ordenado, e o simulador pede só a página que vai mostrar (top-K).
+#
+# Manutenção incremental:
+#   - veículo adicionado/editado   -> recalcula só as linhas desse veículo;
+#   - carregador adicionado/editado -> recalcula só as linhas desse carregador;
+#   - sincronização de um feed        -> recalcula só os alterados, em conjunto.
+# As duas operações são vetorizadas (NumPy) sobre o outro lado do catálogo.
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+
+from catalogo_cache import RegistroVeiculo
+from motor_compatibilidade import MatrizCarregadores, RegistroCarregador
+
+
+def _linhas(veiculo_ids, carregador_ids, potencia, tempo, preco):
+    return [
+        {
+            "veiculo_id": v,
+            "carregador_id": c,
+            "potencia_efetiva_kw": p,
+            "tempo_recarga_horas": t,
+            "preco": pr,
+        }
+        for v, c, p, t, pr in zip(veiculo_ids, carregador_ids, potencia, tempo, preco)
+    ]
+
+
+def linhas_para_veiculo(matriz, veiculo):
+    """ Linhas do índice de um veículo contra todos os carregadores da matriz. """
+    calc = matriz.calcular_veiculo(veiculo, 1.0)
+    indices = calc["indices"]
+    return _linhas(
+        [veiculo.id] * len(indices),
+        matriz.ids[indices].tolist(),
+        calc["potencia_efetiva_kw"].tolist(),
+        calc["tempo_recarga_horas"].tolist(),
+        matriz.preco[indices].tolist(),
+    )
+
+
+def linhas_para_carregador(veiculos, carregador):
+    """
+    Linhas do índice de um carregador contra todos os veículos
+    (`veiculos`: sequência de RegistroVeiculo).
+    """
+    if carregador.tipo_corrente not in ('AC', 'DC') or not veiculos:
+        return []
+    is_dc = carregador.tipo_corrente == 'DC'
+    ids = np.fromiter((v.id for v in veiculos), dtype=np.int64, count=len(veiculos))
+    limite = np.fromiter(
+        (v.potencia_max_carga_dc_kw if is_dc else v.potencia_max_carga_ac_kw for v in veiculos),
+        dtype=np.float64, count=len(veiculos))
+    kwh = np.fromiter(
+        (v.perfil.kwh_para_recarga for v in veiculos), dtype=np.float64, count=len(veiculos))
+
+    efetiva = np.minimum(limite, carregador.potencia_saida_kw)
+    compativeis = np.flatnonzero(efetiva > 0)
+    efetiva = efetiva[compativeis]
+    kwh = kwh[compativeis]
+    tempo = kwh / efetiva
+
+    # Veículos com curva DC: tempo pela tabela de energia acumulada de cada um
+    if is_dc:
+        for pos, i in enumerate(compativeis.tolist()):
+            perfil = veiculos[i].perfil
+            if perfil.tem_curva:
+                tempo[pos] = perfil.tempo_dc(efetiva[pos])
+                efetiva[pos] = kwh[pos] / tempo[pos]
+
+    return _linhas(
+        ids[compativeis].tolist(),
+        [carregador.id] * len(efetiva),
+        efetiva.tolist(),
+        tempo.tolist(),
+        [carregador.preco or 0.0] * len(efetiva),
+    )
+
+
+def _inserir(conn, tabela, linhas, tamanho_lote=5000):
+    for inicio in range(0, len(linhas), tamanho_lote):
+        conn.execute(insert(tabela), linhas[inicio:inicio + tamanho_lote])
+
+
+def atualizar_veiculo(conn, tabela, veiculo, linhas_carregadores):
+    """ Recalcula as entradas de UM veículo (na transação de `conn`). """
+    conn.execute(delete(tabela).where(tabela.c.veiculo_id == veiculo.id))
+    matriz = MatrizCarregadores.de_linhas(linhas_carregadores)
+    _inserir(conn, tabela, linhas_para_veiculo(matriz, veiculo))
+
+
+def atualizar_carregador(conn, tabela, carregador, linhas_veiculos):
+    """ Recalcula as entradas de UM carregador (na transação de `conn`). """
+    conn.execute(delete(tabela).where(tabela.c.carregador_id == carregador.id))
+    veiculos = [RegistroVeiculo(*linha) for linha in linhas_veiculos]
+    _inserir(conn, tabela, linhas_para_carregador(veiculos, carregador))
+
+
+def atualizar_alterados(conn, tabela, veiculo_ids, carregador_ids, linhas_veiculos, linhas_carregadores,
+                        tamanho_bloco=500):
+    """
+    Recalcula as entradas de vários veículos e carregadores de uma vez
+    (ids apagados só perdem as entradas). Uma única matriz para todos os
+    veículos alterados; os pares veículo alterado x carregador alterado
+    entram só pelo lado do veículo.
+    """
+    veiculo_ids, carregador_ids = set(veiculo_ids), set(carregador_ids)
+    for coluna, ids in ((tabela.c.veiculo_id, veiculo_ids), (tabela.c.carregador_id, carregador_ids)):
+        ids = sorted(ids)
+        for inicio in range(0, len(ids), tamanho_bloco):
+            conn.execute(delete(tabela).where(coluna.in_(ids[inicio:inicio + tamanho_bloco])))
+
+    veiculos = [RegistroVeiculo(*linha) for linha in linhas_veiculos]
+    if veiculo_ids:
+        matriz = MatrizCarregadores.de_linhas(linhas_carregadores)
+        for veiculo in veiculos:
+            if veiculo.id in veiculo_ids:
+                _inserir(conn, tabela, linhas_para_veiculo(matriz, veiculo))
+    if carregador_ids:
+        outros = [v for v in veiculos if v.id not in veiculo_ids]
+        for linha in linhas_carregadores:
+            if linha[0] in carregador_ids:
+                _inserir(conn, tabela, linhas_para_carregador(outros, RegistroCarregador(*linha)))
+
+
+def reconstruir(conn, tabela, linhas_veiculos, linhas_carregadores):
+    """
+    Reconstrução completa (arranque com índice vazio, importações CSV em massa).
+    linhas_veiculos: tuplas com os campos de RegistroVeiculo.
+    """
+    conn.execute(delete(tabela))
+    matriz = MatrizCarregadores.de_linhas(linhas_carregadores)
+    total = 0
+    for linha in linhas_veiculos:
+        linhas = linhas_para_veiculo(matriz, RegistroVeiculo(*linha))
+        _inserir(conn, tabela, linhas)
+        total += len(linhas)
+    return total
+
+
+def consultar_pagina(conn, tabela, tabela_carregador, veiculo_id, pagina, por_pagina):
+    """
+    Devolve (total, linhas) da página pedida do ranking de um veículo.
+    Cada linha: (id, marca, modelo, potencia_saida_kw, tipo_corrente, preco,
+                 potencia_efetiva_kw, tempo_recarga_horas).
+    """
+    total = conn.execute(
+        select(func.count()).select_from(tabela).where(tabela.c.veiculo_id == veiculo_id)
+    ).scalar_one()
+
+    c = tabela_carregador.c
+    linhas = conn.execute(
+        select(
+            c.id, c.marca, c.modelo, c.potencia_saida_kw, c.tipo_corrente, c.preco,
+            tabela.c.potencia_efetiva_kw, tabela.c.tempo_recarga_horas
+        )
+        .join(tabela_carregador, c.id == tabela.c.carregador_id)
+        .where(tabela.c.veiculo_id == veiculo_id)
+        .order_by(tabela.c.tempo_recarga_horas, tabela.c.preco, tabela.c.carregador_id)
+        .limit(por_pagina)
+        .offset((pagina - 1) * por_pagina)
+    ).all()
+    return total, linhas
@@ -0,0 +1,290 @@
+# Instrumentação: Métricas por Rota (Prometheus) e Perfis de Pedidos Lentos
+#
+# Sem dependências externas. Por pedido regista:
+#   - latência por endpoint (histograma) e contagem por endpoint/método/status;
+#   - nº de consultas SQL e tempo total em SQL (eventos do SQLAlchemy);
+#   - tempo de renderização de cada template Jinja (sinais do Flask);
+#   - "spans" à volta das funções de cálculo (decorador `span`).
+# Tudo é exposto em texto no formato do Prometheus (/metrics). Os valores são
+# por processo (cada worker do gunicorn tem os seus, como o cache do catálogo).
+#
+# Perfis (opt-in): com um limiar em ms, uma thread amostra a pilha dos pedidos
+# em curso a cada `intervalo` segundos (sys._current_frames). Se o pedido
+# demorar mais do que o limiar, as pilhas são gravadas em formato "collapsed"
+# (uma linha "f1;f2;f3 N" por pilha, pronto para flamegraph.pl / speedscope).
+# Com os perfis desligados não há thread nem amostragem: o custo por pedido é
+# um par de perf_counter() e alguns incrementos sob um lock.
+
+import bisect
+import contextlib
+import functools
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+
+class _Histograma:
+    def __init__(self, nome, ajuda, rotulo, buckets):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulo = rotulo
+        self.buckets = buckets
+        self.series = {}  # valor do rótulo -> [contagens por bucket..., +Inf, soma]
+
+    def observar(self, valor_rotulo, valor):
+        serie = self.series.get(valor_rotulo)
+        if serie is None:
+            serie = self.series[valor_rotulo] = [0] * (len(self.buckets) + 1) + [0.0]
+        serie[bisect.bisect_left(self.buckets, valor)] += 1
+        serie[-1] += valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for valor_rotulo, serie in sorted(self.series.items()):
+            rotulo = f'{self.rotulo}="{_escapar(valor_rotulo)}"'
+            acumulado = 0
+            for limite, n in zip(self.buckets, serie):
+                acumulado += n
+                linhas.append(f'{self.nome}_bucket{{{rotulo},le="{limite:g}"}} {acumulado}')
+            acumulado += serie[len(self.buckets)]
+            linhas.append(f'{self.nome}_bucket{{{rotulo},le="+Inf"}} {acumulado}')
+            linhas.append(f'{self.nome}_sum{{{rotulo}}} {serie[-1]:.6f}')
+            linhas.append(f'{self.nome}_count{{{rotulo}}} {acumulado}')
+        return linhas
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _EstatisticasPedido:
+    __slots__ = ('inicio', 'consultas', 'tempo_sql', 'amostras')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.amostras = None
+
+
+class Instrumentacao:
+    """
+    Métricas do processo + perfis de pedidos lentos.
+    Uso: instrumentacao = Instrumentacao(); instrumentacao.init_app(app)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pedidos = Counter()  # (endpoint, metodo, status) -> n
+        self.latencia = _Histograma(
+            'http_requisicao_duracao_segundos', 'Latência dos pedidos por endpoint.',
+            'endpoint', BUCKETS_LATENCIA)
+        self.consultas = _Histograma(
+            'sql_consultas_por_requisicao', 'Nº de consultas SQL por pedido.',
+            'endpoint', BUCKETS_CONSULTAS)
+        self.tempo_sql = _Histograma(
+            'sql_duracao_por_requisicao_segundos', 'Tempo total em SQL por pedido.',
+            'endpoint', BUCKETS_LATENCIA)
+        self.render = _Histograma(
+            'template_render_duracao_segundos', 'Tempo de renderização por template Jinja.',
+            'template', BUCKETS_LATENCIA)
+        self.spans = _Histograma(
+            'calculo_duracao_segundos', 'Duração das funções de cálculo instrumentadas.',
+            'span', BUCKETS_LATENCIA)
+        self.consultas_fora_de_pedido = 0
+        self.perfis_gravados = 0
+        self.coletores = []  # funções () -> {nome_metrica: valor} (gauges)
+
+        self.limiar_perfil_s = None
+        self.pasta_perfis = None
+        self.intervalo_amostragem = 0.005
+        self._em_curso = {}  # thread id -> _EstatisticasPedido (só com perfis ligados)
+        self._amostrador = None
+        self._sequencia = itertools.count(1)
+
+    # --- Integração com Flask / SQLAlchemy ---
+
+    def init_app(self, app):
+        limiar_ms = app.config.get('PERFIL_LIMIAR_MS')
+        if limiar_ms:
+            self.limiar_perfil_s = float(limiar_ms) / 1000
+            self.pasta_perfis = app.config['PERFIL_PASTA']
+            self.intervalo_amostragem = app.config.get('PERFIL_INTERVALO_MS', 5) / 1000
+            os.makedirs(self.pasta_perfis, exist_ok=True)
+
+        app.before_request(self._antes_do_pedido)
+        app.after_request(self._registar_status)
+        app.teardown_request(self._fim_do_pedido)
+        before_render_template.connect(self._antes_do_render, app)
+        template_rendered.connect(self._depois_do_render, app)
+        # Ao nível da classe Engine: cobre qualquer engine, sem precisar de app context
+        if not event.contains(Engine, 'before_cursor_execute', self._antes_da_consulta):
+            event.listen(Engine, 'before_cursor_execute', self._antes_da_consulta)
+            event.listen(Engine, 'after_cursor_execute', self._depois_da_consulta)
+            event.listen(Engine, 'handle_error', self._erro_na_consulta)
+
+    def _antes_do_pedido(self):
+        estatisticas = g._instrumentacao = _EstatisticasPedido()
+        if self.limiar_perfil_s is not None:
+            estatisticas.amostras = Counter()
+            self._em_curso[threading.get_ident()] = estatisticas
+            self._garantir_amostrador()
+
+    def _fim_do_pedido(self, erro=None):
+        estatisticas = g.pop('_instrumentacao', None)
+        if estatisticas is None:
+            return
+        duracao = time.perf_counter() - estatisticas.inicio
+        endpoint = request.endpoint or 'sem_rota'
+        status = getattr(g, '_status_resposta', 500 if erro else 200)
+        with self._lock:
+            self.pedidos[(endpoint, request.method, status)] += 1
+            self.latencia.observar(endpoint, duracao)
+            self.consultas.observar(endpoint, estatisticas.consultas)
+            self.tempo_sql.observar(endpoint, estatisticas.tempo_sql)
+
+        if estatisticas.amostras is not None:
+            self._em_curso.pop(threading.get_ident(), None)
+            if duracao >= self.limiar_perfil_s and estatisticas.amostras:
+                self._gravar_perfil(endpoint, duracao, estatisticas)
+
+    def _registar_status(self, resposta):
+        # O teardown não recebe a resposta: guarda aqui o status
+        g._status_resposta = resposta.status_code
+        return resposta
+
+    def _antes_da_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_instrumentacao_inicio', []).append(time.perf_counter())
+
+    def _depois_da_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        self._registar_consulta(conn.info['_instrumentacao_inicio'].pop())
+
+    def _erro_na_consulta(self, contexto):
+        # Consulta que falhou: o after_cursor_execute não corre e o início ficava na pilha
+        pilha = contexto.connection.info.get('_instrumentacao_inicio') if contexto.connection is not None else None
+        if pilha:
+            self._registar_consulta(pilha.pop())
+
+    def _registar_consulta(self, inicio):
+        estatisticas = g.get('_instrumentacao') if has_request_context() else None
+        if estatisticas is None:
+            self.consultas_fora_de_pedido += 1
+            return
+        estatisticas.consultas += 1
+        estatisticas.tempo_sql += time.perf_counter() - inicio
+
+    def _antes_do_render(self, app, template, context, **extra):
+        g.setdefault('_render_inicio', []).append(time.perf_counter())
+
+    def _depois_do_render(self, app, template, context, **extra):
+        pilha = g.get('_render_inicio')
+        if not pilha:
+            return
+        duracao = time.perf_counter() - pilha.pop()
+        with self._lock:
+            self.render.observar(template.name or 'sem_nome', duracao)
+
+    # --- Spans ---
+
+    @contextlib.contextmanager
+    def medir(self, nome):
+        """ Bloco `with` registado no histograma calculo_duracao_segundos. """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._lock:
+                self.spans.observar(nome, duracao)
+
+    def span(self, nome):
+        """ Decorador: o mesmo que `medir`, à volta da função inteira. """
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def medida(*args, **kwargs):
+                with self.medir(nome):
+                    return funcao(*args, **kwargs)
+            return medida
+        return decorador
+
+    # --- Perfis por amostragem ---
+
+    def _garantir_amostrador(self):
+        if self._amostrador is not None and self._amostrador.is_alive():
+            return
+        with self._lock:
+            if self._amostrador is None or not self._amostrador.is_alive():
+                self._amostrador = threading.Thread(
+                    target=self._amostrar, name='perfil-amostrador', daemon=True)
+                self._amostrador.start()
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        while True:
+            time.sleep(self.intervalo_amostragem)
+            if not self._em_curso:
+                continue
+            quadros = sys._current_frames()
+            for ident, estatisticas in list(self._em_curso.items()):
+                quadro = quadros.get(ident)
+                if quadro is None or ident == proprio:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    codigo = quadro.f_code
+                    pilha.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{quadro.f_lineno}")
+                    quadro = quadro.f_back
+                estatisticas.amostras[';'.join(reversed(pilha))] += 1
+
+    def _gravar_perfil(self, endpoint, duracao, estatisticas):
+        nome = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)
+        caminho = os.path.join(
+            self.pasta_perfis, f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}-{next(self._sequencia)}_{nome}_{duracao * 1000:.0f}ms.txt")
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write(f"# {request.method} {request.path} {duracao * 1000:.1f} ms, "
+                    f"{estatisticas.consultas} consultas SQL ({estatisticas.tempo_sql * 1000:.1f} ms), "
+                    f"intervalo {self.intervalo_amostragem * 1000:g} ms\n")
+            for pilha, n in estatisticas.amostras.most_common():
+                f.write(f"{pilha} {n}\n")
+        with self._lock:
+            self.perfis_gravados += 1
+
+    # --- Exportação ---
+
+    def exportar(self):
+        """ Texto no formato de exposição do Prometheus (version 0.0.4). """
+        with self._lock:
+            linhas = ["# HELP http_requisicoes_total Pedidos por endpoint, método e status.",
+                      "# TYPE http_requisicoes_total counter"]
+            for (endpoint, metodo, status), n in sorted(self.pedidos.items()):
+                linhas.append(
+                    f'http_requisicoes_total{{endpoint="{_escapar(endpoint)}",metodo="{metodo}",status="{status}"}} {n}')
+            for histograma in (self.latencia, self.consultas, self.tempo_sql, self.render, self.spans):
+                linhas.extend(histograma.exportar())
+            linhas += [
+                "# HELP sql_consultas_fora_de_pedido_total Consultas SQL fora de um pedido (arranque, CLI).",
+                "# TYPE sql_consultas_fora_de_pedido_total counter",
+                f"sql_consultas_fora_de_pedido_total {self.consultas_fora_de_pedido}",
+                "# HELP perfis_gravados_total Perfis de pedidos lentos gravados em disco.",
+                "# TYPE perfis_gravados_total counter",
+                f"perfis_gravados_total {self.perfis_gravados}",
+            ]
+        medidores = {}
+        for coletor in self.coletores:
+            for nome, valor in coletor().items():
+                medidores[nome] = valor
+        for nome, valor in sorted(medidores.items()):
+            linhas += [f"# TYPE {nome} gauge", f"{nome} {valor}"]
+        return "\n".join(linhas) + "\n"
@@ -0,0 +1,195 @@
+# Motor de Compatibilidade Vetorizado (Matriz de Carregadores)
+#
+# Em vez de materializar um objeto ORM por carregador e calcular tudo num
+# loop Python, o catálogo é guardado em colunas (arrays NumPy) carregadas
+# uma única vez. Cada simulação faz então UMA passagem vetorizada:
+# potência efetiva (AC/DC), tempo de recarga, R$/kW e aviso de 24h.
+
+from collections import namedtuple
+
+import numpy as np
+
+
+def calcular_custos_gerais(kwh_para_recarga, custo_kwh, recargas_dia):
+    """ Custos independentes do carregador (por recarga, dia, mês de 30 dias e ano). """
+    custo_por_recarga = kwh_para_recarga * custo_kwh
+    custo_diario = custo_por_recarga * recargas_dia
+    return {
+        "custo_por_recarga": custo_por_recarga,
+        "custo_mensal": custo_diario * 30, # Média de 30 dias
+        "custo_diario": custo_diario,
+        "custo_anual": custo_diario * 365
+    }
+
+
+def calcular_comissao(kwh_para_recarga, recargas_dia, preco_venda_kwh, porcentagem_cliente):
+    """ Faturamento do modelo de comissão (EaaS): bruto, parte do cliente e da operadora (mês de 30 dias). """
+    receita_por_recarga = kwh_para_recarga * preco_venda_kwh
+    faturamento_bruto_diario = receita_por_recarga * recargas_dia
+    faturamento_bruto_mensal = faturamento_bruto_diario * 30
+
+    comissao_cliente_mensal = faturamento_bruto_mensal * (porcentagem_cliente / 100)
+    return {
+        "kwh_para_recarga": kwh_para_recarga,
+        "receita_por_recarga": receita_por_recarga,
+        "faturamento_bruto_mensal": faturamento_bruto_mensal,
+        "comissao_cliente_mensal": comissao_cliente_mensal,
+        "faturamento_operadora_mensal": faturamento_bruto_mensal - comissao_cliente_mensal
+    }
+
+
+class RegistroCarregador(namedtuple(
+        'RegistroCarregador',
+        'id marca modelo potencia_saida_kw tipo_corrente preco')):
+    """
+    Registo leve e só de leitura de um Carregador.
+    Expõe os mesmos atributos que os templates usam no modelo ORM.
+    """
+    __slots__ = ()
+
+    @property
+    def nome_completo(self):
+        return f"{self.marca} {self.modelo} ({self.potencia_saida_kw} kW {self.tipo_corrente})"
+
+
+class MatrizCarregadores:
+    """
+    Catálogo de carregadores em formato colunar.
+    A ordem das linhas é a ordem de entrada (por id), o que mantém o mesmo
+    desempate da versão antiga (ordenação estável).
+    """
+
+    def __init__(self, registros):
+        self.registros = tuple(registros)
+        n = len(self.registros)
+
+        self.ids = np.fromiter((r.id for r in self.registros), dtype=np.int64, count=n)
+        self.potencia_saida_kw = np.fromiter(
+            (r.potencia_saida_kw for r in self.registros), dtype=np.float64, count=n)
+        # preco pode vir NULL do banco: tratamos como 0.0 (igual a "sem preço")
+        self.preco = np.fromiter(
+            (r.preco or 0.0 for r in self.registros), dtype=np.float64, count=n)
+
+        tipos = [r.tipo_corrente for r in self.registros]
+        self.is_ac = np.fromiter((t == 'AC' for t in tipos), dtype=bool, count=n)
+        self.is_dc = np.fromiter((t == 'DC' for t in tipos), dtype=bool, count=n)
+
+    @classmethod
+    def de_colunas(cls, registros, ids, potencia_saida_kw, preco, is_ac, is_dc):
+        """
+        Matriz sobre colunas já prontas (ex.: vistas do snapshot colunar, sem
+        cópia). `registros[i]` é o registo da linha i; preco NaN = sem preço.
+        """
+        matriz = cls.__new__(cls)
+        matriz.registros = registros
+        matriz.ids = ids
+        matriz.potencia_saida_kw = potencia_saida_kw
+        matriz.preco = np.nan_to_num(preco, nan=0.0)
+        matriz.is_ac = is_ac
+        matriz.is_dc = is_dc
+        return matriz
+
+    @classmethod
+    def de_linhas(cls, linhas):
+        """ Constrói a matriz a partir de tuplas (id, marca, modelo, potencia, tipo, preco). """
+        return cls(RegistroCarregador(*linha) for linha in linhas)
+
+    def __len__(self):
+        return len(self.registros)
+
+    def potencia_efetiva(self, potencia_max_ac_kw, potencia_max_dc_kw):
+        """
+        Potência efetiva de cada carregador para um veículo.
+        AC -> min(veículo AC, saída); DC -> min(veículo DC, saída); outro tipo -> 0.
+        """
+        limite_veiculo = np.where(self.is_dc, potencia_max_dc_kw, potencia_max_ac_kw)
+        efetiva = np.minimum(limite_veiculo, self.potencia_saida_kw)
+        return np.where(self.is_ac | self.is_dc, efetiva, 0.0)
+
+    def calcular(self, kwh_para_recarga, potencia_max_ac_kw, potencia_max_dc_kw, recargas_dia,
+                 perfil=None):
+        """
+        Passagem vetorizada única. Devolve um dicionário de arrays já
+        filtrados (só compatíveis) e ordenados por (tempo, preço).
+        Com `perfil` (curva_carga.PerfilCarga) o tempo nos carregadores DC
+        segue a curva do veículo e a potência devolvida é a média da sessão.
+        """
+        efetiva = self.potencia_efetiva(potencia_max_ac_kw, potencia_max_dc_kw)
+        compativeis = np.flatnonzero(efetiva > 0)
+
+        efetiva = efetiva[compativeis]
+        preco = self.preco[compativeis]
+        tempo = kwh_para_recarga / efetiva
+        if perfil is not None and perfil.tem_curva:
+            dc = self.is_dc[compativeis]
+            tempo[dc] = perfil.tempo_dc(efetiva[dc])
+            efetiva[dc] = kwh_para_recarga / tempo[dc]
+
+        # 1º Critério: menor tempo; 2º Critério: menor preço (lexsort é estável)
+        ordem = np.lexsort((preco, tempo))
+        indices = compativeis[ordem]
+        efetiva = efetiva[ordem]
+        preco = preco[ordem]
+        tempo = tempo[ordem]
+
+        with np.errstate(divide='ignore'):
+            custo_beneficio = np.where(preco > 0, preco / efetiva, np.inf)
+
+        return {
+            "indices": indices,
+            "potencia_efetiva_kw": efetiva,
+            "tempo_recarga_horas": tempo,
+            "custo_beneficio_reais_por_kw": custo_beneficio,
+            "is_over_24h": (tempo * recargas_dia) > 24,
+        }
+
+    def calcular_veiculo(self, veiculo, recargas_dia):
+        """ calcular() com a janela de SoC e a curva de carga do próprio veículo. """
+        perfil = veiculo.perfil
+        return self.calcular(
+            perfil.kwh_para_recarga,
+            veiculo.potencia_max_carga_ac_kw,
+            veiculo.potencia_max_carga_dc_kw,
+            recargas_dia,
+            perfil
+        )
+
+    def ranking(self, kwh_para_recarga, potencia_max_ac_kw, potencia_max_dc_kw, recargas_dia,
+                perfil=None, tarifa=None, hora_inicio=0.0):
+        """
+        Mesmo formato que os templates já usam: lista de dicionários com
+        'carregador', 'potencia_efetiva_kw', 'tempo_recarga_horas',
+        'custo_beneficio_reais_por_kw' e 'is_over_24h'.
+        Com `tarifa` (tarifa_horaria.PerfilTarifa) cada entrada ganha 'custos',
+        calculados para todo o catálogo numa só passagem.
+        """
+        calc = self.calcular(
+            kwh_para_recarga, potencia_max_ac_kw, potencia_max_dc_kw, recargas_dia, perfil)
+        registros = self.registros
+        ranking = [
+            {
+                "carregador": registros[i],
+                "potencia_efetiva_kw": pot,
+                "tempo_recarga_horas": tempo,
+                "custo_beneficio_reais_por_kw": cb,
+                "is_over_24h": over,
+            }
+            for i, pot, tempo, cb, over in zip(
+                calc["indices"].tolist(),
+                calc["potencia_efetiva_kw"].tolist(),
+                calc["tempo_recarga_horas"].tolist(),
+                calc["custo_beneficio_reais_por_kw"].tolist(),
+                calc["is_over_24h"].tolist(),
+            )
+        ]
+        if tarifa is not None and ranking:
+            # Pico da sessão = potência efetiva nominal (antes da média da curva DC)
+            pico = self.potencia_efetiva(potencia_max_ac_kw, potencia_max_dc_kw)[calc["indices"]]
+            custos = tarifa.custos(
+                calc["potencia_efetiva_kw"], calc["tempo_recarga_horas"], pico,
+                hora_inicio, recargas_dia
+            )
+            colunas = {chave: valores.tolist() for chave, valores in custos.items()}
+            for j, entrada in enumerate(ranking):
+                entrada["custos"] = {chave: valores[j] for chave, valores in colunas.items()}
+        return ranking
@@ -0,0 +1,463 @@
+# Otimizador do Mix de Carregadores (Modelo de Comissão / EaaS)
+#
+# Dada uma frota (veículos x quantidade x recargas/dia) e um orçamento, escolhe
+# quantos carregadores de cada modelo do catálogo comprar para maximizar a
+# receita mensal da operadora (ou minimizar o payback).
+#
+#   - Receita: a mesma fórmula da página de comissão (calcular_comissao),
+#     aplicada à energia que os carregadores conseguem de facto entregar.
+#   - Custo: soma dos `preco` dos carregadores comprados.
+#   - Restrição: cada carregador tem `horas_operacao` por dia; um veículo num
+#     carregador recebe energia à taxa kWh_janela / tempo_recarga (potência
+#     efetiva, já com a curva DC do veículo).
+#
+# A busca é combinatória (contagem por modelo), por isso:
+#   1. poda por dominância: um modelo que não é mais rápido para nenhum veículo
+#      e não é mais barato do que outro sai logo da busca;
+#   2. branch and bound: cada subproblema tem um limite superior
+#      (energia por real do melhor modelo restante, limitada pela procura);
+#   3. memoização: o resultado de um subproblema depende só de
+#      (modelo atual, procura restante, orçamento restante), não do caminho;
+#   4. em paralelo (opcional), os ramos do primeiro modelo vão para o pool
+#      partilhado do processo (pool_processos.py); antes disso cada busca
+#      corre ENSAIO_SERIE_S em série, e os problemas pequenos acabam aí;
+#   5. com tempo limite, devolve a melhor solução encontrada até então
+#      (e `completo: False`).
+# O payback (custo / receita) não é aditivo: usa-se Dinkelbach, que o reduz a
+# uma sequência de problemas aditivos "receita - lambda * custo".
+
+import bisect
+import concurrent.futures
+import math
+import time
+
+from motor_compatibilidade import calcular_comissao
+from pool_processos import obter_pool
+
+
+OBJETIVOS = ('receita', 'payback')
+EPS = 1e-9
+# Desempate no objetivo "receita": entre mixes com a mesma receita fica o mais
+# barato. Um custo de R$ 1 vale 1e-6 R$/mês de receita (irrelevante no
+# resultado, mas deixa o limite superior podar os ramos que só empatam).
+LAMBDA_DESEMPATE = 1e-6
+ENSAIO_SERIE_S = 0.05  # Busca em série antes de repartir pelo pool
+
+
+class ErroOtimizacao(ValueError):
+    """ Pedido de otimização inválido (vira HTTP 400 na rota). """
+
+
+class ProblemaMix:
+    """
+    Dados numéricos do problema (só listas de floats: vão para o pool por pickle).
+    taxa[k][v]:  kWh/h que o modelo k entrega ao grupo de veículos v (0 = incompatível).
+    procura[v]:  kWh/dia pedidos pelo grupo v.
+    preco[k]:    R$ por unidade do modelo k.
+    """
+
+    def __init__(self, taxa, procura, preco, horas_operacao, orcamento, receita_por_kwh_dia):
+        self.taxa = taxa
+        self.procura = procura
+        self.preco = preco
+        self.horas = horas_operacao
+        self.orcamento = orcamento
+        self.receita_por_kwh_dia = receita_por_kwh_dia
+        n = len(preco)
+
+        # Veículos servidos por cada modelo, do mais rápido para o mais lento
+        self.ordem_veiculos = [
+            sorted((v for v in range(len(procura)) if taxa[k][v] > 0), key=lambda v: -taxa[k][v])
+            for k in range(n)
+        ]
+        # Máximo útil de unidades: o que serve toda a procura compatível sozinho
+        self.max_unidades = []
+        for k in range(n):
+            horas = sum(procura[v] / taxa[k][v] for v in self.ordem_veiculos[k])
+            maximo = math.ceil(horas / self.horas - EPS)
+            if preco[k] > 0:
+                maximo = min(maximo, int(orcamento // preco[k] + EPS))
+            self.max_unidades.append(maximo)
+        # Energia/dia por real (melhor modelo de k em diante): base do limite superior
+        self.rho_sufixo = [0.0] * (n + 1)
+        for k in range(n - 1, -1, -1):
+            melhor = max(taxa[k]) * self.horas
+            rho = math.inf if self.preco[k] <= 0 else melhor / self.preco[k]
+            self.rho_sufixo[k] = max(rho, self.rho_sufixo[k + 1])
+
+    def alocar(self, k, unidades, restante):
+        """ Entrega as horas de `unidades` do modelo k aos veículos (mais rápidos primeiro). """
+        return self.fila(k, restante).alocar(unidades * self.horas)
+
+    def fila(self, k, restante):
+        return _FilaAlocacao(self.ordem_veiculos[k], self.taxa[k], restante)
+
+    def limite_superior(self, k, procura, orcamento, lam):
+        """ Máximo de (receita - lam * custo) que os modelos k.. ainda podem somar (procura em kWh/dia). """
+        rho = self.rho_sufixo[k]
+        receita = self.receita_por_kwh_dia
+        if procura <= EPS or rho <= 0:
+            return 0.0
+        if math.isinf(rho):
+            return receita * procura
+        if receita * rho <= lam:
+            return 0.0
+        gasto = min(orcamento, procura / rho)
+        return receita * rho * gasto - lam * gasto
+
+
+class _FilaAlocacao:
+    """
+    Procura restante de um nó vista por um modelo: horas e energia acumuladas
+    na ordem de atendimento. A energia entregue por X horas sai de uma bisseção,
+    sem copiar o vetor (só os ramos que passam a poda constroem o resto).
+    """
+
+    def __init__(self, ordem, taxa, restante):
+        self.ordem = [v for v in ordem if restante[v] > EPS]
+        self.taxa = taxa
+        self.restante = restante
+        self.horas_acum = [0.0]
+        self.energia_acum = [0.0]
+        for v in self.ordem:
+            self.horas_acum.append(self.horas_acum[-1] + restante[v] / taxa[v])
+            self.energia_acum.append(self.energia_acum[-1] + restante[v])
+
+    def energia(self, horas):
+        j = bisect.bisect_right(self.horas_acum, horas) - 1
+        if j >= len(self.ordem):
+            return self.energia_acum[-1], j
+        return self.energia_acum[j] + (horas - self.horas_acum[j]) * self.taxa[self.ordem[j]], j
+
+    def resto(self, energia, j):
+        restante = list(self.restante)
+        for v in self.ordem[:j]:
+            restante[v] = 0.0
+        if j < len(self.ordem):
+            v = self.ordem[j]
+            restante[v] = max(0.0, self.energia_acum[j + 1] - energia)
+        return restante
+
+    def alocar(self, horas):
+        energia, j = self.energia(horas)
+        return energia, self.resto(energia, j)
+
+
+def _melhor(a, b):
+    """ Compara (valor, custo, contagens): maior valor; empate -> menor custo. """
+    if a is None:
+        return b
+    if b[0] > a[0] + EPS or (b[0] >= a[0] - EPS and b[1] < a[1] - EPS):
+        return b
+    return a
+
+
+class _Busca:
+    """ DFS memoizada com branch and bound para um lambda fixo. """
+
+    def __init__(self, problema, lam, prazo):
+        self.p = problema
+        self.lam = lam
+        self.prazo = prazo
+        self.memo = {}
+        self.nos = 0
+        self.interrompida = False
+
+    def _esgotado(self):
+        if self.prazo is not None and not self.interrompida and time.monotonic() > self.prazo:
+            self.interrompida = True
+        return self.interrompida
+
+    def resolver(self, k, restante, orcamento):
+        """
+        Devolve (valor, custo, contagens dos modelos k..) do melhor completamento.
+        Com o tempo esgotado continua a devolver uma solução válida (o primeiro
+        ramo de cada nível é sempre explorado), mas já não a memoiza.
+        """
+        p = self.p
+        if k == len(p.preco) or sum(restante) <= EPS:
+            return 0.0, 0.0, (0,) * (len(p.preco) - k)
+
+        chave = (k, tuple(round(r, 6) for r in restante), round(orcamento, 2))
+        if chave in self.memo:
+            return self.memo[chave]
+        self.nos += 1
+
+        preco = p.preco[k]
+        maximo = p.max_unidades[k]
+        if preco > 0:
+            maximo = min(maximo, int(orcamento // preco + EPS))
+
+        fila = p.fila(k, restante)
+        procura = sum(restante)
+        melhor = None
+        # Mais unidades primeiro: encontra cedo soluções boas e aperta a poda
+        for n in range(maximo, -1, -1):
+            if melhor is not None and self._esgotado():
+                return melhor
+            energia, j = fila.energia(n * p.horas)
+            ganho = p.receita_por_kwh_dia * energia - self.lam * n * preco
+            sobra = orcamento - n * preco
+            if melhor is not None and \
+                    ganho + p.limite_superior(k + 1, procura - energia, sobra, self.lam) <= melhor[0] + EPS:
+                continue
+            valor, custo, sufixo = self.resolver(k + 1, fila.resto(energia, j), sobra)
+            melhor = _melhor(melhor, (ganho + valor, n * preco + custo, (n,) + sufixo))
+
+        if not self.interrompida:
+            self.memo[chave] = melhor
+        return melhor
+
+
+def _resolver_ramos(problema, lam, prazo, contagens_primeiro):
+    """ Corre num processo do pool: melhor solução com o 1º modelo fixo em cada contagem. """
+    busca = _Busca(problema, lam, prazo)
+    melhor = None
+    for n in contagens_primeiro:
+        if melhor is not None and busca._esgotado():
+            break
+        energia, resto = problema.alocar(0, n, problema.procura) if n else (0.0, problema.procura)
+        ganho = problema.receita_por_kwh_dia * energia - lam * n * problema.preco[0]
+        valor, custo, sufixo = busca.resolver(1, resto, problema.orcamento - n * problema.preco[0])
+        melhor = _melhor(melhor, (ganho + valor, n * problema.preco[0] + custo, (n,) + sufixo))
+    return melhor, busca.interrompida, busca.nos
+
+
+def _maximizar(problema, lam, prazo, pool, workers):
+    """ Melhor (valor, custo, contagens) para receita - lam * custo. """
+    contagens = list(range(problema.max_unidades[0], -1, -1))
+    if pool is None:
+        return _resolver_ramos(problema, lam, prazo, contagens)
+
+    # Ensaio em série: se acabar a tempo, o pool não compensava
+    ensaio = time.monotonic() + ENSAIO_SERIE_S
+    if prazo is not None and prazo <= ensaio:
+        return _resolver_ramos(problema, lam, prazo, contagens)
+    melhor, interrompida, nos_ensaio = _resolver_ramos(problema, lam, ensaio, contagens)
+    if not interrompida:
+        return melhor, interrompida, nos_ensaio
+
+    # Intercala as contagens para equilibrar a carga entre os processos
+    fatias = [contagens[i::workers * 2] for i in range(min(len(contagens), workers * 2))]
+    futuros = [pool.submit(_resolver_ramos, problema, lam, prazo, fatia) for fatia in fatias]
+    melhor, interrompida, nos = None, False, nos_ensaio
+    # Cada processo respeita o prazo sozinho; a folga cobre o arranque do pool
+    espera = None if prazo is None else max(0.0, prazo - time.monotonic()) + 2.0
+    concluidos, pendentes = concurrent.futures.wait(futuros, timeout=espera)
+    for futuro in pendentes:
+        futuro.cancel()
+        interrompida = True
+    for futuro in concluidos:
+        resultado, parcial, n_nos = futuro.result()
+        interrompida = interrompida or parcial
+        nos += n_nos
+        if resultado is not None:
+            melhor = _melhor(melhor, resultado)
+    return melhor, interrompida, nos
+
+
+def montar_problema(frota, carregadores, orcamento, preco_venda_kwh, porcentagem_cliente,
+                    horas_operacao=24.0):
+    """
+    frota: [(RegistroVeiculo, quantidade, recargas_dia), ...]
+    carregadores: RegistroCarregador candidatos.
+    Devolve (ProblemaMix, carregadores mantidos) depois da poda por dominância.
+    """
+    procura = [v.perfil.kwh_para_recarga * quantidade * recargas for v, quantidade, recargas in frota]
+
+    linhas = []
+    for c in carregadores:
+        taxas = []
+        for v, _, _ in frota:
+            perfil = v.perfil
+            is_dc = c.tipo_corrente == 'DC'
+            potencia = min(v.potencia_max_carga_dc_kw if is_dc else v.potencia_max_carga_ac_kw,
+                           c.potencia_saida_kw) if c.tipo_corrente in ('AC', 'DC') else 0.0
+            taxas.append(perfil.kwh_para_recarga / perfil.tempo_horas(potencia, is_dc) if potencia > 0 else 0.0)
+        if any(taxas):
+            linhas.append((tuple(taxas), float(c.preco or 0.0), c))
+
+    # Dominância: (taxas >= e preço <=) noutro modelo -> este nunca é preciso
+    linhas.sort(key=lambda l: (l[1], tuple(-t for t in l[0]), l[2].id))
+    mantidas = []
+    for taxas, preco, c in linhas:
+        if not any(all(a >= b for a, b in zip(outra[0], taxas)) for outra in mantidas):
+            mantidas.append((taxas, preco, c))
+    # Ordem da busca: os mais rápidos primeiro (servem os veículos antes dos lentos)
+    mantidas.sort(key=lambda l: (-max(l[0]), l[1], l[2].id))
+
+    receita_por_kwh_dia = calcular_comissao(
+        1.0, 1.0, preco_venda_kwh, porcentagem_cliente
+    )["faturamento_operadora_mensal"]
+    problema = ProblemaMix(
+        [list(l[0]) for l in mantidas], procura, [l[1] for l in mantidas],
+        float(horas_operacao), float(orcamento), receita_por_kwh_dia
+    )
+    return problema, [l[2] for l in mantidas]
+
+
+def otimizar_mix(frota, carregadores, orcamento, preco_venda_kwh, porcentagem_cliente,
+                 objetivo='receita', horas_operacao=24.0, tempo_limite_s=None,
+                 paralelo=False, workers=2):
+    """
+    Procura o mix de carregadores. Devolve um dicionário com o mix, custo,
+    energia entregue, a comissão (mesmas chaves da página de comissão),
+    payback em meses e estatísticas da busca.
+    """
+    if objetivo not in OBJETIVOS:
+        raise ErroOtimizacao(f"'objetivo' deve ser um de {', '.join(OBJETIVOS)}")
+    if orcamento < 0:
+        raise ErroOtimizacao("'orcamento' não pode ser negativo")
+    if not 0 < horas_operacao <= 24:
+        raise ErroOtimizacao("'horas_operacao' deve estar entre 0 e 24")
+
+    inicio = time.monotonic()
+    prazo = None if tempo_limite_s is None else inicio + tempo_limite_s
+    problema, modelos = montar_problema(
+        frota, carregadores, orcamento, preco_venda_kwh, porcentagem_cliente, horas_operacao
+    )
+
+    contagens, interrompida, nos, iteracoes = (), False, 0, 0
+    if modelos and problema.receita_por_kwh_dia > 0:
+        pool = obter_pool('otimizador', workers) if paralelo and workers > 1 else None
+        # Receita máxima; para o payback é o ponto de partida
+        melhor, interrompida, nos = _maximizar(problema, LAMBDA_DESEMPATE, prazo, pool, workers)
+        iteracoes = 1
+        contagens = melhor[2] if melhor else ()
+        while objetivo == 'payback' and contagens and not interrompida and iteracoes < 50:
+            # Dinkelbach: lambda = receita/custo da solução atual; um valor
+            # positivo de "receita - lambda * custo" é um payback melhor
+            receita, custo = _avaliar(problema, contagens)
+            if custo <= 0 or receita <= 0:
+                break
+            melhor, parcial, n_nos = _maximizar(problema, receita / custo, prazo, pool, workers)
+            iteracoes += 1
+            interrompida = interrompida or parcial
+            nos += n_nos
+            if melhor is None or melhor[0] <= EPS:
+                break
+            contagens = melhor[2]
+
+    return _resultado(problema, modelos, contagens, objetivo, preco_venda_kwh, porcentagem_cliente, {
+        "completo": not interrompida,
+        "nos_explorados": nos,
+        "iteracoes": iteracoes,
+        "modelos_candidatos": len(carregadores),
+        "modelos_apos_poda": len(modelos),
+        "tempo_s": time.monotonic() - inicio,
+    })
+
+
+def _energia(problema, contagens):
+    restante = problema.procura
+    energia = 0.0
+    for k, n in enumerate(contagens):
+        if n:
+            e, restante = problema.alocar(k, n, restante)
+            energia += e
+    return energia
+
+
+def _avaliar(problema, contagens):
+    """ (receita mensal da operadora, custo) de um vetor de contagens. """
+    custo = sum(n * p for n, p in zip(contagens, problema.preco))
+    return problema.receita_por_kwh_dia * _energia(problema, contagens), custo
+
+
+def _resultado(problema, modelos, contagens, objetivo, preco_venda_kwh, porcentagem_cliente, busca):
+    energia_dia = _energia(problema, contagens) if contagens else 0.0
+    custo = sum(n * p for n, p in zip(contagens, problema.preco))
+    comissao = calcular_comissao(energia_dia, 1.0, preco_venda_kwh, porcentagem_cliente)
+    receita = comissao["faturamento_operadora_mensal"]
+    procura_dia = sum(problema.procura)
+    return {
+        "objetivo": objetivo,
+        "mix": [
+            {"carregador_id": c.id, "nome": c.nome_completo, "quantidade": n, "preco": problema.preco[k],
+             "subtotal": n * problema.preco[k]}
+            for k, (c, n) in enumerate(zip(modelos, contagens)) if n
+        ],
+        "orcamento": problema.orcamento,
+        "custo_total": custo,
+        "procura_kwh_dia": procura_dia,
+        "energia_entregue_kwh_dia": energia_dia,
+        "cobertura_procura": energia_dia / procura_dia if procura_dia else 0.0,
+        "comissao": comissao,
+        "payback_meses": custo / receita if receita > 0 else None,
+        "busca": busca,
+    }
+
+
+def _numero(dados, campo, padrao=None):
+    valor = dados.get(campo, padrao)
+    if valor is None:
+        raise ErroOtimizacao(f"'{campo}' é obrigatório")
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ErroOtimizacao(f"'{campo}' deve ser um número")
+    if not math.isfinite(valor):
+        raise ErroOtimizacao(f"'{campo}' deve ser finito")
+    return valor
+
+
+def ler_pedido_otimizacao(pedido, catalogo, tempo_limite_max_s=10.0):
+    """
+    Valida o JSON do pedido contra o snapshot do catálogo e devolve os
+    argumentos de otimizar_mix (dicionário).
+    Formato:
+      {"frota": [{"veiculo_id": 1, "quantidade": 20, "recargas_dia": 1.5}, ...],
+       "orcamento": 250000,
+       "preco_venda_kwh": 2.5,
+       "porcentagem_cliente": 15,
+       "objetivo": "receita",            (opcional: "receita" ou "payback")
+       "horas_operacao": 24,             (opcional)
+       "carregador_ids": [1, 2, ...],    (opcional: limita os candidatos)
+       "tempo_limite_s": 5,              (opcional, até ao máximo do servidor)
+       "paralelo": false}                (opcional)
+    """
+    if not isinstance(pedido, dict):
+        raise ErroOtimizacao("o corpo do pedido deve ser um objeto JSON")
+    frota_pedido = pedido.get('frota')
+    if not isinstance(frota_pedido, list) or not frota_pedido:
+        raise ErroOtimizacao("'frota' deve ser uma lista não vazia")
+
+    frota = []
+    for item in frota_pedido:
+        if not isinstance(item, dict):
+            raise ErroOtimizacao("cada item de 'frota' deve ser um objeto")
+        veiculo = catalogo.veiculos_por_id.get(int(_numero(item, 'veiculo_id')))
+        if veiculo is None:
+            raise ErroOtimizacao(f"veículo {item.get('veiculo_id')} não encontrado")
+        quantidade = int(_numero(item, 'quantidade', 1))
+        recargas = _numero(item, 'recargas_dia', 1.0)
+        if quantidade < 0 or recargas < 0:
+            raise ErroOtimizacao("'quantidade' e 'recargas_dia' não podem ser negativos")
+        frota.append((veiculo, quantidade, recargas))
+
+    ids = pedido.get('carregador_ids')
+    if ids is None:
+        carregadores = list(catalogo.carregadores)
+    else:
+        if not isinstance(ids, list):
+            raise ErroOtimizacao("'carregador_ids' deve ser uma lista")
+        try:
+            carregadores = [catalogo.carregadores_por_id[int(i)] for i in ids]
+        except (KeyError, TypeError, ValueError, OverflowError):
+            raise ErroOtimizacao("'carregador_ids' contém carregadores inexistentes")
+
+    tempo_limite = min(_numero(pedido, 'tempo_limite_s', tempo_limite_max_s), tempo_limite_max_s)
+    if tempo_limite <= 0:
+        raise ErroOtimizacao("'tempo_limite_s' deve ser maior que zero")
+
+    return {
+        "frota": frota,
+        "carregadores": carregadores,
+        "orcamento": _numero(pedido, 'orcamento'),
+        "preco_venda_kwh": _numero(pedido, 'preco_venda_kwh'),
+        "porcentagem_cliente": _numero(pedido, 'porcentagem_cliente'),
+        "objetivo": pedido.get('objetivo', 'receita'),
+        "horas_operacao": _numero(pedido, 'horas_operacao', 24.0),
+        "tempo_limite_s": tempo_limite,
+        "paralelo": bool(pedido.get('paralelo', False)),
+    }
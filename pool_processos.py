@@ -0,0 +1,32 @@
+# Pools de Processos Partilhados (Monte Carlo e otimizador)
+#
+# Arrancar um ProcessPoolExecutor 'spawn' custa centenas de ms por processo
+# (interpretador novo + import do NumPy), mais do que a própria análise de um
+# pedido. Por isso cada processo do servidor cria o pool de cada
+# funcionalidade no primeiro pedido paralelo e reutiliza-o até sair, como a
+# fila do PDF (relatorio_pdf.py).
+
+import concurrent.futures
+import multiprocessing
+import threading
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def obter_pool(nome, workers):
+    """
+    Pool `nome` deste processo com `workers` processos, criado no primeiro
+    uso (depois do fork do gunicorn); 'spawn' evita herdar ligações ao banco
+    e threads do worker. Um pool partido (processo morto) é substituído.
+    """
+    chave = (nome, workers)
+    with _lock:
+        pool = _pools.get(chave)
+        if pool is None or getattr(pool, '_broken', False):
+            pool = _pools[chave] = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return pool
+
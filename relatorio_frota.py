@@ -0,0 +1,261 @@
+# Relatório de Frota (custo total de posse de todo o catálogo, em streaming)
+#
+# O simulador, a comparação 1x1 e a comissão olham para um veículo de cada
+# vez: repetidos para o catálogo inteiro seriam N rankings completos (veículo
+# x todos os carregadores + uma ordenação cada). Aqui só interessa o melhor
+# carregador de cada veículo, e isso depende apenas do tipo de corrente e da
+# potência de saída:
+#   - os carregadores são agrupados por (tipo, potência); de cada grupo basta
+#     o mais barato (desempate por id) e o mais barato com preço (> 0);
+#   - para um bloco de veículos a potência efetiva, o tempo (com a curva DC)
+#     e o R$/kW são uma matriz veículos x grupos (dezenas de potências
+#     distintas, não milhares de carregadores), sem ordenar nada por veículo;
+#   - melhor por tempo: o mesmo critério do ranking (tempo, preço, id), logo
+#     é sempre o 1º carregador do simulador; melhor por custo: menor R$/kW
+#     (preço / potência efetiva), desempate por tempo e id;
+#   - custos de energia e comissão: as fórmulas de motor_compatibilidade,
+#     aplicadas ao bloco inteiro de uma vez.
+# As linhas saem bloco a bloco para a resposta (gerador): o download começa
+# logo e a memória não cresce com o tamanho do catálogo.
+#
+# Formatos: 'csv' (vírgula, ponto decimal) e 'excel' (CSV como o Excel em
+# português o abre: ';', vírgula decimal e BOM UTF-8).
+
+import csv
+import io
+import math
+
+import numpy as np
+
+from motor_compatibilidade import calcular_comissao, calcular_custos_gerais
+
+
+FORMATOS = {'csv': (',', '.'), 'excel': (';', ',')}
+VEICULOS_POR_BLOCO = 1000
+CELULAS_POR_BLOCO = 200000  # veículos x grupos por bloco (limita a memória das matrizes)
+
+COLUNAS = (
+    'veiculo_id', 'marca', 'modelo', 'kwh_para_recarga',
+    'melhor_tempo_carregador_id', 'melhor_tempo_carregador', 'melhor_tempo_tipo_corrente',
+    'melhor_tempo_potencia_efetiva_kw', 'melhor_tempo_horas', 'melhor_tempo_preco',
+    'melhor_tempo_acima_24h',
+    'melhor_custo_carregador_id', 'melhor_custo_carregador', 'melhor_custo_reais_por_kw',
+    'melhor_custo_horas', 'melhor_custo_preco',
+    'custo_por_recarga', 'custo_mensal', 'custo_anual',
+    'faturamento_bruto_mensal', 'comissao_cliente_mensal',
+    'faturamento_operadora_mensal', 'faturamento_operadora_anual',
+)
+
+
+class ErroRelatorio(ValueError):
+    """ Parâmetros do relatório inválidos (vira HTTP 400 na rota). """
+
+
+def _numero(args, campo, minimo=None, maximo=None, minimo_exclusivo=False):
+    valor = args.get(campo)
+    if valor is None or valor == '':
+        raise ErroRelatorio(f"'{campo}' é obrigatório")
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ErroRelatorio(f"'{campo}' deve ser um número")
+    if not math.isfinite(valor):
+        raise ErroRelatorio(f"'{campo}' deve ser finito")
+    if minimo is not None and (valor <= minimo if minimo_exclusivo else valor < minimo):
+        raise ErroRelatorio(f"'{campo}' deve ser maior que {minimo}"
+                            + ("" if minimo_exclusivo else " ou igual"))
+    if maximo is not None and valor > maximo:
+        raise ErroRelatorio(f"'{campo}' deve ser no máximo {maximo}")
+    return valor
+
+
+def ler_pedido_relatorio(args):
+    """
+    GET /api/relatorios/frota?custo_kwh=0.8&recargas_dia=2&preco_venda_kwh=2.5
+        &porcentagem_cliente=15[&formato=csv|excel]
+    """
+    formato = args.get('formato') or 'csv'
+    if formato not in FORMATOS:
+        raise ErroRelatorio(f"'formato' deve ser um de {', '.join(FORMATOS)}")
+    return {
+        "custo_kwh": _numero(args, 'custo_kwh', minimo=0),
+        "recargas_dia": _numero(args, 'recargas_dia', minimo=0, minimo_exclusivo=True),
+        "preco_venda_kwh": _numero(args, 'preco_venda_kwh', minimo=0),
+        "porcentagem_cliente": _numero(args, 'porcentagem_cliente', minimo=0, maximo=100),
+        "formato": formato,
+    }
+
+
+class GruposCarregadores:
+    """
+    Carregadores AC/DC agrupados por (tipo, potência de saída), com índices
+    na ordem da matriz (por id):
+    - barato / preco_barato: o de menor preço (None conta 0, como no ranking);
+    - com_preco / preco_positivo: o de menor preço > 0 (-1 / inf se nenhum).
+    """
+
+    def __init__(self, matriz):
+        indices = np.flatnonzero((matriz.is_ac | matriz.is_dc) & (matriz.potencia_saida_kw > 0))
+        is_dc = matriz.is_dc[indices]
+        potencia = matriz.potencia_saida_kw[indices]
+        preco = matriz.preco[indices]
+
+        # Ordem (tipo, potência, preço, id): o 1º de cada grupo é o mais barato
+        ordem = np.lexsort((indices, preco, potencia, is_dc))
+        if not len(ordem):
+            # Sem carregadores: um grupo de potência 0, incompatível com todos os veículos
+            indices, is_dc, potencia, preco = np.array([-1]), np.array([False]), np.zeros(1), np.zeros(1)
+            ordem = np.zeros(1, dtype=np.intp)
+        chave = np.stack((is_dc[ordem], potencia[ordem]), axis=1)
+        inicio = np.flatnonzero(np.r_[True, np.any(chave[1:] != chave[:-1], axis=1)])
+        self.is_dc = is_dc[ordem][inicio]
+        self.potencia_kw = potencia[ordem][inicio]
+        self.barato = indices[ordem][inicio]
+        self.preco_barato = preco[ordem][inicio]
+
+        # Mesma ordem com os sem preço no fim de cada grupo: o 1º é o mais barato com preço
+        ordem = np.lexsort((indices, preco, preco <= 0, potencia, is_dc))
+        com_preco = preco[ordem][inicio] > 0
+        self.com_preco = np.where(com_preco, indices[ordem][inicio], -1)
+        self.preco_positivo = np.where(com_preco, preco[ordem][inicio], np.inf)
+
+    def __len__(self):
+        return len(self.potencia_kw)
+
+
+def _melhor(chaves, indices):
+    """
+    Por linha, a coluna com a menor tupla (chaves..., índice do carregador).
+    `chaves`: matrizes veículos x grupos (ou vetores por grupo).
+    """
+    empate = None
+    for chave in chaves:
+        valores = chave if empate is None else np.where(empate, chave, np.inf)
+        atual = valores == valores.min(axis=1, keepdims=True)
+        empate = atual if empate is None else empate & atual
+    return np.where(empate, indices, np.iinfo(np.int64).max).argmin(axis=1)
+
+
+def calcular_bloco(veiculos, grupos, custo_kwh, recargas_dia, preco_venda_kwh, porcentagem_cliente):
+    """
+    Melhores carregadores e custos de um bloco de veículos, como arrays.
+    Os tempos são calculados com as mesmas operações de MatrizCarregadores.calcular.
+    """
+    perfis = [v.perfil for v in veiculos]
+    kwh = np.array([p.kwh_para_recarga for p in perfis], dtype=np.float64)
+    ac = np.array([v.potencia_max_carga_ac_kw for v in veiculos], dtype=np.float64)
+    dc = np.array([v.potencia_max_carga_dc_kw for v in veiculos], dtype=np.float64)
+
+    limite = np.where(grupos.is_dc, dc[:, None], ac[:, None])
+    efetiva = np.minimum(limite, grupos.potencia_kw)
+    compativel = efetiva > 0
+    tempo = np.full(efetiva.shape, np.inf)
+    np.divide(kwh[:, None], efetiva, out=tempo, where=compativel)
+    for linha, perfil in enumerate(perfis):
+        if perfil.tem_curva:
+            colunas = grupos.is_dc & compativel[linha]
+            tempo[linha, colunas] = perfil.tempo_dc(efetiva[linha, colunas])
+            efetiva[linha, colunas] = kwh[linha] / tempo[linha, colunas]
+
+    custo_beneficio = np.full(efetiva.shape, np.inf)
+    np.divide(grupos.preco_positivo, efetiva, out=custo_beneficio,
+              where=compativel & np.isfinite(grupos.preco_positivo))
+
+    linhas = np.arange(len(veiculos))
+    por_tempo = _melhor((tempo, grupos.preco_barato), grupos.barato)
+    por_custo = _melhor((custo_beneficio, tempo), grupos.com_preco)
+    tempo_rapido = tempo[linhas, por_tempo]
+    custo_beneficio = custo_beneficio[linhas, por_custo]
+
+    return {
+        "kwh_para_recarga": kwh,
+        "rapido_valido": np.isfinite(tempo_rapido),
+        "rapido": grupos.barato[por_tempo],
+        "rapido_potencia_efetiva_kw": efetiva[linhas, por_tempo],
+        "rapido_horas": tempo_rapido,
+        "rapido_acima_24h": tempo_rapido * recargas_dia > 24,
+        "barato_valido": np.isfinite(custo_beneficio),
+        "barato": grupos.com_preco[por_custo],
+        "barato_reais_por_kw": custo_beneficio,
+        "barato_horas": tempo[linhas, por_custo],
+        "custos": calcular_custos_gerais(kwh, custo_kwh, recargas_dia),
+        "comissao": calcular_comissao(kwh, recargas_dia, preco_venda_kwh, porcentagem_cliente),
+    }
+
+
+def _tamanho_bloco(n_grupos):
+    return max(1, min(VEICULOS_POR_BLOCO, CELULAS_POR_BLOCO // max(1, n_grupos)))
+
+
+def gerar_relatorio_csv(catalogo, custo_kwh, recargas_dia, preco_venda_kwh, porcentagem_cliente,
+                        formato='csv'):
+    """
+    Gerador do relatório (uma linha por veículo, pela ordem do catálogo),
+    pronto para ser enviado em streaming. Usa um único snapshot do catálogo.
+    """
+    separador, decimal = FORMATOS[formato]
+    registros = catalogo.matriz.registros
+    grupos = GruposCarregadores(catalogo.matriz)
+    veiculos = catalogo.veiculos
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=separador, lineterminator='\r\n')
+
+    def numeros(valores):
+        """ Coluna de números já como texto (4 casas decimais). """
+        textos = [repr(v) for v in np.round(np.asarray(valores, dtype=np.float64), 4).tolist()]
+        return [texto.replace('.', decimal) for texto in textos] if decimal != '.' else textos
+
+    # Só o mais barato de cada grupo pode ser escolhido: esses registos são lidos uma vez
+    carregadores = {}
+    for i in set(grupos.barato.tolist()) | set(grupos.com_preco.tolist()):
+        if i >= 0:
+            c = registros[i]
+            preco = '' if c.preco is None else numeros([c.preco])[0]
+            carregadores[i] = (c.id, c.nome_completo, c.tipo_corrente, preco)
+
+    # Cabeçalho já no 1º pedaço: o download começa antes do primeiro bloco
+    escritor.writerow(COLUNAS)
+    yield ('\ufeff' if formato == 'excel' else '') + buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    passo = _tamanho_bloco(len(grupos))
+    for inicio in range(0, len(veiculos), passo):
+        bloco = veiculos[inicio:inicio + passo]
+        r = calcular_bloco(bloco, grupos, custo_kwh, recargas_dia, preco_venda_kwh, porcentagem_cliente)
+        custos, comissao = r["custos"], r["comissao"]
+        # Valores anuais da comissão no mesmo ano de 365 dias de calcular_custos_gerais
+        operadora_anual = comissao["faturamento_operadora_mensal"] / 30 * 365
+
+        rapidos = zip(r["rapido_valido"].tolist(), r["rapido"].tolist(),
+                      numeros(r["rapido_potencia_efetiva_kw"]), numeros(r["rapido_horas"]),
+                      r["rapido_acima_24h"].tolist())
+        baratos = zip(r["barato_valido"].tolist(), r["barato"].tolist(),
+                      numeros(r["barato_reais_por_kw"]), numeros(r["barato_horas"]))
+        valores = zip(*(numeros(coluna) for coluna in (
+            custos["custo_por_recarga"], custos["custo_mensal"], custos["custo_anual"],
+            comissao["faturamento_bruto_mensal"], comissao["comissao_cliente_mensal"],
+            comissao["faturamento_operadora_mensal"], operadora_anual)))
+
+        for veiculo, kwh, rapido, barato, custos_linha in zip(
+                bloco, numeros(r["kwh_para_recarga"]), rapidos, baratos, valores):
+            linha = [veiculo.id, veiculo.marca, veiculo.modelo, kwh]
+            valido, i, potencia, horas, acima = rapido
+            if valido:
+                id_, nome, tipo, preco = carregadores[i]
+                linha += [id_, nome, tipo, potencia, horas, preco, 'sim' if acima else 'nao']
+            else:
+                linha += [''] * 7
+            valido, i, reais_por_kw, horas = barato
+            if valido:
+                id_, nome, _, preco = carregadores[i]
+                linha += [id_, nome, reais_por_kw, horas, preco]
+            else:
+                linha += [''] * 5
+            linha += custos_linha
+            escritor.writerow(linha)
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,203 @@
+# Exportação do Relatório em PDF (fora do caminho do pedido)
+#
+# Converter HTML em PDF com o WeasyPrint demora segundos; num worker síncrono
+# do gunicorn isso bloquearia o worker inteiro. Por isso:
+#   - o HTML (relatorio_pdf.html) é renderizado no pedido (é barato);
+#   - a conversão corre num ProcessPoolExecutor limitado;
+#   - o cliente recebe um job_id e consulta o estado / descarrega o ficheiro.
+#
+# O job_id é o hash da chave (versão do catálogo, veiculo_id, custo_kwh,
+# recargas_dia), e o estado vive no disco (.pdf / .pendente / .erro). Assim
+# qualquer worker responde a qualquer job, e o mesmo orçamento pedido duas
+# vezes é servido logo a partir da cache. A cache tem um limite de tamanho
+# (LRU pela data de modificação, que é renovada a cada acesso); os .erro
+# expiram ao fim de ttl_erro segundos.
+
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+
+PRONTO = 'pronto'
+PENDENTE = 'pendente'
+ERRO = 'erro'
+DESCONHECIDO = 'desconhecido'
+
+
+def chave_relatorio(versao_catalogo, veiculo_id, custo_kwh, recargas_dia, tarifa=None, hora_inicio=0.0):
+    """
+    job_id estável para o mesmo orçamento na mesma versão do catálogo.
+    `tarifa`: campos da tarifa horária usada (None = tarifa plana).
+    """
+    texto = f"{versao_catalogo}:{int(veiculo_id)}:{float(custo_kwh)!r}:{float(recargas_dia)!r}"
+    if tarifa is not None:
+        texto += ":" + json.dumps([tarifa, float(hora_inicio)], separators=(',', ':'))
+    return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+
+def _converter_html_para_pdf(html, caminho_pdf, caminho_pendente, caminho_erro):
+    """
+    Corre no processo do pool. Escreve para um temporário e faz rename
+    (um leitor nunca vê um PDF pela metade).
+    """
+    temporario = f"{caminho_pdf}.{os.getpid()}.tmp"
+    try:
+        import weasyprint  # Pesado: só é importado nos processos do pool
+        weasyprint.HTML(string=html).write_pdf(temporario)
+        os.replace(temporario, caminho_pdf)
+    except Exception as e:
+        with open(caminho_erro, 'w', encoding='utf-8') as f:
+            f.write(f"{type(e).__name__}: {e}")
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    finally:
+        if os.path.exists(caminho_pendente):
+            os.remove(caminho_pendente)
+
+
+class FilaPDF:
+    """
+    Pool de conversão + cache em disco.
+    max_workers: processos de renderização (limite de CPU/memória).
+    max_bytes:   tamanho máximo da pasta de cache (LRU).
+    ttl_erro:    segundos que um .erro fica na pasta.
+    """
+
+    def __init__(self, pasta, max_workers=2, max_bytes=200 * 1024 * 1024,
+                 timeout_pendente=300, ttl_erro=3600):
+        self.pasta = pasta
+        self.max_workers = max_workers
+        self.max_bytes = max_bytes
+        self.timeout_pendente = timeout_pendente
+        self.ttl_erro = ttl_erro
+        self._pool = None
+        self._lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminhos(self, job_id):
+        base = os.path.join(self.pasta, job_id)
+        return base + '.pdf', base + '.pendente', base + '.erro'
+
+    def _obter_pool(self):
+        # Criado no primeiro uso (e depois do fork do gunicorn); 'spawn' evita
+        # herdar ligações ao banco e threads do worker.
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._pool
+
+    def estado(self, job_id):
+        caminho_pdf, caminho_pendente, caminho_erro = self._caminhos(job_id)
+        if os.path.exists(caminho_pdf):
+            return PRONTO, None
+        if os.path.exists(caminho_erro):
+            with open(caminho_erro, encoding='utf-8') as f:
+                return ERRO, f.read()
+        if os.path.exists(caminho_pendente):
+            # Processo que morreu a meio: deixa voltar a submeter
+            if time.time() - os.path.getmtime(caminho_pendente) > self.timeout_pendente:
+                os.remove(caminho_pendente)
+                return DESCONHECIDO, None
+            return PENDENTE, None
+        return DESCONHECIDO, None
+
+    def submeter(self, job_id, gerar_html):
+        """
+        Garante que o PDF de `job_id` existe ou está a ser gerado.
+        `gerar_html` só é chamado se for mesmo preciso renderizar.
+        """
+        estado, _ = self.estado(job_id)
+        if estado == PRONTO:
+            self._tocar(job_id)
+            return estado
+        if estado == PENDENTE:
+            return estado
+
+        caminho_pdf, caminho_pendente, caminho_erro = self._caminhos(job_id)
+        if os.path.exists(caminho_erro):
+            os.remove(caminho_erro) # Nova tentativa depois de um erro
+        try:
+            # O_EXCL: só um worker ganha a corrida para o mesmo job
+            os.close(os.open(caminho_pendente, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return PENDENTE
+
+        try:
+            html = gerar_html()
+            futuro = self._obter_pool().submit(
+                _converter_html_para_pdf, html, caminho_pdf, caminho_pendente, caminho_erro
+            )
+        except Exception:
+            os.remove(caminho_pendente)
+            raise
+        futuro.add_done_callback(
+            lambda f: self._concluido(f, caminho_pendente, caminho_erro)
+        )
+        return PENDENTE
+
+    def _concluido(self, futuro, caminho_pendente, caminho_erro):
+        # Falha do próprio pool (processo morto, etc.): o job não fica "pendente" para sempre
+        erro = futuro.exception()
+        if erro is not None:
+            with open(caminho_erro, 'w', encoding='utf-8') as f:
+                f.write(f"{type(erro).__name__}: {erro}")
+            if os.path.exists(caminho_pendente):
+                os.remove(caminho_pendente)
+        self.aplicar_limite()
+
+    def caminho_pdf(self, job_id):
+        """ Caminho do PDF pronto (renova a posição na LRU) ou None. """
+        caminho = self._caminhos(job_id)[0]
+        if not os.path.exists(caminho):
+            return None
+        self._tocar(job_id)
+        return caminho
+
+    def _tocar(self, job_id):
+        try:
+            os.utime(self._caminhos(job_id)[0])
+        except FileNotFoundError:
+            pass
+
+    def aplicar_limite(self):
+        """
+        Remove os .erro expirados e depois os ficheiros (PDFs e .erro) usados
+        há mais tempo até caber em max_bytes.
+        """
+        ficheiros = []
+        total = 0
+        limite_erro = time.time() - self.ttl_erro
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith(('.pdf', '.erro')):
+                    try:
+                        info = entrada.stat()
+                        if entrada.name.endswith('.erro') and info.st_mtime < limite_erro:
+                            os.remove(entrada.path)
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    ficheiros.append((info.st_mtime, info.st_size, entrada.path))
+                    total += info.st_size
+        ficheiros.sort()
+        for _, tamanho, caminho in ficheiros:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(caminho)
+                total -= tamanho
+            except FileNotFoundError:
+                pass
+
+    def encerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
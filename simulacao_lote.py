@@ -0,0 +1,150 @@
+# Simulação em Lote (Frotas): N veículos x grelha de custo_kwh x recargas_dia
+#
+# O ranking de carregadores de um veículo (potência efetiva, tempo, ordem por
+# tempo/preço) NÃO depende de custo_kwh nem de recargas_dia. Por isso cada
+# veículo faz UMA passagem vetorizada na matriz e todos os cenários reutilizam-na:
+# - custos_gerais é aritmética escalar;
+# - is_over_24h é um sufixo da lista (o tempo está ordenado), logo basta contar
+#   quantos carregadores ficam dentro das 24h.
+# Cada entrada de carregador é serializada para JSON uma única vez por veículo.
+
+import itertools
+import json
+import math
+
+import numpy as np
+
+from motor_compatibilidade import calcular_custos_gerais
+from tarifa_horaria import MAX_RECARGAS_DIA
+
+
+class ErroLote(ValueError):
+    """ Pedido de lote inválido (vira HTTP 400 na rota). """
+
+
+def _lista_de_numeros(pedido, campo, minimo_exclusivo=None, maximo=None):
+    valores = pedido.get(campo)
+    if not isinstance(valores, list):
+        valores = [valores]
+    if not valores or valores == [None]:
+        raise ErroLote(f"'{campo}' é obrigatório")
+    try:
+        valores = [float(v) for v in valores]
+    except (TypeError, ValueError):
+        raise ErroLote(f"'{campo}' deve conter apenas números")
+    if not all(math.isfinite(v) for v in valores):
+        raise ErroLote(f"'{campo}' deve conter apenas números finitos")
+    if minimo_exclusivo is not None and any(v <= minimo_exclusivo for v in valores):
+        raise ErroLote(f"'{campo}' deve conter valores maiores que {minimo_exclusivo}")
+    if maximo is not None and any(v > maximo for v in valores):
+        raise ErroLote(f"'{campo}' deve conter valores até {maximo}")
+    return valores
+
+
+def ler_pedido_lote(pedido, max_combinacoes=100000):
+    """
+    Valida o JSON do pedido e devolve (veiculo_ids, cenarios, limite).
+    Formato:
+      {"veiculo_ids": [1, 2, ...],
+       "custo_kwh": [0.8, 1.1],          (número ou lista)
+       "recargas_dia": [1, 2, 3],        (número ou lista)
+       "limite": 20}                     (opcional: top-N carregadores por combinação)
+    """
+    if not isinstance(pedido, dict):
+        raise ErroLote("o corpo do pedido deve ser um objeto JSON")
+
+    veiculo_ids = pedido.get('veiculo_ids')
+    if not isinstance(veiculo_ids, list) or not veiculo_ids:
+        raise ErroLote("'veiculo_ids' deve ser uma lista não vazia")
+    try:
+        veiculo_ids = [int(v) for v in veiculo_ids]
+    except (TypeError, ValueError, OverflowError):
+        raise ErroLote("'veiculo_ids' deve conter apenas inteiros")
+
+    custos = _lista_de_numeros(pedido, 'custo_kwh')
+    recargas = _lista_de_numeros(pedido, 'recargas_dia', minimo_exclusivo=0, maximo=MAX_RECARGAS_DIA)
+    cenarios = list(itertools.product(custos, recargas))
+
+    if len(veiculo_ids) * len(cenarios) > max_combinacoes:
+        raise ErroLote(f"máximo de {max_combinacoes} combinações por pedido")
+
+    limite = pedido.get('limite')
+    if limite is not None:
+        try:
+            limite = int(limite)
+        except (TypeError, ValueError, OverflowError):
+            raise ErroLote("'limite' deve ser um inteiro")
+        if limite < 0:
+            raise ErroLote("'limite' não pode ser negativo")
+
+    return veiculo_ids, cenarios, limite
+
+
+def _json(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def _json_numero(valor):
+    # JSON não tem Infinity nem NaN: R$/kW de carregador sem preço (ou um custo
+    # que transbordou) vai como null
+    return valor if math.isfinite(valor) else None
+
+
+def gerar_lote_ndjson(catalogo, veiculo_ids, cenarios, limite=None):
+    """
+    Gerador de linhas NDJSON (uma por veículo x cenário), pronto para
+    ser enviado em streaming. Usa um único snapshot do catálogo.
+    """
+    matriz = catalogo.matriz
+    registros = matriz.registros
+
+    for veiculo_id in veiculo_ids:
+        veiculo = catalogo.veiculos_por_id.get(veiculo_id)
+        if veiculo is None:
+            yield _json({"veiculo_id": veiculo_id, "erro": "Veículo não encontrado"}) + "\n"
+            continue
+
+        kwh_para_recarga = veiculo.perfil.kwh_para_recarga
+        calc = matriz.calcular_veiculo(veiculo, 1.0)
+        tempo = calc["tempo_recarga_horas"]
+        if limite is not None:
+            tempo = tempo[:limite]
+
+        # Fragmentos JSON de cada carregador, nas duas variantes do aviso de 24h
+        dentro, acima = [], []
+        for i, pot, t, cb in zip(
+                calc["indices"][:len(tempo)].tolist(),
+                calc["potencia_efetiva_kw"][:len(tempo)].tolist(),
+                tempo.tolist(),
+                calc["custo_beneficio_reais_por_kw"][:len(tempo)].tolist()):
+            c = registros[i]
+            base = _json({
+                "id": c.id,
+                "marca": c.marca,
+                "modelo": c.modelo,
+                "tipo_corrente": c.tipo_corrente,
+                "preco": c.preco,
+                "potencia_efetiva_kw": pot,
+                "tempo_recarga_horas": t,
+                "custo_beneficio_reais_por_kw": _json_numero(cb),
+            })[:-1]
+            dentro.append(base + ',"is_over_24h":false}')
+            acima.append(base + ',"is_over_24h":true}')
+
+        for custo_kwh, recargas_dia in cenarios:
+            # Mesmo critério do simulador: tempo * recargas_dia > 24
+            n_dentro = int(np.count_nonzero(~(tempo * recargas_dia > 24)))
+            cabecalho = _json({
+                "veiculo_id": veiculo.id,
+                "custo_kwh": custo_kwh,
+                "recargas_dia": recargas_dia,
+                "custos_gerais": {
+                    chave: _json_numero(valor)
+                    for chave, valor in calcular_custos_gerais(kwh_para_recarga, custo_kwh, recargas_dia).items()
+                },
+            })[:-1]
+            yield (
+                cabecalho + ',"carregadores":['
+                + ",".join(itertools.chain(dentro[:n_dentro], acima[n_dentro:]))
+                + "]}\n"
+            )
@@ -0,0 +1,260 @@
+# Sincronização Incremental do Catálogo (feeds completos dos fabricantes)
+#
+# A importação CSV só acrescenta (ou faz upsert) e não sabe o que deixou de
+# existir: reimportar todas as noites o catálogo de um fabricante enche as
+# tabelas de duplicados e obriga a reprocessar tudo. Aqui o feed (CSV ou
+# JSONL) é tratado como o estado completo da tabela:
+#   1. cada registo válido recebe o hash do conteúdo (hash_conteudo, o mesmo
+#      da importação CSV), indexado pela chave natural (marca, modelo);
+#   2. do banco só se lê (id, marca, modelo, hash_conteudo); linhas antigas
+#      sem hash são hasheadas a partir das colunas uma única vez;
+#   3. o diff dá inserir / atualizar / apagar (e duplicados já existentes
+#      da mesma chave, que também são apagados);
+#   4. só essas linhas são escritas, em lote, numa única transação.
+#
+# O diff é calculado sem escrever nada e tem uma assinatura (hash das
+# operações). Um cliente pode pré-visualizar o resumo e aplicar depois com
+# essa assinatura: se o feed ou o banco tiverem mudado entretanto, a
+# assinatura já não bate e nada é escrito.
+
+import csv
+import hashlib
+import json
+import math
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from importacao_csv import RelatorioImportacao, hash_conteudo, validar_linhas
+
+
+FORMATOS = ('csv', 'jsonl')
+TAMANHO_BLOCO_IDS = 500  # Parâmetros por "IN (...)" (limite do SQLite)
+
+
+class ErroSincronizacao(ValueError):
+    """ Feed inválido ou sincronização recusada (vira HTTP 400 na rota). """
+
+
+class _LeitorJsonl:
+    """
+    Um objeto JSON por linha, com a mesma interface que o csv.DictReader
+    usado por validar_linhas (iteração de dicts + line_num). Os valores vão
+    como texto para passarem pelos mesmos conversores do CSV.
+    """
+
+    def __init__(self, stream_texto, relatorio):
+        self.stream = stream_texto
+        self.relatorio = relatorio
+        self.line_num = 0
+
+    def __iter__(self):
+        for linha in self.stream:
+            self.line_num += 1
+            if not linha.strip():
+                continue
+            try:
+                objeto = json.loads(linha)
+            except ValueError as e:
+                self.relatorio.registrar_erro(self.line_num, f"JSON inválido: {e}")
+                continue
+            if not isinstance(objeto, dict):
+                self.relatorio.registrar_erro(self.line_num, "cada linha deve ser um objeto JSON")
+                continue
+            # NaN/Infinity (e 1e400) passam no json.loads mas não são números válidos
+            nao_finitos = [
+                campo for campo, valor in objeto.items()
+                if isinstance(valor, float) and not math.isfinite(valor)
+            ]
+            if nao_finitos:
+                self.relatorio.registrar_erro(
+                    self.line_num, f"número não finito em {', '.join(map(repr, nao_finitos))}")
+                continue
+            yield {campo: None if valor is None else str(valor) for campo, valor in objeto.items()}
+
+
+def ler_feed(stream_texto, formato, esquema, relatorio, delimiter=';'):
+    """ Gerador dos registos válidos do feed (dicts já convertidos pelo esquema). """
+    if formato not in FORMATOS:
+        raise ErroSincronizacao(f"formato deve ser um de {', '.join(FORMATOS)}")
+    if formato == 'jsonl':
+        return validar_linhas(_LeitorJsonl(stream_texto, relatorio), esquema, relatorio)
+
+    reader = csv.DictReader(stream_texto, delimiter=delimiter)
+    faltando = [
+        campo for campo, conversor in esquema
+        if campo not in (reader.fieldnames or []) and not getattr(conversor, 'opcional', False)
+    ]
+    if faltando:
+        raise ErroSincronizacao(f"colunas em falta no cabeçalho: {', '.join(faltando)}")
+    return validar_linhas(reader, esquema, relatorio)
+
+
+def _blocos(sequencia, tamanho=TAMANHO_BLOCO_IDS):
+    sequencia = list(sequencia)
+    for inicio in range(0, len(sequencia), tamanho):
+        yield sequencia[inicio:inicio + tamanho]
+
+
+class DiffCatalogo:
+    """
+    Operações para levar uma tabela ao estado do feed.
+    inserir / atualizar: dicts com os campos do esquema (+ hash_conteudo;
+    atualizar também com '_id'); apagar: ids; preencher_hash: linhas
+    inalteradas que ainda não tinham hash ('_id', 'hash_conteudo').
+    """
+
+    def __init__(self, tabela, inserir, atualizar, apagar, preencher_hash,
+                 inalterados, duplicados_feed, relatorio):
+        self.tabela = tabela
+        self.inserir = inserir
+        self.atualizar = atualizar
+        self.apagar = apagar
+        self.preencher_hash = preencher_hash
+        self.inalterados = inalterados
+        self.duplicados_feed = duplicados_feed
+        self.relatorio = relatorio
+
+    @property
+    def alteracoes(self):
+        return len(self.inserir) + len(self.atualizar) + len(self.apagar)
+
+    @property
+    def assinatura(self):
+        """ Hash das operações: igual só se o diff aplicado for o que foi pré-visualizado. """
+        h = hashlib.sha1()
+        for registro in self.inserir:
+            h.update(f"+{registro['marca']}\x1f{registro['modelo']}\x1f{registro['hash_conteudo']}\n".encode())
+        for registro in self.atualizar:
+            h.update(f"~{registro['_id']}\x1f{registro['hash_conteudo']}\n".encode())
+        for id_ in self.apagar:
+            h.update(f"-{id_}\n".encode())
+        return h.hexdigest()
+
+    def resumo(self, exemplos=10):
+        return {
+            "tabela": self.tabela.name,
+            "inserir": len(self.inserir),
+            "atualizar": len(self.atualizar),
+            "apagar": len(self.apagar),
+            "inalterados": self.inalterados,
+            "duplicados_no_feed": self.duplicados_feed,
+            "hashes_em_falta": len(self.preencher_hash),
+            "assinatura": self.assinatura,
+            "exemplos": {
+                "inserir": [[r['marca'], r['modelo']] for r in self.inserir[:exemplos]],
+                "atualizar": [[r['marca'], r['modelo']] for r in self.atualizar[:exemplos]],
+                "apagar": self.apagar[:exemplos],
+            },
+            "erros": self.relatorio.resumo(),
+        }
+
+
+def _hashes_do_banco(conn, tabela, esquema):
+    """
+    {(marca, modelo): [(id, hash), ...]} por ordem de id. Linhas sem hash
+    (criadas antes da coluna) são hasheadas aqui a partir das colunas.
+    """
+    c = tabela.c
+    por_chave = {}
+    sem_hash = []
+    for id_, marca, modelo, hash_ in conn.execute(
+            select(c.id, c.marca, c.modelo, c.hash_conteudo).order_by(c.id)):
+        por_chave.setdefault((marca, modelo), []).append([id_, hash_])
+        if hash_ is None:
+            sem_hash.append(id_)
+
+    calculados = {}
+    campos = [c[campo] for campo, _ in esquema]
+    for bloco in _blocos(sem_hash):
+        for linha in conn.execute(select(c.id, *campos).where(c.id.in_(bloco))):
+            calculados[linha[0]] = hash_conteudo(dict(zip((campo for campo, _ in esquema), linha[1:])), esquema)
+    return por_chave, calculados
+
+
+def calcular_diff(conn, tabela, esquema, registros, relatorio=None):
+    """
+    Compara os `registros` do feed (dicts válidos, ver ler_feed) com a
+    tabela. Não escreve nada. A última ocorrência de cada chave no feed
+    ganha; no banco fica a linha de menor id e as outras com a mesma chave
+    são apagadas.
+    """
+    relatorio = relatorio or RelatorioImportacao()
+    feed = {}
+    duplicados_feed = 0
+    for registro in registros:
+        chave = (registro['marca'], registro['modelo'])
+        if chave in feed:
+            duplicados_feed += 1
+        registro['hash_conteudo'] = hash_conteudo(registro, esquema)
+        feed[chave] = registro
+
+    banco, calculados = _hashes_do_banco(conn, tabela, esquema)
+
+    inserir, atualizar, apagar, preencher_hash = [], [], [], []
+    inalterados = 0
+    for chave, linhas in banco.items():
+        (id_, hash_), extras = linhas[0], linhas[1:]
+        apagar.extend(extra[0] for extra in extras)
+        registro = feed.pop(chave, None)
+        if registro is None:
+            apagar.append(id_)
+            continue
+        atual = hash_ if hash_ is not None else calculados[id_]
+        if atual != registro['hash_conteudo']:
+            atualizar.append(dict(registro, _id=id_))
+        else:
+            inalterados += 1
+            if hash_ is None:
+                preencher_hash.append({'_id': id_, 'hash_conteudo': atual})
+    inserir.extend(feed.values())
+
+    apagar.sort()
+    return DiffCatalogo(tabela, inserir, atualizar, apagar, preencher_hash,
+                        inalterados, duplicados_feed, relatorio)
+
+
+def validar_aplicacao(diff, total_atual, assinatura=None, max_apagados=0.5):
+    """
+    Recusa aplicar um feed com linhas inválidas (a linha em falta seria
+    apagada), que apague mais do que `max_apagados` da tabela (feed
+    truncado) ou cuja assinatura não seja a pré-visualizada.
+    """
+    if diff.relatorio.total_erros:
+        raise ErroSincronizacao(
+            f"feed com {diff.relatorio.total_erros} linha(s) inválida(s); nada foi aplicado")
+    if total_atual and len(diff.apagar) > max_apagados * total_atual:
+        raise ErroSincronizacao(
+            f"o feed apagaria {len(diff.apagar)} de {total_atual} linhas "
+            f"(máximo {max_apagados:.0%}); nada foi aplicado")
+    if assinatura and assinatura != diff.assinatura:
+        raise ErroSincronizacao("o diff mudou desde a pré-visualização (assinatura diferente); nada foi aplicado")
+
+
+def aplicar_diff(conn, tabela, diff, tamanho_lote=1000):
+    """
+    Aplica o diff na transação de `conn` (sem commit).
+    Devolve (ids inseridos ou atualizados, ids apagados), para o índice.
+    """
+    c = tabela.c
+    alterados = [registro['_id'] for registro in diff.atualizar]
+
+    for inicio in range(0, len(diff.inserir), tamanho_lote):
+        resultado = conn.execute(
+            insert(tabela).returning(c.id, sort_by_parameter_order=True),
+            diff.inserir[inicio:inicio + tamanho_lote],
+        )
+        alterados.extend(resultado.scalars())
+
+    for linhas, campos in ((diff.atualizar, None), (diff.preencher_hash, ['hash_conteudo'])):
+        if not linhas:
+            continue
+        campos = campos or [campo for campo in linhas[0] if campo != '_id']
+        instrucao = update(tabela).where(c.id == bindparam('_id')).values(
+            **{campo: bindparam(campo) for campo in campos})
+        for inicio in range(0, len(linhas), tamanho_lote):
+            conn.execute(instrucao, linhas[inicio:inicio + tamanho_lote])
+
+    for bloco in _blocos(diff.apagar):
+        conn.execute(delete(tabela).where(c.id.in_(bloco)))
+
+    return alterados, list(diff.apagar)
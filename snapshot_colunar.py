@@ -0,0 +1,312 @@
+# Snapshot Colunar do Catálogo (ficheiro mapeado em memória, partilhado)
+#
+# O cache do catálogo guardava, em cada worker, um namedtuple por linha (com
+# floats e strings Python próprios) e dicionários por id: centenas de bytes
+# por linha, repetidos em cada processo. Aqui o catálogo de uma versão é
+# escrito num único ficheiro binário colunar:
+#   - colunas numéricas de largura fixa (little-endian: int64, float64, int32);
+#   - marca / modelo / tipo / curva como índices numa tabela de strings
+#     interned (cada texto distinto aparece uma vez: offsets + blob UTF-8);
+#   - a ordem das listas (marca, modelo, id) já calculada.
+# Os workers abrem-no com mmap só de leitura e as colunas são vistas NumPy
+# sobre o mapa (sem cópia): as páginas vêm da page cache do sistema e são
+# as mesmas em todos os processos. Os registos (RegistroVeiculo /
+# RegistroCarregador) só são criados quando alguém os pede, por blocos de
+# BLOCO_REGISTOS linhas (uma .tolist() por coluna), e ficam em cache no
+# snapshot: quem percorre a tabela inteira (ranking, lote, PDF) paga a
+# conversão uma vez; uma página da lista ou um id só materializa o seu bloco.
+#
+# Escrita atómica: ficheiro temporário na mesma pasta, fsync e os.replace.
+# Quem já tem o ficheiro antigo mapeado continua a lê-lo (o inode só
+# desaparece quando o último mapa é fechado). O cabeçalho leva a versão do
+# catálogo e a origem (URI do banco): um ficheiro de outra versão ou de outro
+# banco é ignorado e reconstruído.
+#
+# Formato: MAGIA | uint32 formato | uint32 tamanho do cabeçalho | cabeçalho
+# JSON | colunas alinhadas a 64 bytes. O cabeçalho tem, por coluna,
+# [dtype, offset, nº de elementos].
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+
+MAGIA = b'EVCATCOL'
+FORMATO = 1
+ALINHAMENTO = 64
+_PREFIXO = struct.Struct('<8sII')
+
+# Colunas por tabela, pela ordem dos campos do registo: (campo, tipo)
+#   'i': inteiro, 'f': float (NaN = NULL), 's': texto (índice na tabela de strings, -1 = NULL)
+ESQUEMA_VEICULOS = (
+    ('id', 'i'), ('marca', 's'), ('modelo', 's'), ('capacidade_bateria_kwh', 'f'),
+    ('potencia_max_carga_ac_kw', 'f'), ('potencia_max_carga_dc_kw', 'f'),
+    ('soc_inicial', 'f'), ('soc_final', 'f'), ('curva_carga', 's'),
+)
+ESQUEMA_CARREGADORES = (
+    ('id', 'i'), ('marca', 's'), ('modelo', 's'), ('potencia_saida_kw', 'f'),
+    ('tipo_corrente', 's'), ('preco', 'f'),
+)
+TABELAS = {'veiculos': ESQUEMA_VEICULOS, 'carregadores': ESQUEMA_CARREGADORES}
+DTYPES = {'i': '<i8', 'f': '<f8', 's': '<i4'}
+BLOCO_REGISTOS = 1024
+
+
+class SnapshotInvalido(ValueError):
+    """ Ficheiro que não é um snapshot deste formato (ou está truncado). """
+
+
+# --- Escrita ---
+
+def escrever_snapshot(caminho, versao, origem, linhas_por_tabela):
+    """
+    Escreve o snapshot de `versao` e troca-o atomicamente com `caminho`.
+    `linhas_por_tabela`: {'veiculos': linhas, 'carregadores': linhas}, tuplas
+    pela ordem dos campos de TABELAS (as mesmas do índice de compatibilidade).
+    """
+    strings = {}
+
+    def interned(texto):
+        if texto is None:
+            return -1
+        return strings.setdefault(texto, len(strings))
+
+    colunas = {}
+    for tabela, esquema in TABELAS.items():
+        linhas = sorted(linhas_por_tabela[tabela], key=lambda linha: linha[0])
+        for j, (campo, tipo) in enumerate(esquema):
+            if tipo == 's':
+                valores = [interned(linha[j]) for linha in linhas]
+            elif tipo == 'f':
+                valores = [np.nan if linha[j] is None else linha[j] for linha in linhas]
+            else:
+                valores = [linha[j] for linha in linhas]
+            colunas[f'{tabela}.{campo}'] = np.array(valores, dtype=DTYPES[tipo])
+        # Ordem das listas: (marca, modelo, id), como SnapshotCatalogo
+        ordem = sorted(range(len(linhas)), key=lambda i: (linhas[i][1], linhas[i][2], linhas[i][0]))
+        colunas[f'{tabela}._ordem'] = np.array(ordem, dtype='<i4')
+
+    blobs = [texto.encode('utf-8') for texto in strings]
+    colunas['_strings.offsets'] = np.concatenate(([0], np.cumsum([len(b) for b in blobs]))).astype('<i8')
+    colunas['_strings.blob'] = np.frombuffer(b''.join(blobs), dtype='u1')
+
+    # Offsets calculados com um cabeçalho de tamanho fixo (reservado e preenchido com espaços)
+    descricao = {"versao": versao, "origem": origem, "colunas": {}}
+    reservado = len(json.dumps(dict(descricao, colunas={
+        nome: [a.dtype.str, 10 ** 15, 10 ** 15] for nome, a in colunas.items()}))) + 16
+    offset = _alinhar(_PREFIXO.size + reservado)
+    for nome, array in colunas.items():
+        descricao["colunas"][nome] = [array.dtype.str, offset, len(array)]
+        offset = _alinhar(offset + array.nbytes)
+    cabecalho = json.dumps(descricao).encode('utf-8').ljust(reservado)
+
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(prefix='.catalogo-', suffix='.tmp', dir=pasta)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREFIXO.pack(MAGIA, FORMATO, reservado))
+            f.write(cabecalho)
+            for nome, array in colunas.items():
+                f.seek(descricao["colunas"][nome][1])
+                f.write(array.tobytes())
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def _alinhar(offset):
+    return -(-offset // ALINHAMENTO) * ALINHAMENTO
+
+
+# --- Leitura ---
+
+class ArquivoColunar:
+    """ Snapshot aberto: colunas como vistas NumPy só de leitura sobre o mmap. """
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as f:
+            try:
+                self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # ficheiro vazio
+                raise SnapshotInvalido(caminho)
+        if len(self._mapa) < _PREFIXO.size:
+            raise SnapshotInvalido(caminho)
+        magia, formato, tamanho = _PREFIXO.unpack_from(self._mapa)
+        if magia != MAGIA or formato != FORMATO:
+            raise SnapshotInvalido(caminho)
+        try:
+            descricao = json.loads(self._mapa[_PREFIXO.size:_PREFIXO.size + tamanho])
+            self.colunas = {
+                nome: np.frombuffer(self._mapa, dtype=dtype, count=n, offset=offset)
+                for nome, (dtype, offset, n) in descricao["colunas"].items()
+            }
+        except (ValueError, KeyError, TypeError):
+            raise SnapshotInvalido(caminho)
+        self.versao = descricao["versao"]
+        self.origem = descricao["origem"]
+        self.caminho = caminho
+        self._offsets = self.colunas['_strings.offsets']
+        self._blob = self.colunas['_strings.blob']
+
+    @property
+    def nbytes(self):
+        return len(self._mapa)
+
+    def texto(self, indice):
+        if indice < 0:
+            return None
+        inicio, fim = self._offsets[indice], self._offsets[indice + 1]
+        return self._blob[inicio:fim].tobytes().decode('utf-8')
+
+    def mascara_texto(self, coluna, texto):
+        """ coluna == texto, para uma coluna de texto com poucos valores distintos (ex.: tipo_corrente). """
+        mascara = np.zeros(len(coluna), dtype=bool)
+        for codigo in np.unique(coluna).tolist():
+            if self.texto(codigo) == texto:
+                mascara |= coluna == codigo
+        return mascara
+
+    def registros(self, tabela, construtor):
+        """ Vista (por id) dos registos de `tabela`, criados com `construtor(*campos)`. """
+        return VistaRegistros(self, tabela, construtor)
+
+
+def abrir_snapshot(caminho, versao=None, origem=None):
+    """ ArquivoColunar se `caminho` existir, for válido e da versão/origem pedidas; senão None. """
+    try:
+        arquivo = ArquivoColunar(caminho)
+    except (FileNotFoundError, SnapshotInvalido):
+        return None
+    if (versao is not None and arquivo.versao != versao) or (origem is not None and arquivo.origem != origem):
+        return None
+    return arquivo
+
+
+class VistaRegistros(Sequence):
+    """
+    Sequência (ordem por id) de registos lidos das colunas, materializados
+    por blocos de BLOCO_REGISTOS linhas no primeiro acesso e guardados.
+    """
+
+    def __init__(self, arquivo, tabela, construtor):
+        self.arquivo = arquivo
+        self.tabela = tabela
+        self.construtor = construtor
+        self._campos = [(arquivo.colunas[f'{tabela}.{campo}'], tipo) for campo, tipo in TABELAS[tabela]]
+        self.ids = arquivo.colunas[f'{tabela}.id']
+        self.ordem = arquivo.colunas[f'{tabela}._ordem']
+        self._blocos = {}
+        self._textos = {-1: None}
+        self._todos = None  # lista única quando todos os blocos já estão materializados
+
+    def coluna(self, campo):
+        """ Coluna crua (vista NumPy sobre o mmap, ordem por id; texto = códigos). """
+        return self.arquivo.colunas[f'{self.tabela}.{campo}']
+
+    def texto(self, codigo):
+        return self.arquivo.texto(codigo)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if self._todos is not None:
+            return self._todos[i]
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        numero, posicao = divmod(i, BLOCO_REGISTOS)
+        bloco = self._blocos.get(numero)
+        if bloco is None:
+            bloco = self._blocos[numero] = self._materializar(numero)
+            if len(self._blocos) * BLOCO_REGISTOS >= len(self):
+                blocos = dict(self._blocos)  # cópia: outra thread pode estar a acrescentar blocos
+                self._todos = [r for n in sorted(blocos) for r in blocos[n]]
+        return bloco[posicao]
+
+    def _materializar(self, numero):
+        """ Registos do bloco `numero`: colunas inteiras convertidas de uma vez e juntadas com zip. """
+        inicio = numero * BLOCO_REGISTOS
+        fim = min(inicio + BLOCO_REGISTOS, len(self))
+        colunas = []
+        for coluna, tipo in self._campos:
+            fatia = coluna[inicio:fim]
+            if tipo == 's':
+                textos = self._textos
+                for codigo in np.unique(fatia).tolist():
+                    if codigo not in textos:
+                        textos[codigo] = self.arquivo.texto(codigo)
+                valores = [textos[codigo] for codigo in fatia.tolist()]
+            else:
+                valores = fatia.tolist()
+                if tipo == 'f' and np.isnan(fatia).any():  # NaN = NULL
+                    valores = [None if v != v else v for v in valores]
+            colunas.append(valores)
+        return [self.construtor(*campos) for campos in zip(*colunas)]
+
+    def ordenada(self):
+        """ A mesma tabela pela ordem das listas (marca, modelo, id). """
+        return VistaPermutada(self, self.ordem)
+
+    def por_id(self):
+        return IndicePorId(self)
+
+
+class VistaPermutada(Sequence):
+    """ `base` noutra ordem (permutação de posições). """
+
+    def __init__(self, base, permutacao):
+        self.base = base
+        self.permutacao = permutacao
+
+    def coluna(self, campo):
+        return self.base.coluna(campo)[self.permutacao]
+
+    def texto(self, codigo):
+        return self.base.texto(codigo)
+
+    def __len__(self):
+        return len(self.permutacao)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.base[j] for j in self.permutacao[i].tolist()]
+        return self.base[int(self.permutacao[i])]
+
+
+class IndicePorId(Mapping):
+    """ {id: registo} sem dicionário: pesquisa binária na coluna de ids (ordenada). """
+
+    def __init__(self, vista):
+        self.vista = vista
+        self.ids = vista.ids
+
+    def __getitem__(self, id_):
+        try:
+            id_ = int(id_)
+        except (TypeError, ValueError):
+            raise KeyError(id_)
+        i = int(np.searchsorted(self.ids, id_))
+        if i == len(self.ids) or self.ids[i] != id_:
+            raise KeyError(id_)
+        return self.vista[i]
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,197 @@
+# Tarifas Horárias (TOU) e Encargo de Demanda
+#
+# O custo antigo é um único custo_kwh multiplicado (diário * 30, * 365).
+# Numa tarifa horária o custo depende de QUANDO a energia é consumida: um
+# carregador lento atravessa o horário de ponta, um rápido termina antes.
+# Logo o custo passa a ser por carregador.
+#
+# Cada tarifa vira um vetor de preços das 8.760 horas de um ano de referência
+# (dia útil / fim de semana x fator do mês) e o seu integral acumulado F(t).
+# Uma sessão que começa em s e dura d a potência P custa P * (F(s+d) - F(s)).
+# As sessões de um ano são as mesmas para todos os carregadores (hora de
+# início x recargas/dia) e só a duração muda; carregadores com a mesma
+# duração dão o mesmo custo. Assim o cálculo é uma matriz
+# (sessões do ano x durações distintas), vetorizada em NumPy.
+
+import datetime
+import functools
+import math
+
+import numpy as np
+
+
+HORAS_ANO = 8760
+ANO_REFERENCIA = 2025  # Não bissexto: 365 dias
+MAX_ELEMENTOS_BLOCO = 4_000_000  # Limite de memória da matriz sessões x durações
+MAX_RECARGAS_DIA = 24  # No máximo 8.760 sessões por ano (uma por hora)
+
+
+class TarifaInvalida(ValueError):
+    """ Texto de preços/fatores da tarifa mal formado. """
+
+
+def _ler_valores(texto, n, primeiro, nome):
+    """
+    Aceita n valores separados por espaço ("0.6 0.6 ... 1.9") ou faixas
+    "ini-fim:valor" (inclusivas), por ex. "0-16:0.65 17-20:1.95 21-23:0.65".
+    Vírgula decimal é aceite. Devolve uma tupla com n floats.
+    """
+    partes = (texto or '').replace(';', ' ').split()
+    if not partes:
+        raise TarifaInvalida(f"{nome}: vazio")
+    if all(':' not in p for p in partes):
+        if len(partes) != n:
+            raise TarifaInvalida(f"{nome}: esperados {n} valores, recebidos {len(partes)}")
+        try:
+            valores = tuple(float(p.replace(',', '.')) for p in partes)
+        except ValueError:
+            raise TarifaInvalida(f"{nome}: valor não numérico")
+        if not all(math.isfinite(v) for v in valores):
+            raise TarifaInvalida(f"{nome}: valores devem ser finitos")
+        return valores
+
+    valores = [None] * n
+    for parte in partes:
+        try:
+            faixa, valor = parte.split(':')
+            inicio, _, fim = faixa.partition('-')
+            inicio = int(inicio)
+            fim = int(fim) if fim else inicio
+            valor = float(valor.replace(',', '.'))
+        except ValueError:
+            raise TarifaInvalida(f"{nome}: faixa inválida '{parte}' (use ini-fim:valor)")
+        if not math.isfinite(valor):
+            raise TarifaInvalida(f"{nome}: valor não finito em '{parte}'")
+        if not primeiro <= inicio <= fim < primeiro + n:
+            raise TarifaInvalida(f"{nome}: faixa fora de {primeiro}-{primeiro + n - 1} em '{parte}'")
+        for i in range(inicio, fim + 1):
+            valores[i - primeiro] = valor
+    if None in valores:
+        faltam = [i + primeiro for i, v in enumerate(valores) if v is None]
+        raise TarifaInvalida(f"{nome}: faltam valores para {faltam}")
+    return tuple(valores)
+
+
+def ler_precos_horarios(texto):
+    """ 24 preços (R$/kWh), hora 0 a 23. """
+    precos = _ler_valores(texto, 24, 0, "preços horários")
+    if any(p < 0 for p in precos):
+        raise TarifaInvalida("preços horários: não podem ser negativos")
+    return precos
+
+
+def ler_fatores_mensais(texto):
+    """ 12 fatores sazonais (mês 1 a 12); vazio -> todos 1. """
+    if not (texto or '').strip():
+        return (1.0,) * 12
+    fatores = _ler_valores(texto, 12, 1, "fatores mensais")
+    if any(f < 0 for f in fatores):
+        raise TarifaInvalida("fatores mensais: não podem ser negativos")
+    return fatores
+
+
+def _texto_canonico(valores):
+    return " ".join(f"{v:g}" for v in valores)
+
+
+def normalizar_precos(texto):
+    """ Valida e devolve os 24 preços no formato canónico (24 valores). """
+    return _texto_canonico(ler_precos_horarios(texto))
+
+
+def normalizar_fatores(texto):
+    """ Valida os fatores mensais; None se forem todos 1 (sem sazonalidade). """
+    fatores = ler_fatores_mensais(texto)
+    return None if all(f == 1.0 for f in fatores) else _texto_canonico(fatores)
+
+
+def ler_demanda(texto):
+    """ Encargo de demanda (R$/kW por mês); vazio -> 0. """
+    try:
+        demanda = float(str(texto).replace(',', '.')) if str(texto or '').strip() else 0.0
+    except ValueError:
+        raise TarifaInvalida("demanda: valor não numérico")
+    if not math.isfinite(demanda) or demanda < 0:
+        raise TarifaInvalida("demanda: deve ser um número finito e não negativo")
+    return demanda
+
+
+class PerfilTarifa:
+    """
+    Preços das 8.760 horas do ano de referência + integral acumulado.
+    O vetor é duplicado (2 anos) para as sessões que passam do fim do ano.
+    """
+
+    def __init__(self, precos_dia_util, precos_fim_semana=None, fatores_mensais=None,
+                 demanda_reais_kw_mes=0.0):
+        util = np.array(ler_precos_horarios(precos_dia_util))
+        fim_semana = util if not (precos_fim_semana or '').strip() else np.array(ler_precos_horarios(precos_fim_semana))
+        fatores = np.array(ler_fatores_mensais(fatores_mensais))
+        self.demanda_reais_kw_mes = ler_demanda(demanda_reais_kw_mes)
+
+        dias = [datetime.date(ANO_REFERENCIA, 1, 1) + datetime.timedelta(days=d) for d in range(365)]
+        is_fim_semana = np.array([d.weekday() >= 5 for d in dias])
+        self.mes_do_dia = np.array([d.month - 1 for d in dias])
+        por_dia = np.where(is_fim_semana[:, None], fim_semana[None, :], util[None, :])
+        self.preco_hora = (por_dia * fatores[self.mes_do_dia][:, None]).ravel()
+        self.preco_medio = float(self.preco_hora.mean())
+
+        dois_anos = np.concatenate((self.preco_hora, self.preco_hora))
+        self._preco = dois_anos
+        self._acum = np.concatenate(([0.0], np.cumsum(dois_anos)))
+
+    def integral(self, t):
+        """ F(t) = soma dos preços (R$/kWh x h) de 0 até t horas. Vetorizado. """
+        t = np.clip(t, 0.0, 2 * HORAS_ANO - 1e-9)
+        h = t.astype(np.int64)
+        return self._acum[h] + (t - h) * self._preco[h]
+
+    def inicios_sessoes(self, hora_inicio, recargas_dia):
+        """ Início (h desde 1/jan) das sessões de um ano: recargas_dia por dia, igualmente espaçadas. """
+        if not 0 < recargas_dia <= MAX_RECARGAS_DIA:
+            raise ValueError(f"recargas_dia deve estar entre 0 (exclusive) e {MAX_RECARGAS_DIA}")
+        if not np.isfinite(hora_inicio):
+            raise ValueError("hora_inicio deve ser finita")
+        n = max(1, int(round(365 * recargas_dia)))
+        return (float(hora_inicio) + np.arange(n) * (24.0 / recargas_dia)) % HORAS_ANO
+
+    def custos(self, potencia_media_kw, tempo_recarga_horas, potencia_pico_kw,
+               hora_inicio=0.0, recargas_dia=1.0):
+        """
+        Custos de um ano de sessões para cada carregador (arrays alinhados).
+        potencia_media_kw x tempo_recarga_horas = energia da janela de SoC;
+        potencia_pico_kw entra no encargo de demanda (R$/kW por mês).
+        Mesmas chaves de calcular_custos_gerais, mais 'custo_demanda_anual'.
+        """
+        potencia_media_kw = np.asarray(potencia_media_kw, dtype=np.float64)
+        tempo = np.asarray(tempo_recarga_horas, dtype=np.float64)
+        inicios = self.inicios_sessoes(hora_inicio, recargas_dia)
+        base = self.integral(inicios).sum()
+
+        # Uma coluna por duração distinta; blocos para limitar a memória
+        duracoes, inverso = np.unique(tempo, return_inverse=True)
+        soma_fim = np.empty(len(duracoes))
+        bloco = max(1, MAX_ELEMENTOS_BLOCO // len(inicios))
+        for i in range(0, len(duracoes), bloco):
+            d = duracoes[i:i + bloco]
+            soma_fim[i:i + bloco] = self.integral(inicios[:, None] + d[None, :]).sum(axis=0)
+        preco_x_horas = soma_fim[inverso] - base
+
+        energia_anual = potencia_media_kw * preco_x_horas
+        demanda_anual = self.demanda_reais_kw_mes * np.asarray(potencia_pico_kw, dtype=np.float64) * 12
+        custo_anual = energia_anual + demanda_anual
+        custo_diario = custo_anual / 365
+        return {
+            "custo_por_recarga": energia_anual / len(inicios),
+            "custo_diario": custo_diario,
+            "custo_mensal": custo_diario * 30, # Média de 30 dias (igual à tarifa plana)
+            "custo_anual": custo_anual,
+            "custo_demanda_anual": demanda_anual,
+        }
+
+
+@functools.lru_cache(maxsize=64)
+def perfil_tarifa(precos_dia_util, precos_fim_semana=None, fatores_mensais=None,
+                  demanda_reais_kw_mes=0.0):
+    """ PerfilTarifa em cache (os argumentos são os campos da tarifa). """
+    return PerfilTarifa(precos_dia_util, precos_fim_semana, fatores_mensais, demanda_reais_kw_mes)
@@ -0,0 +1,55 @@
+# Sincronização de feeds: números não finitos (NaN, Infinity, 1e400) num feed
+# JSONL contam como linhas inválidas e impedem a aplicação do diff.
+
+import io
+
+import pytest
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine, insert
+
+from importacao_csv import ESQUEMA_CARREGADORES, RelatorioImportacao, hash_conteudo
+from sincronizacao_catalogo import ErroSincronizacao, calcular_diff, ler_feed, validar_aplicacao
+
+
+@pytest.fixture
+def tabela_carregadores():
+    metadata = MetaData()
+    tabela = Table(
+        'carregador', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('marca', String(100), nullable=False),
+        Column('modelo', String(100), nullable=False),
+        Column('potencia_saida_kw', Float, nullable=False),
+        Column('tipo_corrente', String(2), nullable=False),
+        Column('preco', Float),
+        Column('hash_conteudo', String(40)),
+    )
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    registro = {'marca': 'WEG', 'modelo': 'WEMOB', 'potencia_saida_kw': 22.0, 'tipo_corrente': 'AC', 'preco': 9000.0}
+    with engine.begin() as conn:
+        conn.execute(insert(tabela), [dict(registro, hash_conteudo=hash_conteudo(registro, ESQUEMA_CARREGADORES))])
+    yield engine, tabela
+    engine.dispose()
+
+
+@pytest.mark.parametrize('preco', ['NaN', 'Infinity', '-Infinity', '1e400'])
+def test_feed_jsonl_com_numero_nao_finito_nao_e_aplicado(tabela_carregadores, preco):
+    engine, tabela = tabela_carregadores
+    feed = io.StringIO(
+        '{"marca": "WEG", "modelo": "WEMOB", "potencia_saida_kw": 22, "tipo_corrente": "AC", "preco": %s}\n'
+        '{"marca": "ABB", "modelo": "Terra", "potencia_saida_kw": 50, "tipo_corrente": "DC", "preco": 90000}\n'
+        % preco
+    )
+    relatorio = RelatorioImportacao()
+    with engine.connect() as conn:
+        diff = calcular_diff(
+            conn, tabela, ESQUEMA_CARREGADORES,
+            ler_feed(feed, 'jsonl', ESQUEMA_CARREGADORES, relatorio), relatorio
+        )
+
+    assert relatorio.total_erros == 1
+    assert relatorio.erros[0][0] == 1
+    assert 'não finito' in relatorio.erros[0][1]
+    assert not diff.atualizar  # A linha inválida não vira uma atualização com preço NULL
+    with pytest.raises(ErroSincronizacao, match='linha\\(s\\) inválida\\(s\\)'):
+        validar_aplicacao(diff, total_atual=1)